@@ -0,0 +1,141 @@
+# Admission control for LLM calls — global concurrency cap, weighted priority queue, load shedding
+import os, time, asyncio
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Deque, Dict, Optional
+
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+LLM_MAX_QUEUE       = int(os.getenv("LLM_MAX_QUEUE", "64"))
+LLM_QUEUE_TIMEOUT   = float(os.getenv("LLM_QUEUE_TIMEOUT", "10"))
+
+# Classes de priorité et poids : sur 4 slots libérés avec les deux files pleines, 3 vont au chat public
+CLASSES = ("chat", "admin")
+WEIGHTS = {"chat": 3, "admin": 1}
+
+class Overloaded(Exception):
+    def __init__(self, retry_after: float):
+        super().__init__("Upstream capacity exhausted")
+        self.retry_after = retry_after
+
+class _ClassStats:
+    def __init__(self):
+        self.admitted = 0
+        self.shed = 0
+        self.timed_out = 0
+        self.waits: Deque[float] = deque(maxlen=500)
+
+    def snapshot(self, waiting: int) -> dict:
+        s = sorted(self.waits)
+        q = lambda p: round(s[int(p * (len(s) - 1))], 4) if s else None
+        return {
+            "waiting": waiting,
+            "admitted": self.admitted,
+            "shed": self.shed,
+            "timed_out": self.timed_out,
+            "queue_time_p50": q(0.5),
+            "queue_time_p95": q(0.95),
+            "queue_time_max": round(s[-1], 4) if s else None,
+        }
+
+class AdmissionController:
+    def __init__(self, limit: int = LLM_MAX_CONCURRENCY, max_queue: int = LLM_MAX_QUEUE,
+                 queue_timeout: float = LLM_QUEUE_TIMEOUT):
+        self.limit = limit
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self._queues: Dict[str, Deque[asyncio.Future]] = {c: deque() for c in CLASSES}
+        self._credits = dict(WEIGHTS)
+        self._stats = {c: _ClassStats() for c in CLASSES}
+        self._service_ewma = 1.0
+
+    def _waiting(self) -> int:
+        return sum(len(q) for q in self._queues.values())
+
+    def retry_after(self) -> float:
+        """Rough time for the current backlog to drain, for the Retry-After header"""
+        return max(1.0, round(self._service_ewma * (self._waiting() + 1) / max(self.limit, 1), 1))
+
+    def _shed(self, cls: str):
+        # File pleine : un chat public évince l'admin arrivé le plus récemment, sinon on refuse
+        lower = [c for c in CLASSES[CLASSES.index(cls) + 1:] if self._queues[c]]
+        if not lower:
+            self._stats[cls].shed += 1
+            raise Overloaded(self.retry_after())
+        victim = self._queues[lower[-1]].pop()
+        self._stats[lower[-1]].shed += 1
+        if not victim.done():
+            victim.set_exception(Overloaded(self.retry_after()))
+
+    async def acquire(self, cls: str = "chat"):
+        cls = cls if cls in self._queues else "admin"
+        st = self._stats[cls]
+        if self.active < self.limit and not self._waiting():
+            self.active += 1
+            st.admitted += 1
+            st.waits.append(0.0)
+            return
+        if self._waiting() >= self.max_queue:
+            self._shed(cls)
+
+        fut = asyncio.get_running_loop().create_future()
+        self._queues[cls].append(fut)
+        t0 = time.monotonic()
+        try:
+            await asyncio.wait_for(fut, self.queue_timeout)
+        except asyncio.TimeoutError:
+            st.timed_out += 1
+            raise Overloaded(self.retry_after())
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled() and fut.exception() is None:
+                self.release()   # slot transmis pendant l'annulation
+            raise
+        finally:
+            try:
+                self._queues[cls].remove(fut)
+            except ValueError:
+                pass
+        st.admitted += 1
+        st.waits.append(time.monotonic() - t0)
+
+    def _next_waiter(self) -> Optional[asyncio.Future]:
+        for _ in range(2):
+            ready = [c for c in CLASSES if self._queues[c]]
+            if not ready:
+                return None
+            for c in ready:
+                if self._credits[c] > 0 or len(ready) == 1:
+                    self._credits[c] -= 1
+                    return self._queues[c].popleft()
+            self._credits = dict(WEIGHTS)
+        return self._queues[ready[0]].popleft()
+
+    def release(self):
+        while True:
+            fut = self._next_waiter()
+            if fut is None:
+                self.active -= 1
+                return
+            if not fut.done():
+                fut.set_result(True)   # le slot passe directement au suivant
+                return
+
+    @asynccontextmanager
+    async def slot(self, cls: str = "chat"):
+        await self.acquire(cls)
+        t0 = time.monotonic()
+        try:
+            yield
+        finally:
+            self._service_ewma = 0.9 * self._service_ewma + 0.1 * (time.monotonic() - t0)
+            self.release()
+
+    def stats(self) -> dict:
+        return {
+            "limit": self.limit,
+            "active": self.active,
+            "max_queue": self.max_queue,
+            "classes": {c: self._stats[c].snapshot(len(self._queues[c])) for c in CLASSES},
+        }
+
+controller = AdmissionController()
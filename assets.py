@@ -0,0 +1,101 @@
+# Static assets and admin pages — content-hashed /static URLs, pre-rendered templates with ETag/304
+import os, re, hashlib
+from typing import Dict, Tuple
+
+from starlette.datastructures import Headers
+from starlette.responses import Response
+
+import compression
+
+STATIC_DIR    = "static"
+IMMUTABLE     = "public, max-age=31536000, immutable"
+REVALIDATE    = "no-cache"          # réutilisable, mais revalidé (ETag) à chaque chargement
+
+_hashes: Dict[str, Tuple[float, str]] = {}          # chemin -> (mtime, hash)
+
+def asset_hash(path: str) -> str:
+    """First 10 hex chars of the file's sha256, recomputed only when its mtime changes"""
+    full = os.path.join(STATIC_DIR, path)
+    mtime = os.path.getmtime(full)
+    cached = _hashes.get(path)
+    if cached is None or cached[0] != mtime:
+        with open(full, "rb") as f:
+            cached = _hashes[path] = (mtime, hashlib.sha256(f.read()).hexdigest()[:10])
+    return cached[1]
+
+def static_url(path: str) -> str:
+    """/static URL carrying the content hash: safe to cache forever, changes when the file does"""
+    path = path.lstrip("/")
+    try:
+        return f"/static/{path}?v={asset_hash(path)}"
+    except OSError:
+        return f"/static/{path}"
+
+class CachedStaticFiles(compression.PrecompressedStaticFiles):
+    """Immutable caching for URLs whose ?v= matches the current content hash, revalidation otherwise"""
+    async def get_response(self, path: str, scope):
+        response = await super().get_response(path, scope)
+        if response.status_code in (200, 304):
+            v = ""
+            for part in scope.get("query_string", b"").decode("latin-1").split("&"):
+                if part.startswith("v="):
+                    v = part[2:]
+            try:
+                fresh = bool(v) and v == asset_hash(path)
+            except OSError:
+                fresh = False
+            response.headers["cache-control"] = IMMUTABLE if fresh else REVALIDATE
+        return response
+
+_ASSET_RE = re.compile(r'/static/([^"\'?#\s]+)\?v=')
+
+def _mtime(path: str) -> float:
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return 0.0
+
+class PageCache:
+    """Admin templates have no per-request data: rendered once, answered with 304 on a matching ETag.
+    A page is re-rendered when its template or one of the hashed assets it links to changes."""
+    def __init__(self, load_templates):
+        self._load_templates = load_templates
+        self._templates = None
+        self._pages: Dict[str, tuple] = {}    # nom -> (dépendances {chemin: mtime}, corps, etag)
+        self.renders = 0
+        self.not_modified = 0
+
+    @property
+    def templates(self):
+        if self._templates is None:
+            self._templates = self._load_templates()     # Jinja2 importé au premier rendu, pas au démarrage
+        return self._templates
+
+    def _page(self, name: str) -> Tuple[bytes, str]:
+        page = self._pages.get(name)
+        if page is None or any(_mtime(p) != m for p, m in page[0].items()):
+            source = os.path.join(self.templates.env.loader.searchpath[0], name)
+            deps = {source: _mtime(source)}
+            body = self.templates.get_template(name).render().encode("utf-8")
+            for asset in set(_ASSET_RE.findall(body.decode("utf-8"))):
+                full = os.path.join(STATIC_DIR, asset)
+                deps[full] = _mtime(full)
+            page = self._pages[name] = (deps, body, '"' + hashlib.sha256(body).hexdigest()[:16] + '"')
+            self.renders += 1
+        return page[1], page[2]
+
+    def response(self, request, name: str) -> Response:
+        body, etag = self._page(name)
+        headers = {"etag": etag, "cache-control": REVALIDATE}
+        inm = Headers(scope=request.scope).get("if-none-match", "")
+        # Comparaison faible (RFC 9110) : le W/ ajouté par la compression renvoie aussi un 304
+        if etag in (t.strip().removeprefix("W/") for t in inm.split(",")) or inm.strip() == "*":
+            self.not_modified += 1
+            return Response(status_code=304, headers=headers)
+        return Response(body, media_type="text/html", headers=headers)
+
+    def invalidate(self):
+        self._pages.clear()
+
+    def stats(self) -> dict:
+        return {"cached": sorted(self._pages), "renders": self.renders, "not_modified": self.not_modified}
@@ -0,0 +1,320 @@
+# Load test — drives the gateway ASGI app in-process against bench/standins.py and a throwaway SQLite file,
+# reports throughput, p50/p95/p99 and memory per scenario, and compares the run with a saved baseline
+#
+#   python bench/loadtest.py                                  # tous les scénarios, affichage seul
+#   python bench/loadtest.py --save-baseline default          # enregistre bench/baselines/default.json
+#   python bench/loadtest.py --compare default                # code de sortie 1 si régression
+import os, sys, json, time, socket, asyncio, logging, argparse, platform, resource, subprocess, tempfile, tracemalloc
+from typing import Awaitable, Callable, Dict, List, Optional
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+BASELINE_DIR = os.path.join(BENCH_DIR, "baselines")
+ADMIN_KEY = "bench-admin-key"
+SEED = 43
+
+# ---------- Scénarios ----------
+class Scenario:
+    def __init__(self, name: str, run: Callable[..., Awaitable], setup: Optional[Callable[..., Awaitable]] = None):
+        self.name, self.run, self.setup = name, run, setup
+
+SCENARIOS: Dict[str, Scenario] = {}
+
+def scenario(name: str, setup=None):
+    def deco(fn):
+        SCENARIOS[name] = Scenario(name, fn, setup)
+        return fn
+    return deco
+
+ADMIN = {"x-om-key": ADMIN_KEY}
+QUESTIONS = [f"Question {n} : comment améliorer la page d'accueil pour le client {n % 7} ?" for n in range(50)]
+RECALL_USER = "bench-recall"
+RECALL_ROWS = 500
+
+@scenario("chat")
+async def _chat(c, ctx, i):
+    return await c.post("/ai/chat", json={"message": QUESTIONS[i % len(QUESTIONS)], "cache": False})
+
+@scenario("thread_chat")
+async def _thread_chat(c, ctx, i):
+    return await c.post("/ai/threads/chat", json={"thread_id": f"bench-{i % 20}", "message": QUESTIONS[i % len(QUESTIONS)]})
+
+@scenario("memory_remember")
+async def _remember(c, ctx, i):
+    return await c.post("/ai/memory/remember", json={
+        "user_id": f"bench-{i % 50}", "persona": "coach_v1", "key": f"pref_{i}", "value": f"aime le café n°{i}"})
+
+async def _seed_recall(c, ctx):
+    lines = "\n".join(json.dumps({
+        "id": f"bench_recall_{n}", "user_id": RECALL_USER, "persona": "coach_v1", "key": f"fait_{n}",
+        "value": f"Souvenir {n} : préfère les rendez-vous le {['lundi', 'mardi', 'jeudi'][n % 3]} matin",
+    }) for n in range(RECALL_ROWS))
+    r = await c.post("/ai/memory/import", content=lines.encode(), headers=ADMIN)
+    r.raise_for_status()
+
+@scenario("memory_recall", setup=_seed_recall)
+async def _recall(c, ctx, i):
+    return await c.get("/ai/memory/recall", params={"user_id": RECALL_USER, "limit": RECALL_ROWS})
+
+@scenario("memory_search", setup=_seed_recall)
+async def _search(c, ctx, i):
+    return await c.get("/ai/memory/recall", params={"user_id": RECALL_USER, "q": "rendez-vous mardi", "limit": 20})
+
+@scenario("admin_tasks")
+async def _tasks(c, ctx, i):
+    if i % 4 == 0:
+        return await c.post("/admin/tasks", json={"title": f"Tâche {i}", "description": "Vérifier le déploiement"},
+                            headers={"x_om_key": ADMIN_KEY})
+    return await c.get("/admin/tasks", headers=ADMIN)
+
+@scenario("metrics")
+async def _metrics(c, ctx, i):
+    return await c.get("/metrics")
+
+UPLOAD_BODY = ("ligne de notes de réunion, budget et échéancier\n" * 200).encode()
+
+@scenario("upload")
+async def _upload(c, ctx, i):
+    return await c.post("/ai/files/upload", files={"file": (f"notes_{i}.txt", UPLOAD_BODY, "text/plain")}, headers=ADMIN)
+
+@scenario("website_analyze")
+async def _analyze(c, ctx, i):
+    return await c.post("/ai/website/analyze", json={"url": f"{ctx['standins']}/site"}, headers=ADMIN)
+
+SITE_DATA = {"name": "Bench Café", "industry": "restauration", "description": "Café de quartier", "services": ["café", "brunch"]}
+
+@scenario("website_static")
+async def _static(c, ctx, i):
+    return await c.post("/ai/website/generate", json={"site_data": SITE_DATA, "target_platform": "static"}, headers=ADMIN)
+
+@scenario("website_wordpress")
+async def _wordpress(c, ctx, i):
+    return await c.post("/ai/website/generate", headers=ADMIN, json={
+        "site_data": SITE_DATA, "target_platform": "wordpress",
+        # force : sinon le journal de déploiement saute les pages inchangées dès le 2e passage
+        "wordpress_config": {"url": ctx["standins"], "username": "bench", "application_password": "x x x", "force": True},
+    })
+
+# ---------- Mesure ----------
+def percentile(sorted_values: List[float], p: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    k = max(0, min(len(sorted_values) - 1, int(round(p / 100.0 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[k]
+
+def rss_mb() -> float:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024.0
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0   # pic (Linux : Ko)
+
+async def run_scenario(client, sc: Scenario, ctx: dict, requests: int, concurrency: int, warmup: int, trace_mem: bool) -> dict:
+    if sc.setup:
+        await sc.setup(client, ctx)
+    for i in range(warmup):
+        await sc.run(client, ctx, i)
+
+    latencies: List[float] = []
+    statuses: Dict[str, int] = {}
+    counter = iter(range(requests))
+
+    async def worker():
+        for i in counter:
+            t0 = time.perf_counter()
+            try:
+                r = await sc.run(client, ctx, i)
+                key = str(r.status_code)
+            except Exception as e:
+                key = type(e).__name__
+            latencies.append(time.perf_counter() - t0)
+            statuses[key] = statuses.get(key, 0) + 1
+
+    rss0 = rss_mb()
+    if trace_mem:
+        tracemalloc.start()
+    t0 = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall = time.perf_counter() - t0
+    peak = None
+    if trace_mem:
+        peak = tracemalloc.get_traced_memory()[1] / 1024.0 / 1024.0
+        tracemalloc.stop()
+
+    latencies.sort()
+    ok = sum(n for s, n in statuses.items() if s.isdigit() and int(s) < 400)
+    ms = lambda v: round(v * 1000, 2)
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "seconds": round(wall, 3),
+        "rps": round(requests / wall, 1) if wall else 0.0,
+        "p50_ms": ms(percentile(latencies, 50)),
+        "p95_ms": ms(percentile(latencies, 95)),
+        "p99_ms": ms(percentile(latencies, 99)),
+        "max_ms": ms(latencies[-1]) if latencies else 0.0,
+        "error_rate": round(1 - ok / requests, 4) if requests else 0.0,
+        "statuses": statuses,
+        "rss_mb": round(rss_mb(), 1),
+        "rss_growth_mb": round(rss_mb() - rss0, 1),
+        "tracemalloc_peak_mb": round(peak, 2) if peak is not None else None,
+    }
+
+# ---------- Stand-ins et gateway ----------
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def start_standins(args) -> subprocess.Popen:
+    env = dict(os.environ,
+               STANDIN_LLM_LATENCY_MS=str(args.llm_latency_ms), STANDIN_LLM_JITTER_MS=str(args.llm_jitter_ms),
+               STANDIN_CHUNK_MS=str(args.chunk_ms), STANDIN_WP_LATENCY_MS=str(args.wp_latency_ms),
+               STANDIN_SITE_LATENCY_MS=str(args.site_latency_ms), STANDIN_SEED=str(SEED))
+    proc = subprocess.Popen([sys.executable, os.path.join(BENCH_DIR, "standins.py"), "--port", str(args.port)], env=env)
+    deadline = time.monotonic() + 15
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", args.port), timeout=0.2):
+                return proc
+        except OSError:
+            if proc.poll() is not None:
+                break
+            time.sleep(0.1)
+    proc.kill()
+    raise SystemExit("stand-ins did not start")
+
+def configure_env(args, workdir: str):
+    # Avant l'import de gateway : la config est lue au chargement des modules
+    base = f"http://127.0.0.1:{args.port}"
+    os.environ.update({
+        "OM_ADMIN_KEY": ADMIN_KEY,
+        "GROQ_API_KEY": "bench",
+        "GROQ_API_URL": f"{base}/openai/v1/chat/completions",
+        "AI_BACKEND": "groq",
+        "STORAGE_BACKEND": "sqlite",
+        "SQLITE_PATH": os.path.join(workdir, "bench.db"),
+    })
+    for k in ("OLLAMA_URL", "TURSO_DB_URL", "TURSO_DB_AUTH_TOKEN", "REPLICA_PATH", "METRICS_TOKEN"):
+        os.environ.pop(k, None)
+    return base
+
+async def drive(args, names: List[str], base: str, workdir: str) -> dict:
+    import httpx
+    from pathlib import Path
+    import gateway
+    gateway.MAX_REQ_PER_WINDOW = 10 ** 9              # un seul client virtuel : la limite par IP fausserait la mesure
+    gateway.UPLOAD_DIR = Path(workdir) / "uploads"
+    gateway.UPLOAD_DIR.mkdir(exist_ok=True)
+    gateway.BUNDLE_DIR = gateway.UPLOAD_DIR / "sites"
+    logging.getLogger("httpx").setLevel(logging.WARNING)   # une ligne INFO par appel sortant sinon
+
+    ctx = {"standins": base}
+    results = {}
+    transport = httpx.ASGITransport(app=gateway.app, client=("10.43.0.1", 50000))
+    async with gateway.app.router.lifespan_context(gateway.app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://gateway", timeout=120) as client:
+            for name in names:
+                results[name] = await run_scenario(client, SCENARIOS[name], ctx, args.requests, args.concurrency,
+                                                   args.warmup, args.tracemalloc)
+                print(format_row(name, results[name]), flush=True)
+    return results
+
+# ---------- Rapport et baselines ----------
+HEADER = f"{'scenario':<18}{'rps':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'err':>8}{'rss MB':>9}"
+
+def format_row(name: str, r: dict) -> str:
+    return (f"{name:<18}{r['rps']:>9.1f}{r['p50_ms']:>10.2f}{r['p95_ms']:>10.2f}{r['p99_ms']:>10.2f}"
+            f"{r['error_rate']:>8.1%}{r['rss_mb']:>9.1f}")
+
+def compare(current: dict, baseline: dict, tolerance: float) -> List[str]:
+    """Regressions of current vs baseline: slower p95/p99, lower throughput or more errors"""
+    problems = []
+    for name, cur in current["scenarios"].items():
+        base = baseline["scenarios"].get(name)
+        if base is None:
+            continue
+        for key in ("p95_ms", "p99_ms"):
+            if base[key] and cur[key] > base[key] * (1 + tolerance):
+                problems.append(f"{name}: {key} {base[key]} -> {cur[key]}")
+        if base["rps"] and cur["rps"] < base["rps"] * (1 - tolerance):
+            problems.append(f"{name}: rps {base['rps']} -> {cur['rps']}")
+        if cur["error_rate"] > base["error_rate"] + 0.01:
+            problems.append(f"{name}: error_rate {base['error_rate']} -> {cur['error_rate']}")
+    return problems
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Gateway load test against local stand-ins")
+    ap.add_argument("--scenarios", default=",".join(SCENARIOS), help="comma-separated, default: all")
+    ap.add_argument("--requests", type=int, default=200, help="measured requests per scenario")
+    ap.add_argument("--concurrency", type=int, default=16)
+    ap.add_argument("--warmup", type=int, default=10)
+    ap.add_argument("--llm-latency-ms", type=float, default=80)
+    ap.add_argument("--llm-jitter-ms", type=float, default=20)
+    ap.add_argument("--chunk-ms", type=float, default=5, help="delay between SSE chunks when stream=true")
+    ap.add_argument("--wp-latency-ms", type=float, default=30)
+    ap.add_argument("--site-latency-ms", type=float, default=20)
+    ap.add_argument("--port", type=int, default=0, help="stand-ins port (default: a free one)")
+    ap.add_argument("--tracemalloc", action="store_true", help="report Python allocation peaks (slows the run)")
+    ap.add_argument("--out", help="write the JSON report here")
+    ap.add_argument("--save-baseline", metavar="NAME")
+    ap.add_argument("--compare", metavar="NAME")
+    ap.add_argument("--tolerance", type=float, default=0.25, help="allowed relative slowdown vs the baseline")
+    args = ap.parse_args(argv)
+
+    names = [n.strip() for n in args.scenarios.split(",") if n.strip()]
+    unknown = [n for n in names if n not in SCENARIOS]
+    if unknown:
+        ap.error(f"unknown scenarios: {', '.join(unknown)} (known: {', '.join(SCENARIOS)})")
+    args.port = args.port or free_port()
+
+    os.chdir(ROOT)                       # templates/ et static/ sont résolus depuis la racine
+    sys.path.insert(0, ROOT)
+    standins = start_standins(args)
+    try:
+        with tempfile.TemporaryDirectory(prefix="om-bench-") as workdir:
+            base = configure_env(args, workdir)
+            print(HEADER)
+            results = asyncio.run(drive(args, names, base, workdir))
+    finally:
+        standins.terminate()
+        standins.wait(timeout=10)
+
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "machine": f"{platform.system()} {platform.machine()} x{os.cpu_count()}",
+        "config": {k: getattr(args, k) for k in ("requests", "concurrency", "warmup", "llm_latency_ms", "llm_jitter_ms",
+                                                 "chunk_ms", "wp_latency_ms", "site_latency_ms")},
+        "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0, 1),
+        "scenarios": results,
+    }
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+    if args.save_baseline:
+        os.makedirs(BASELINE_DIR, exist_ok=True)
+        path = os.path.join(BASELINE_DIR, f"{args.save_baseline}.json")
+        with open(path, "w") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"baseline saved: {os.path.relpath(path, ROOT)}")
+    if args.compare:
+        with open(os.path.join(BASELINE_DIR, f"{args.compare}.json")) as f:
+            baseline = json.load(f)
+        if baseline.get("config") != report["config"]:
+            print("warning: baseline was recorded with a different config", file=sys.stderr)
+        problems = compare(report, baseline, args.tolerance)
+        for p in problems:
+            print(f"REGRESSION {p}")
+        if problems:
+            return 1
+        print(f"no regression vs {args.compare} (tolerance {args.tolerance:.0%})")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
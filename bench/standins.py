@@ -0,0 +1,110 @@
+# Local stand-ins for the gateway's dependencies — Groq/Ollama (OpenAI-compatible), WordPress REST, reference site
+# Lancé en sous-process par bench/loadtest.py : son CPU ne se mélange pas à celui de la gateway mesurée
+import os, json, random, asyncio, argparse, itertools
+
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import HTMLResponse, JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+LLM_LATENCY_MS = float(os.getenv("STANDIN_LLM_LATENCY_MS", "80"))
+LLM_JITTER_MS  = float(os.getenv("STANDIN_LLM_JITTER_MS", "20"))
+CHUNK_MS       = float(os.getenv("STANDIN_CHUNK_MS", "5"))      # délai entre deux chunks SSE (stream=true)
+WP_LATENCY_MS  = float(os.getenv("STANDIN_WP_LATENCY_MS", "30"))
+SITE_LATENCY_MS = float(os.getenv("STANDIN_SITE_LATENCY_MS", "20"))
+SEED           = int(os.getenv("STANDIN_SEED", "43"))
+
+# Réponse JSON valide : les helpers de génération de site la parsent, le chat la renvoie telle quelle
+ANSWER = json.dumps({
+    "pages": ["home", "about", "services", "contact"],
+    "home": "Bienvenue chez ONLYMATT. " * 8,
+    "about": "Une équipe locale, des projets sur mesure. " * 6,
+    "services": "Conception, contenu, hébergement. " * 6,
+    "contact": "Écrivez-nous, réponse en 24 h.",
+})
+
+# Page de référence : assez de balises pour que l'extraction BeautifulSoup ait du travail
+SITE_HTML = "<!doctype html><html><head><title>Référence</title>" + "".join(
+    f'<meta name="m{i}" content="valeur {i}">' for i in range(10)
+) + '<link rel="stylesheet" href="/s.css"></head><body><nav>' + "".join(
+    f'<a href="/p{i}">Page {i}</a>' for i in range(30)
+) + "</nav>" + "".join(
+    f"<section><h2>Section {i}</h2><p>{'Lorem ipsum dolor sit amet. ' * 20}</p>"
+    f'<img src="/img{i}.jpg" alt="image {i}"></section>' for i in range(40)
+) + "<footer>© 2026</footer></body></html>"
+
+_rng = random.Random(SEED)
+_ids = itertools.count(100)
+
+async def _llm_delay():
+    await asyncio.sleep(max(0.0, LLM_LATENCY_MS + _rng.uniform(-LLM_JITTER_MS, LLM_JITTER_MS)) / 1000.0)
+
+def _usage(body: dict) -> dict:
+    prompt = sum(len(str(m.get("content", ""))) for m in body.get("messages", [])) // 4
+    return {"prompt_tokens": prompt, "completion_tokens": len(ANSWER) // 4, "total_tokens": prompt + len(ANSWER) // 4}
+
+async def chat_completions(request: Request):
+    body = await request.json()
+    model = body.get("model") or "standin"
+    await _llm_delay()
+    headers = {"x-ratelimit-remaining-requests": "100000", "x-ratelimit-remaining-tokens": "10000000"}
+    if not body.get("stream"):
+        return JSONResponse({
+            "id": f"chatcmpl-{next(_ids)}",
+            "object": "chat.completion",
+            "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": ANSWER}, "finish_reason": "stop"}],
+            "usage": _usage(body),
+        }, headers=headers)
+
+    async def events():
+        step = 32
+        for i in range(0, len(ANSWER), step):
+            chunk = {"object": "chat.completion.chunk", "model": model,
+                     "choices": [{"index": 0, "delta": {"content": ANSWER[i:i + step]}}]}
+            yield f"data: {json.dumps(chunk)}\n\n"
+            await asyncio.sleep(CHUNK_MS / 1000.0)
+        yield "data: [DONE]\n\n"
+    return StreamingResponse(events(), media_type="text/event-stream", headers=headers)
+
+async def wp_create(request: Request):
+    body = await request.json()
+    await asyncio.sleep(WP_LATENCY_MS / 1000.0)
+    pid = next(_ids)
+    return JSONResponse({"id": pid, "link": f"http://wp.local/?p={pid}", "status": body.get("status", "publish")},
+                        status_code=201)
+
+async def wp_batch(request: Request):
+    body = await request.json()
+    await asyncio.sleep(WP_LATENCY_MS / 1000.0)
+    out = []
+    for req in body.get("requests", []):
+        pid = next(_ids)
+        out.append({"status": 201, "body": {"id": pid, "link": f"http://wp.local/?p={pid}",
+                                            "status": (req.get("body") or {}).get("status", "publish")}})
+    return JSONResponse({"responses": out}, status_code=207)
+
+async def site(request: Request):
+    await asyncio.sleep(SITE_LATENCY_MS / 1000.0)
+    return HTMLResponse(SITE_HTML)
+
+async def ready(request: Request):
+    return Response("ok")
+
+app = Starlette(routes=[
+    Route("/ready", ready),
+    Route("/openai/v1/chat/completions", chat_completions, methods=["POST"]),   # Groq
+    Route("/v1/chat/completions", chat_completions, methods=["POST"]),          # Ollama
+    Route("/wp-json/wp/v2/pages", wp_create, methods=["POST"]),
+    Route("/wp-json/wp/v2/pages/{page_id:int}", wp_create, methods=["POST"]),
+    Route("/wp-json/wp/v2/posts", wp_create, methods=["POST"]),
+    Route("/wp-json/batch/v1", wp_batch, methods=["POST"]),
+    Route("/site", site),
+])
+
+if __name__ == "__main__":
+    import uvicorn
+    ap = argparse.ArgumentParser(description="Dependency stand-ins for the load tests")
+    ap.add_argument("--port", type=int, default=8765)
+    args = ap.parse_args()
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
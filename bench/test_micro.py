@@ -0,0 +1,169 @@
+# Micro-benchmarks of the gateway's CPU hot paths on fixed fixture data (pytest-benchmark)
+#
+#   pip install pytest-benchmark
+#   python -m pytest bench/test_micro.py --benchmark-only
+#   python -m pytest bench/test_micro.py --benchmark-save=avant      # puis --benchmark-compare après une optimisation
+#   python bench/test_micro.py                                       # sans le plugin : chronométrage timeit
+import os, sys, json, time, sqlite3, timeit
+
+import pytest
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+FIXTURES = os.path.join(BENCH_DIR, "fixtures")
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)                     # gateway monte templates/ et static/ en chemins relatifs
+
+try:
+    import pytest_benchmark
+except ImportError:
+    pytest_benchmark = None
+
+pytestmark = pytest.mark.skipif(pytest_benchmark is None, reason="pytest-benchmark not installed")
+
+import gateway, fastjson
+from bs4 import BeautifulSoup
+from fastapi.encoders import jsonable_encoder
+from starlette.responses import JSONResponse as StarletteJSONResponse
+
+# ---------- Données fixes ----------
+with open(os.path.join(FIXTURES, "reference_site.html"), encoding="utf-8") as f:
+    SITE_HTML = f.read()
+with open(os.path.join(FIXTURES, "website.json"), encoding="utf-8") as f:
+    WEBSITE = json.load(f)
+
+CHAT_SIMPLE = json.dumps({
+    "message": "Peux-tu résumer les horaires d'ouverture et proposer trois idées de publication ?",
+    "system_prompt": "Tu es l'assistant du café Atelier Bellechasse. Réponds en français, brièvement.",
+    "temperature": 0.4,
+    "max_tokens": 512,
+}).encode()
+CHAT_OPENAI = json.dumps({
+    "model": "llama-3.3-70b-versatile",
+    "messages": [{"role": "system", "content": "Tu es un assistant marketing."}] + [
+        {"role": "user" if n % 2 == 0 else "assistant", "content": f"Message {n} : " + "contenu de conversation " * 20}
+        for n in range(12)
+    ],
+    "temperature": 0.7,
+    "max_tokens": 1024,
+}).encode()
+
+def _rows(columns, values, count):
+    """sqlite3.Row like the local backend returns (name and index access)"""
+    c = sqlite3.connect(":memory:")
+    c.row_factory = sqlite3.Row
+    c.execute(f"CREATE TABLE t({', '.join(columns)})")
+    c.executemany(f"INSERT INTO t VALUES({', '.join('?' * len(columns))})", [values(n) for n in range(count)])
+    return c.execute("SELECT * FROM t").fetchall()
+
+MEMORY_ROWS = _rows(("k", "v", "c", "t"), lambda n: (
+    f"fait_{n}", f"Souvenir {n} : préfère les rendez-vous le mardi matin", 0.8, "2026-10-01 09:00:00"), 500)
+TASK_ROWS = _rows(gateway.TASKS_COLUMNS, lambda n: (
+    f"task_{n}", f"Tâche {n}", "Vérifier le déploiement " * 4, "medium", "pending",
+    "2026-10-01 09:00:00", "2026-10-02 10:00:00"), 200)
+TASK_TUPLES = [tuple(r) for r in TASK_ROWS]     # lignes positionnelles : chemin de repli par index
+
+RECALL_RESPONSE = {"ok": True, "memories": gateway.decode_memories(MEMORY_ROWS)}
+
+RL_IPS = [f"203.0.113.{n}" for n in range(100)]
+
+def _fill_rate_windows():
+    # Régime établi : 30 requêtes récentes par IP, sous la limite de 60/min
+    gateway._req_window.clear()
+    now = time.time()
+    for ip in RL_IPS:
+        gateway._req_window[ip].extend(now - k for k in range(30))
+
+def _rl_round():
+    for ip in RL_IPS:
+        gateway.rl(ip)
+
+def run_sync(coro):
+    """Drive a coroutine that never suspends (generate_static_html) without an event loop"""
+    try:
+        coro.send(None)
+    except StopIteration as e:
+        return e.value
+    coro.close()
+    raise RuntimeError("coroutine suspended")
+
+# ---------- Benchmarks ----------
+def test_rl(benchmark):
+    benchmark.pedantic(_rl_round, setup=_fill_rate_windows, rounds=200)
+    gateway._req_window.clear()
+
+def test_parse_chat_simple(benchmark):
+    payload, messages, *_ = benchmark(gateway.parse_chat_request, CHAT_SIMPLE)
+    assert messages[-1]["role"] == "user"
+
+def test_parse_chat_openai(benchmark):
+    payload, messages, *_ = benchmark(gateway.parse_chat_request, CHAT_OPENAI)
+    assert len(messages) == 13
+
+def test_decode_memories_500(benchmark):
+    out = benchmark(gateway.decode_memories, MEMORY_ROWS)
+    assert len(out) == 500 and out[0]["confidence"] == 0.8
+
+def test_decode_rows_tasks(benchmark):
+    out = benchmark(gateway.decode_rows, TASK_ROWS, gateway.TASKS_COLUMNS)
+    assert out[0]["id"] == "task_0"
+
+def test_decode_rows_tuples(benchmark):
+    out = benchmark(gateway.decode_rows, TASK_TUPLES, gateway.TASKS_COLUMNS)
+    assert out[-1]["status"] == "pending"
+
+# Réponse /ai/memory/recall à 500 lignes : chemin FastAPI par défaut vs fastjson
+def test_render_recall_default(benchmark):
+    body = benchmark(lambda: StarletteJSONResponse(jsonable_encoder(RECALL_RESPONSE)).body)
+    assert body.startswith(b'{"ok":true')
+
+def test_render_recall_stdlib(benchmark):
+    body = benchmark(fastjson._dumps_stdlib, RECALL_RESPONSE)
+    assert body.startswith(b'{"ok":true')
+
+def test_render_recall_fast(benchmark):
+    body = benchmark(lambda: fastjson.JSONResponse(RECALL_RESPONSE).body)
+    assert fastjson.loads(body) == RECALL_RESPONSE
+
+def test_generate_static_html(benchmark):
+    html = benchmark(lambda: run_sync(gateway.generate_static_html(WEBSITE["structure"], WEBSITE["content"], WEBSITE["site_data"])))
+    assert "Atelier Bellechasse" in html
+
+def test_html_parse(benchmark):
+    soup = benchmark(BeautifulSoup, SITE_HTML, "lxml")
+    assert soup.title is not None
+
+def test_extract_site(benchmark):
+    soup = BeautifulSoup(SITE_HTML, "lxml")
+    analysis = benchmark(gateway.extract_site, soup, "https://bellechasse.example")
+    assert analysis["structure"]["forms_count"] == 2
+
+class _Timer:
+    """Minimal stand-in for the pytest-benchmark fixture when run as a script"""
+    def __init__(self, name: str):
+        self.name = name
+
+    def _report(self, per_call: float, runs: int):
+        print(f"{self.name:<28}{per_call * 1e6:>12.1f} µs  ({runs} runs)")
+
+    def __call__(self, fn, *args, **kwargs):
+        t = timeit.Timer(lambda: fn(*args, **kwargs))
+        runs, _ = t.autorange()
+        self._report(min(t.repeat(5, runs)) / runs, runs * 5)
+        return fn(*args, **kwargs)
+
+    def pedantic(self, fn, args=(), kwargs=None, setup=None, rounds=1, iterations=1):
+        best = float("inf")
+        for _ in range(rounds):
+            if setup:
+                setup()
+            t0 = time.perf_counter()
+            result = fn(*args, **(kwargs or {}))
+            best = min(best, time.perf_counter() - t0)
+        self._report(best, rounds)
+        return result
+
+if __name__ == "__main__":
+    for name, fn in list(globals().items()):
+        if name.startswith("test_") and callable(fn):
+            fn(_Timer(name[5:]))
@@ -0,0 +1,184 @@
+# Response compression — gzip/brotli negotiated per request, size threshold, streaming-safe, precompressed static files
+import os, zlib, logging
+from typing import Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import FileResponse
+from starlette.staticfiles import StaticFiles
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSION         = os.getenv("COMPRESSION", "1").lower() not in ("0", "false", "no")
+COMPRESS_MIN_SIZE   = int(os.getenv("COMPRESS_MIN_SIZE", "1024"))   # octets ; en dessous, l'en-tête coûte plus qu'il ne rapporte
+COMPRESS_GZIP_LEVEL = int(os.getenv("COMPRESS_GZIP_LEVEL", "6"))
+COMPRESS_BR_QUALITY = int(os.getenv("COMPRESS_BR_QUALITY", "5"))     # 11 = max, trop lent pour des réponses dynamiques
+COMPRESS_TYPES = frozenset({
+    "application/json", "application/x-ndjson", "application/javascript", "application/xml",
+    "text/html", "text/css", "text/plain", "text/javascript", "text/event-stream", "text/xml", "image/svg+xml",
+})
+PRECOMPRESS_EXTENSIONS = (".css", ".js", ".html", ".svg", ".json", ".txt")
+
+log = logging.getLogger("om-gateway")
+
+def accepted_encodings(accept_encoding: str) -> dict:
+    """{coding: q} from an Accept-Encoding header"""
+    allowed = {}
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        allowed[name.strip()] = q
+    return allowed
+
+def accepts(allowed: dict, encoding: str) -> bool:
+    return allowed.get(encoding, allowed.get("*", 0.0)) > 0
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """Best of br/gzip allowed by an Accept-Encoding header (q=0 excludes), None for identity"""
+    allowed = accepted_encodings(accept_encoding)
+    for enc in (("br", "gzip") if brotli is not None else ("gzip",)):
+        if accepts(allowed, enc):
+            return enc
+    return None
+
+class _Compressor:
+    """Incremental encoder; flush() after each chunk keeps SSE/NDJSON events deliverable immediately"""
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "br":
+            self._c = brotli.Compressor(quality=COMPRESS_BR_QUALITY, lgwin=18)   # fenêtre 256 Ko au lieu de 4 Mo par réponse
+        else:
+            self._c = zlib.compressobj(COMPRESS_GZIP_LEVEL, zlib.DEFLATED, 31)   # wbits 31 = conteneur gzip
+
+    def chunk(self, data: bytes, final: bool) -> bytes:
+        if self.encoding == "br":
+            out = self._c.process(data) if data else b""
+            return out + (self._c.finish() if final else self._c.flush())
+        out = self._c.compress(data) if data else b""
+        return out + self._c.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+def _compressible(headers: Headers) -> bool:
+    if "content-encoding" in headers:
+        return False
+    ctype = headers.get("content-type", "").split(";", 1)[0].strip().lower()
+    return ctype in COMPRESS_TYPES
+
+class CompressionMiddleware:
+    """Pure ASGI: whole bodies below COMPRESS_MIN_SIZE go out untouched, streamed bodies are compressed per chunk"""
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            return await self.app(scope, receive, send)
+
+        start = None
+        comp: Optional[_Compressor] = None
+        passthrough = False
+
+        async def send_wrapper(message):
+            nonlocal start, comp, passthrough
+            if message["type"] == "http.response.start":
+                start = message                      # retenu jusqu'au premier corps : la taille décide
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                return await send(message)
+            body, more = message.get("body", b""), message.get("more_body", False)
+            if start is not None:
+                headers = MutableHeaders(raw=list(start["headers"]))
+                if not _compressible(headers) or (not more and len(body) < COMPRESS_MIN_SIZE) or start["status"] in (204, 304):
+                    passthrough = True
+                    await send(start)
+                    start = None
+                    return await send(message)
+                comp = _Compressor(encoding)
+                headers["content-encoding"] = encoding
+                headers.add_vary_header("Accept-Encoding")
+                etag = headers.get("etag")
+                if etag and not etag.startswith("W/"):
+                    headers["etag"] = "W/" + etag            # autres octets que l'original : plus un ETag fort
+                if "content-length" in headers:
+                    del headers["content-length"]
+                if not more:
+                    body = comp.chunk(body, True)
+                    headers["content-length"] = str(len(body))
+                    await send(dict(start, headers=headers.raw))
+                    start = None
+                    return await send({"type": "http.response.body", "body": body})
+                await send(dict(start, headers=headers.raw))
+                start = None
+            await send({"type": "http.response.body", "body": comp.chunk(body, not more), "more_body": more})
+
+        await self.app(scope, receive, send_wrapper)
+        if start is not None:                        # réponse sans message de corps
+            await send(start)
+
+# ---------- Fichiers statiques précompressés ----------
+def precompress(directory: str) -> int:
+    """Write .gz (and .br) next to each text asset whose variant is missing or older; returns files written"""
+    written = 0
+    for root, _, files in os.walk(directory):
+        for name in files:
+            if not name.endswith(PRECOMPRESS_EXTENSIONS):
+                continue
+            path = os.path.join(root, name)
+            mtime = os.path.getmtime(path)
+            data = None
+            variants = [(".gz", _gzip_file)]
+            if brotli is not None:
+                variants.append((".br", lambda d: brotli.compress(d, quality=11)))
+            for ext, encode in variants:
+                target = path + ext
+                if os.path.exists(target) and os.path.getmtime(target) >= mtime:
+                    continue
+                if data is None:
+                    with open(path, "rb") as f:
+                        data = f.read()
+                try:
+                    with open(target + ".tmp", "wb") as f:
+                        f.write(encode(data))
+                    os.replace(target + ".tmp", target)
+                    written += 1
+                except OSError as e:
+                    log.warning(f"precompress {target} failed: {e}")
+    return written
+
+def _gzip_file(data: bytes) -> bytes:
+    c = zlib.compressobj(9, zlib.DEFLATED, 31)
+    return c.compress(data) + c.flush()
+
+class PrecompressedStaticFiles(StaticFiles):
+    """StaticFiles serving file.br / file.gz when present and accepted, with the original media type"""
+    async def get_response(self, path: str, scope):
+        response = await super().get_response(path, scope)
+        if not isinstance(response, FileResponse) or response.status_code != 200:
+            return response
+        allowed = accepted_encodings(Headers(scope=scope).get("accept-encoding", ""))
+        for enc, ext in (("br", ".br"), ("gzip", ".gz")):
+            if not accepts(allowed, enc):
+                continue
+            variant = response.path + ext
+            try:
+                stat = os.stat(variant)
+            except OSError:
+                continue
+            if stat.st_mtime < os.path.getmtime(response.path):
+                continue                             # variante périmée : l'original fait foi
+            # ETag/Last-Modified de l'original conservés : les 304 de StaticFiles restent valables
+            headers = {k: v for k, v in response.headers.items() if k not in ("content-type", "content-length")}
+            headers["content-encoding"] = enc
+            headers["vary"] = "Accept-Encoding"
+            return FileResponse(variant, headers=headers, media_type=response.media_type, stat_result=stat)
+        response.headers["vary"] = "Accept-Encoding"
+        return response
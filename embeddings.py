@@ -0,0 +1,151 @@
+# Local text embeddings — hashed word/char n-gram vectors and a cosine top-k index (NumPy if installed)
+import os, re, zlib, unicodedata
+from typing import Dict, Hashable, List, Optional, Tuple
+
+_np = False          # numpy chargé au premier index : gateway s'importe sans lui
+
+EMBED_DIM = int(os.getenv("EMBED_DIM", "512"))
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+# Mots vides FR/EN : ils dominent les phrases courtes et rapprochent des questions sans rapport
+STOPWORDS = frozenset("""
+a an and are as at be by can could do does did for from how i in is it me my of on or our please
+so that the this to was we what when where which who why will with would you your
+au aux avec ce ces comment de des du elle en est et il je la le les leur ma mes mon ne nous on ou
+par pas pour qu que quel quelle qui sa se ses son sur ta te tes ton tu un une vos votre vous y
+""".split())
+
+Vector = Dict[int, float]    # creux : indice -> poids, norme L2 = 1
+
+def numpy():
+    """The numpy module, imported on first use, or None when it is not installed"""
+    global _np
+    if _np is False:
+        try:
+            import numpy as np
+        except ImportError:   # index pur Python, plus lent mais sans dépendance
+            np = None
+        _np = np
+    return _np
+
+def _fold(text: str) -> str:
+    text = unicodedata.normalize("NFKD", text.lower())
+    return "".join(c for c in text if not unicodedata.combining(c))
+
+def _stem(w: str) -> str:
+    # Racinisation minimale (pluriels, e muet) : "costs"/"cost", "coûte"/"coût"
+    if len(w) > 3 and w.endswith("s"):
+        w = w[:-1]
+    if len(w) > 3 and w.endswith("e"):
+        w = w[:-1]
+    return w
+
+def features(text: str) -> List[Tuple[str, float]]:
+    """Word unigrams and bigrams plus character trigrams, so paraphrases and typos still overlap"""
+    words = [_stem(w) for w in _WORD.findall(_fold(text)) if w not in STOPWORDS]
+    out = [(w, 1.0) for w in words]
+    out += [(a + " " + b, 0.7) for a, b in zip(words, words[1:])]
+    for w in words:
+        padded = f"<{w}>"
+        out += [("#" + padded[i:i + 3], 0.3) for i in range(len(padded) - 2)]
+    return out
+
+def embed(text: str, dim: int = EMBED_DIM) -> Vector:
+    vec: Vector = {}
+    for feat, weight in features(text):
+        h = zlib.crc32(feat.encode("utf-8"))
+        idx = h % dim
+        vec[idx] = vec.get(idx, 0.0) + (weight if h & 0x80000000 else -weight)
+    norm = sum(v * v for v in vec.values()) ** 0.5
+    if not norm:
+        return {}
+    return {i: v / norm for i, v in vec.items() if v}
+
+def cosine(a: Vector, b: Vector) -> float:
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(v * b.get(i, 0.0) for i, v in a.items())
+
+class VectorIndex:
+    """Rows keyed by any hashable; removal swaps the last row in, so the matrix stays dense"""
+    def __init__(self, dim: int = EMBED_DIM, capacity: int = 64):
+        self.dim = dim
+        self._keys: List[Hashable] = []
+        self._pos: Dict[Hashable, int] = {}
+        self._np = np = numpy()
+        if np is not None:
+            self._mat = np.zeros((capacity, dim), dtype=np.float32)
+        else:
+            self._rows: List[Vector] = []
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __contains__(self, key) -> bool:
+        return key in self._pos
+
+    def add(self, key: Hashable, vec: Vector):
+        if key in self._pos:
+            self.remove(key)
+        n = len(self._keys)
+        np = self._np
+        if np is not None:
+            if n == self._mat.shape[0]:
+                grown = np.zeros((n * 2, self.dim), dtype=np.float32)
+                grown[:n] = self._mat
+                self._mat = grown
+            row = self._mat[n]
+            row[:] = 0.0
+            if vec:
+                row[list(vec.keys())] = list(vec.values())
+        else:
+            self._rows.append(vec)
+        self._keys.append(key)
+        self._pos[key] = n
+
+    def remove(self, key: Hashable):
+        i = self._pos.pop(key, None)
+        if i is None:
+            return
+        last = len(self._keys) - 1
+        if i != last:
+            moved = self._keys[last]
+            self._keys[i] = moved
+            self._pos[moved] = i
+            if self._np is not None:
+                self._mat[i] = self._mat[last]
+            else:
+                self._rows[i] = self._rows[last]
+        self._keys.pop()
+        if self._np is None:
+            self._rows.pop()
+
+    def clear(self):
+        self._keys.clear()
+        self._pos.clear()
+        if self._np is None:
+            self._rows.clear()
+
+    def search(self, vec: Vector, k: int = 1, min_score: Optional[float] = None) -> List[Tuple[float, Hashable]]:
+        """Top-k (score, key) by cosine similarity, best first"""
+        n = len(self._keys)
+        if not n or not vec:
+            return []
+        np = self._np
+        if np is not None:
+            q = np.zeros(self.dim, dtype=np.float32)
+            q[list(vec.keys())] = list(vec.values())
+            scores = self._mat[:n] @ q
+            if k >= n:
+                top = np.argsort(-scores)
+            else:
+                top = np.argpartition(-scores, k)[:k]
+                top = top[np.argsort(-scores[top])]
+            hits = [(float(scores[i]), self._keys[i]) for i in top]
+        else:
+            hits = sorted(((cosine(vec, r), self._keys[i]) for i, r in enumerate(self._rows)),
+                          key=lambda h: -h[0])[:k]
+        if min_score is not None:
+            hits = [h for h in hits if h[0] >= min_score]
+        return hits
@@ -0,0 +1,41 @@
+# Fast JSON — orjson when installed, stdlib otherwise; one dumps/loads and a JSONResponse for the whole gateway
+import os, json
+
+from starlette.responses import JSONResponse as _StarletteJSONResponse
+
+JSON_ENGINE = os.getenv("JSON_ENGINE", "").lower()    # "stdlib" force le repli (comparaisons, débogage)
+
+try:
+    if JSON_ENGINE == "stdlib":
+        raise ImportError
+    import orjson
+except ImportError:
+    orjson = None
+
+ENGINE = "orjson" if orjson is not None else "stdlib"
+
+def _default(obj):
+    # Types hors JSON natif (datetime, Decimal, set, modèles pydantic...) : même rendu que FastAPI
+    from fastapi.encoders import jsonable_encoder
+    return jsonable_encoder(obj)
+
+def _dumps_stdlib(obj) -> bytes:
+    # Mêmes options que starlette.responses.JSONResponse
+    return json.dumps(obj, ensure_ascii=False, allow_nan=False, separators=(",", ":"), default=_default).encode("utf-8")
+
+if orjson is not None:
+    _OPTIONS = orjson.OPT_NON_STR_KEYS
+
+    def _dumps_orjson(obj) -> bytes:
+        return orjson.dumps(obj, default=_default, option=_OPTIONS)
+
+    dumps = _dumps_orjson
+    loads = orjson.loads      # orjson.JSONDecodeError hérite de ValueError, comme json.JSONDecodeError
+else:
+    dumps = _dumps_stdlib
+    loads = json.loads
+
+class JSONResponse(_StarletteJSONResponse):
+    """fastapi.responses.JSONResponse rendered with dumps(); returning it directly also skips jsonable_encoder"""
+    def render(self, content) -> bytes:
+        return dumps(content)
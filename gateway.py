@@ -1,13 +1,19 @@
 # ONLYMATT Gateway — prod-1.6 (Render, libsql-client 0.3.x stable)
-import os, time, logging, httpx
-from typing import Optional, Deque, Dict
+import time
+_T_IMPORT = time.perf_counter()          # temps d'import et de démarrage, exposés par /readyz
+import os, json, logging, asyncio, httpx
+from typing import Optional, Deque, Dict, List, Tuple
 from collections import defaultdict, deque
-from fastapi import FastAPI, Request, HTTPException, Body, Header, Response, UploadFile, File, Form
-from routes_ai import router as ai_router
-from fastapi.responses import RedirectResponse, RedirectResponse
+from contextlib import AsyncExitStack
+from datetime import datetime, timezone
+from fastapi import FastAPI, Request, HTTPException, Body, Header, Response, UploadFile, File, Form, Depends
+from routes_ai import router as ai_router, ensure_schema as ensure_ai_schema, thread_cache as ai_thread_cache, usage_client
+from fastapi.responses import RedirectResponse, RedirectResponse, StreamingResponse
 from db_health import router as db_health_router
-from fastapi.responses import JSONResponse
+import wp_client, wp_journal, upstream, admission, usage, prompts, response_cache, memory_index, replica, storage, metrics, tracing, profiler, fastjson, compression, assets
+from fastjson import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.background import BackgroundTask
 
 # Load environment variables
 try:
@@ -23,22 +29,32 @@ OLLAMA_URL    = os.getenv("OLLAMA_URL", "")
 GROQ_API_KEY  = os.getenv("GROQ_API_KEY", "")
 TURSO_DB_URL  = os.getenv("TURSO_DB_URL", "")
 TURSO_DB_AUTH = os.getenv("TURSO_DB_AUTH_TOKEN", "")
+OLLAMA_MODEL  = os.getenv("OLLAMA_MODEL", "qwen2.5:7b-instruct")
 
 # ---------- App ----------
 logging.basicConfig(level=logging.INFO)
 log = logging.getLogger("om-gateway")
 
-app = FastAPI(title="ONLYMATT Gateway", version="prod-1.7")
-app.include_router(ai_router)
+# orjson si disponible ; les routes à gros volume renvoient JSONResponse directement (pas de passe jsonable_encoder)
+app = FastAPI(title="ONLYMATT Gateway", version="prod-1.7", default_response_class=JSONResponse)
+def rate_limited(request: Request):
+    rl(request.client.host)
+
+# /ai/threads/chat consomme des tokens comme /ai/chat : même limite par IP
+app.include_router(ai_router, dependencies=[Depends(rate_limited)])
 
 app.include_router(db_health_router)
-# Templates
-from fastapi.templating import Jinja2Templates
-templates = Jinja2Templates(directory="templates")
+# Templates (Jinja2 chargé à la première page admin : les instances API seules ne le paient jamais)
+def load_templates():
+    from fastapi.templating import Jinja2Templates
+    templates = Jinja2Templates(directory="templates")
+    templates.env.globals["static_url"] = assets.static_url
+    return templates
+
+pages = assets.PageCache(load_templates)     # pages admin sans données par requête : rendues une fois, ETag/304
 
-# Static files
-from fastapi.staticfiles import StaticFiles
-app.mount("/static", StaticFiles(directory="static"), name="static")
+# Static files (variantes .br/.gz précompressées au démarrage, URLs ?v=<hash> en cache immuable)
+app.mount("/static", assets.CachedStaticFiles(directory="static"), name="static")
 
 app.add_middleware(
     CORSMiddleware,
@@ -48,6 +64,45 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compression gzip/brotli (ajoutée avant les métriques : elles mesurent aussi le temps de compression)
+if compression.COMPRESSION:
+    app.add_middleware(compression.CompressionMiddleware)
+
+# Métriques par route (middleware ajouté en dernier = le plus externe, il mesure aussi CORS)
+app.add_middleware(metrics.MetricsMiddleware)
+app.add_middleware(tracing.TracingMiddleware)
+app.add_middleware(profiler.ProfilerMiddleware)
+
+# ---------- Upstream LLM routing ----------
+# Groq en primaire, cible Ollama/AI_BACKEND en secours (disjoncteur par backend, bascule automatique)
+_backends = []
+if GROQ_API_KEY:
+    _backends.append(upstream.Backend("groq", upstream.GROQ_URL, headers={"Authorization": f"Bearer {GROQ_API_KEY}"}))
+_fallback_target = OLLAMA_URL or (AI_BACKEND if AI_BACKEND not in ["groq", "ollama", ""] else None)
+if _fallback_target:
+    _backends.append(upstream.Backend("ollama", _fallback_target, model=OLLAMA_MODEL))
+llm = upstream.configure(_backends)
+
+_precompress_task: Optional[asyncio.Task] = None
+
+@app.on_event("startup")
+async def precompress_static():
+    # En tâche de fond : ne retarde pas la première requête, les originaux sont servis en attendant
+    global _precompress_task
+    _precompress_task = asyncio.create_task(_precompress_static())
+
+async def _precompress_static():
+    try:
+        n = await asyncio.to_thread(compression.precompress, "static")
+        if n:
+            log.info(f"precompressed {n} static variants")
+    except Exception as e:
+        log.warning(f"precompress failed: {e}")
+
+@app.on_event("shutdown")
+async def close_upstreams():
+    await llm.aclose()
+
 # ---------- Health endpoints ----------
 @app.get("/")
 async def root():
@@ -65,6 +120,26 @@ async def health():
 async def healthz():
     return {"ok": True}
 
+# Liveness (/health, /healthz) : le processus répond. Readiness (/readyz) : démarrage terminé (schéma, stockage),
+# à utiliser comme health check Render pour ne router le trafic qu'une fois l'instance prête.
+_ready = False
+_startup_ms: Dict[str, float] = {}
+
+@app.get("/readyz")
+async def readyz():
+    if not _ready:
+        return JSONResponse({"ok": False, "status": "not ready"}, status_code=503)
+    return {"ok": True, "storage": storage.backend_name() or None, **_startup_ms}
+
+async def mark_not_ready():
+    global _ready
+    _ready = False
+    if _precompress_task is not None and not _precompress_task.done():
+        _precompress_task.cancel()
+
+# Premier hook d'arrêt, quel que soit l'ordre d'enregistrement : /readyz passe à 503 avant la fermeture du stockage
+app.router.on_shutdown.insert(0, mark_not_ready)
+
 # ---------- Rate-limit ----------
 WINDOW_SEC = 60
 MAX_REQ_PER_WINDOW = 60
@@ -94,6 +169,8 @@ async def ai_health():
         "ai_backend": bool(AI_BACKEND),
         "ollama": bool(OLLAMA_URL),
         "turso": bool(TURSO_DB_URL and TURSO_DB_AUTH),
+        "storage": storage.backend_name(),
+        "json": fastjson.ENGINE,
     }
 
 @app.get("/ai/libcheck")
@@ -139,15 +216,81 @@ async def ai_admin(x_om_key: Optional[str] = Header(None)):
         "ai_backend": AI_BACKEND or None,
         "ollama_url": OLLAMA_URL or None,
         "turso": bool(TURSO_DB_URL and TURSO_DB_AUTH),
+        "upstreams": llm.stats(),
+        "admission": admission.controller.stats(),
+        "usage_budget": usage.CLIENT_TOKEN_BUDGET or None,
+        "thread_cache": ai_thread_cache.stats(),
+        "prompts": prompts.stats(),
+        "response_cache": response_cache.cache.stats(),
+        "memory_index": memory_index.index.stats(),
+        "replica": replica.stats(),
+        "pages": pages.stats(),
     }
 
+@app.get("/admin/traces")
+async def admin_traces(limit: int = 20, x_om_key: Optional[str] = Header(None)):
+    """Slowest recent requests (>= TRACE_SLOW_MS) with their spans"""
+    require_admin(x_om_key)
+    return {"ok": True, "threshold_ms": tracing.TRACE_SLOW_MS, "traces": tracing.slow_traces(max(1, min(limit, 200)))}
+
+@app.post("/admin/profile/start")
+async def profile_start(payload: dict = Body({}), x_om_key: Optional[str] = Header(None)):
+    """Sample `rate` of requests for `seconds` (max PROFILE_MAX_SECONDS) every `interval_ms`"""
+    require_admin(x_om_key)
+    try:
+        s = profiler.start(
+            seconds=float(payload.get("seconds", 30)),
+            rate=float(payload.get("rate", 0.1)),
+            interval_ms=float(payload.get("interval_ms", 5)),
+            all_threads=bool(payload.get("all_threads", False)),
+        )
+    except RuntimeError as e:
+        raise HTTPException(409, str(e))
+    except (TypeError, ValueError):
+        raise HTTPException(400, "seconds, rate and interval_ms must be numbers")
+    return {"ok": True, "profile": s.summary()}
+
+@app.post("/admin/profile/stop")
+async def profile_stop(x_om_key: Optional[str] = Header(None)):
+    require_admin(x_om_key)
+    s = profiler.stop()
+    return {"ok": True, "profile": s.summary() if s else None}
+
+@app.get("/admin/profile")
+async def profile_result(format: str = "json", limit: int = 30, x_om_key: Optional[str] = Header(None)):
+    """format=collapsed returns folded stacks for flamegraph.pl / speedscope"""
+    require_admin(x_om_key)
+    s = profiler.current()
+    if s is None:
+        raise HTTPException(404, "No profiling session")
+    if format == "collapsed":
+        return Response(s.collapsed(), media_type="text/plain")
+    return {"ok": True, "profile": s.summary(), "top": s.top(max(1, min(limit, 200)))}
+
+@app.get("/metrics")
+async def prometheus_metrics(authorization: Optional[str] = Header(None)):
+    if metrics.METRICS_TOKEN and authorization != f"Bearer {metrics.METRICS_TOKEN}":
+        raise HTTPException(401, "Bad token")
+    return Response(metrics.render(), media_type="text/plain; version=0.0.4")
+
+metrics.gauge("om_llm_admission", "LLM admission slots in use and waiters per class", ("state",),
+              lambda: {("active",): admission.controller.active,
+                       **{(f"waiting_{c}",): v["waiting"] for c, v in admission.controller.stats()["classes"].items()}})
+metrics.gauge("om_upstream_healthy", "1 if the upstream backend is considered healthy", ("backend",),
+              lambda: {(b.name,): int(b.healthy()) for b in upstream.router.backends})
+metrics.gauge("om_replica_lag_seconds", "Seconds since the last successful replica pull", (),
+              lambda: {(): replica.stats().get("lag_seconds")})
+metrics.gauge("om_thread_cache_pending_writes", "ai_messages rows waiting for the write-behind flush", (),
+              lambda: {(): ai_thread_cache.stats()["pending_writes"]})
+
 # ---------- Chat proxy ----------
-@app.post("/ai/chat")
-async def ai_chat(request: Request):
-    rl(request.client.host)
+def parse_chat_request(body: bytes) -> Tuple[dict, list, float, int, str]:
+    """Decode an /ai/chat body into (payload, messages, temperature, max_tokens, model)"""
     try:
-        payload = await request.json()
-    except Exception:
+        payload = fastjson.loads(body)
+    except ValueError:
+        raise HTTPException(400, "Bad JSON")
+    if not isinstance(payload, dict):
         raise HTTPException(400, "Bad JSON")
 
     # Support both formats: OpenAI format (messages array) and simplified format (thread_id, message)
@@ -173,7 +316,15 @@ async def ai_chat(request: Request):
     else:
         raise HTTPException(400, "Either 'messages' array or 'message' field is required")
 
-    # Support for Groq API
+    return payload, messages, temperature, max_tokens, model
+
+@app.post("/ai/chat")
+async def ai_chat(request: Request):
+    rl(request.client.host)
+    body = await request.body()
+    payload, messages, temperature, max_tokens, model = parse_chat_request(body)
+
+    # Support for Groq API (failover to the secondary backend handled by the upstream router)
     if GROQ_API_KEY and (AI_BACKEND == "groq" or not (OLLAMA_URL or AI_BACKEND)):
         try:
             # Convert to Groq format
@@ -184,25 +335,33 @@ async def ai_chat(request: Request):
                 "max_tokens": max_tokens,
                 "stream": False
             }
-
-            timeout = httpx.Timeout(60.0, read=60.0, write=30.0, connect=10.0)
-            async with httpx.AsyncClient(timeout=timeout) as hx:
-                headers = {
-                    "Authorization": f"Bearer {GROQ_API_KEY}",
-                    "Content-Type": "application/json"
+            # Cache des réponses (exact puis sémantique), par persona/modèle/prompt système/temperature/max_tokens
+            cache_key = response_cache.cache_key(messages) if response_cache.RESPONSE_CACHE and payload.get("cache", True) else None
+            if cache_key:
+                partition = response_cache.partition_key(payload.get("persona"), model, messages, temperature, max_tokens)
+                hit = response_cache.cache.lookup(partition, cache_key)
+                if hit:
+                    answer, tier, score = hit
+                    return JSONResponse(response_cache.replay(answer), headers={"X-Cache": tier, "X-Cache-Score": str(score)})
+            client_key = usage_client(request)
+            r, backend = await llm.complete(groq_payload, route="chat", client=client_key)
+            if r.status_code == 200:
+                groq_response = upstream.response_json(r)
+                # Convert Groq response to expected format
+                answer = {
+                    "ok": True,
+                    "response": upstream.completion_text(groq_response),
+                    "model": groq_response.get("model", backend.model or model),
+                    "usage": groq_response.get("usage", {})
                 }
-                r = await hx.post("https://api.groq.com/openai/v1/chat/completions", json=groq_payload, headers=headers)
-                if r.status_code == 200:
-                    groq_response = r.json()
-                    # Convert Groq response to expected format
-                    return {
-                        "ok": True,
-                        "response": groq_response["choices"][0]["message"]["content"],
-                        "model": groq_response["model"],
-                        "usage": groq_response.get("usage", {})
-                    }
-                else:
-                    return JSONResponse({"ok": False, "error": r.text}, status_code=r.status_code)
+                if cache_key and answer["response"]:
+                    response_cache.cache.store(partition, cache_key, answer)
+                return JSONResponse(answer)
+            else:
+                headers = {"Retry-After": r.headers["retry-after"]} if "retry-after" in r.headers else None
+                return JSONResponse({"ok": False, "error": r.text}, status_code=r.status_code, headers=headers)
+        except upstream.UpstreamError as e:
+            return JSONResponse({"ok": False, "error": e.detail}, status_code=e.status_code, headers=e.headers())
         except Exception as e:
             return JSONResponse({"ok": False, "error": str(e)}, status_code=500)
 
@@ -211,31 +370,137 @@ async def ai_chat(request: Request):
     if not target:
         raise HTTPException(502, "No AI backend configured")
     try:
-        timeout = httpx.Timeout(60.0, read=60.0, write=30.0, connect=10.0)
-        async with httpx.AsyncClient(timeout=timeout) as hx:
-            r = await hx.post(target, json=payload)
-            ct = r.headers.get("content-type", "")
-            data = r.json() if "application/json" in ct else {"raw": r.text}
-            return JSONResponse(data, status_code=r.status_code)
+        if AI_PROXY_STREAM:
+            return await proxy_stream(target, body, request.headers.get("accept-encoding", "identity"))
+        async with admission.controller.slot("chat"):
+            t0 = time.monotonic()
+            r = await proxy_client().post(target, content=body, headers={"content-type": "application/json"})
+        metrics.observe_dependency("ai_backend", "proxy", r.status_code, time.monotonic() - t0)
+        ct = r.headers.get("content-type", "")
+        if "application/json" in ct:
+            # Corps JSON renvoyé tel quel : pas de décodage/ré-encodage
+            return Response(r.content, status_code=r.status_code, media_type=ct)
+        return JSONResponse({"raw": r.text}, status_code=r.status_code)
+    except admission.Overloaded as e:
+        raise HTTPException(503, "Gateway busy, retry later", headers={"Retry-After": str(int(e.retry_after + 0.999))})
     except httpx.ConnectError:
         raise HTTPException(502, "AI backend unreachable")
-    except httpx.ReadTimeout:
+    except httpx.TimeoutException:
         raise HTTPException(504, "AI backend timeout")
 
-# ---------- Memory (Turso) ----------
+# ---------- Generic AI backend passthrough ----------
+# Corps amont relayé octet par octet (JSON, SSE, chunked) : mémoire constante, aucun décodage
+AI_PROXY_STREAM = os.getenv("AI_PROXY_STREAM", "1").lower() not in ("0", "false", "no")
+PROXY_HEADERS = frozenset({
+    "content-type", "content-encoding", "content-length", "cache-control", "retry-after",
+    "x-ratelimit-limit-requests", "x-ratelimit-remaining-requests", "x-ratelimit-reset-requests",
+    "x-ratelimit-limit-tokens", "x-ratelimit-remaining-tokens", "x-ratelimit-reset-tokens",
+})
+_proxy_client: Optional[httpx.AsyncClient] = None
+
+def proxy_client() -> httpx.AsyncClient:
+    """One pooled client for the generic backend (keep-alive instead of a new connection per request)"""
+    global _proxy_client
+    if _proxy_client is None:
+        _proxy_client = httpx.AsyncClient(timeout=httpx.Timeout(60.0, read=60.0, write=30.0, connect=10.0))
+    return _proxy_client
+
+async def proxy_stream(target: str, body: bytes, accept_encoding: str = "identity") -> StreamingResponse:
+    """Forward the request body and relay the raw (still encoded) upstream bytes as they arrive.
+
+    The caller's Accept-Encoding goes upstream (httpx would otherwise ask for gzip/br on its behalf),
+    so the relayed content-encoding is always one the caller can decode.
+    An admission slot is held from the send until the relay ends, like every other LLM call.
+    """
+    slot = AsyncExitStack()
+    await slot.enter_async_context(admission.controller.slot("chat"))    # Overloaded -> 503 dans ai_chat
+    t0 = time.monotonic()
+    try:
+        req = proxy_client().build_request("POST", target, content=body,
+                                           headers={"content-type": "application/json", "accept-encoding": accept_encoding})
+        r = await proxy_client().send(req, stream=True)
+    except BaseException:
+        await slot.aclose()
+        raise
+    metrics.observe_dependency("ai_backend", "proxy", r.status_code, time.monotonic() - t0)   # temps jusqu'aux en-têtes
+    headers = {k: v for k, v in r.headers.items() if k in PROXY_HEADERS}
+    if "chunked" in r.headers.get("transfer-encoding", ""):
+        headers.pop("content-length", None)
+
+    done = False
+    async def finish():
+        # Fin du relais, ou tâche de fond si le client coupe avant le premier chunk : slot et connexion rendus une fois
+        nonlocal done
+        if not done:
+            done = True
+            try:
+                await r.aclose()
+            finally:
+                await slot.aclose()
+
+    async def relay():
+        try:
+            async for chunk in r.aiter_raw():
+                yield chunk
+        finally:
+            await finish()
+    return StreamingResponse(relay(), status_code=r.status_code, headers=headers, background=BackgroundTask(finish))
+
+@app.on_event("shutdown")
+async def close_proxy_client():
+    global _proxy_client
+    if _proxy_client is not None:
+        c, _proxy_client = _proxy_client, None
+        await c.aclose()
+
+# ---------- Row decoding ----------
+# libsql Row, sqlite3.Row, dict ou tuple : même extraction pour tous les backends
+TASKS_COLUMNS        = ("id", "title", "description", "priority", "status", "created_at", "updated_at")
+REPORTS_COLUMNS      = ("id", "type", "title", "content", "created_at")
+ANALYSES_COLUMNS     = ("id", "type", "path", "results", "stats", "created_at")
+CHAT_HISTORY_COLUMNS = ("id", "user_message", "assistant_response", "model", "temperature", "created_at")
+
+def pick(row, name, idx):
+    """Column by name (mapping-like rows) or by position; None when missing"""
+    try:
+        if isinstance(row, dict):
+            return row.get(name)
+        try:
+            return row[name]      # mapping-like
+        except Exception:
+            return row[idx]       # tuple/list-like
+    except Exception:
+        return None
+
+def decode_rows(rows, columns) -> List[dict]:
+    """Rows of a SELECT * into dicts; columns in table order (position fallback)"""
+    return [{name: pick(r, name, i) for i, name in enumerate(columns)} for r in rows]
+
+def decode_memories(rows) -> List[dict]:
+    """Rows of the recall query (aliases k, v, c, t) into the API shape"""
+    out = []
+    for r in rows:
+        c = pick(r, "c", 2)
+        t = pick(r, "t", 3)
+        out.append({
+            "key": pick(r, "k", 0),
+            "value": pick(r, "v", 1),
+            "confidence": (float(c) if c is not None else None),
+            "created_at": (str(t) if t is not None else None),
+        })
+    return out
+
+# ---------- Memory (Turso or local SQLite, see storage.py) ----------
 try:
-    from libsql_client import create_client
     _db = None
 
-    def _normalize_turso_url(u: str) -> str:
-        return ("https://" + u[len("libsql://"):]) if u.startswith("libsql://") else u
-
     def db():
         global _db
-        if not TURSO_DB_URL or not TURSO_DB_AUTH:
-            raise HTTPException(500, "Turso not configured")
         if _db is None:
-            _db = create_client(url=_normalize_turso_url(TURSO_DB_URL), auth_token=TURSO_DB_AUTH)
+            backend = storage.get()
+            if backend is None:
+                raise HTTPException(500, "Storage not configured (set TURSO_DB_URL/TURSO_DB_AUTH_TOKEN or SQLITE_PATH)")
+            _db = replica.wrap(backend)
         return _db
 
     SCHEMA_SQL = [
@@ -252,6 +517,7 @@ try:
         );
         """,
         "CREATE INDEX IF NOT EXISTS idx_mem_user ON memories(user_id, persona, key);",
+        "CREATE INDEX IF NOT EXISTS idx_mem_export ON memories(user_id, created_at, id);",
         """
         CREATE TABLE IF NOT EXISTS admin_tasks (
           id TEXT PRIMARY KEY,
@@ -292,41 +558,46 @@ try:
           created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         );
         """,
+        wp_journal.SCHEMA_SQL,
+        usage.SCHEMA_SQL,
     ]
 
     @app.on_event("startup")
     async def init_schema():
-        if TURSO_DB_URL and TURSO_DB_AUTH:
+        if storage.backend_name():
             try:
                 conn = db()
                 for stmt in SCHEMA_SQL:              # pas d'execute_batch en 0.3.x
                     s = stmt.strip().rstrip(";")
                     if s:
                         await conn.execute(s)
-                log.info("Turso schema ready.")
+                await ensure_ai_schema()
+                log.info(f"{storage.backend_name()} schema ready.")
+                await usage.ledger.seed_daily(conn)
+                replica.start(conn)
             except Exception as e:
-                log.warning(f"Turso init skipped: {e}")
+                log.warning(f"Storage init skipped: {e}")
         else:
-            log.info("Turso not configured; memory routes will 500 if called.")
+            log.info("No storage configured; memory routes will 500 if called.")
+        # Toujours démarré : sans stockage, la boucle ne fait que purger les compteurs en mémoire
+        usage.ledger.start(db if storage.backend_name() else None)
 
     @app.on_event("shutdown")
     async def close_db():
         global _db
+        await usage.ledger.stop()
+        await ai_thread_cache.flush()
+        await replica.stop()
         try:
-            if _db is not None:
-                close_fn = getattr(_db, "close", None)
-                if callable(close_fn):
-                    ret = close_fn()
-                    if hasattr(ret, "__await__"):
-                        await ret
-                _db = None
+            await storage.close()
+            _db = None
         except Exception:
             pass
 
 except Exception as e:
-    log.warning(f"Turso client not available: {e}")
+    log.warning(f"Storage not available: {e}")
     def db():
-        raise HTTPException(500, "libsql-client not installed")
+        raise HTTPException(500, "Storage not available")
 
 # ---------- Memory endpoints ----------
 @app.post("/ai/memory/remember")
@@ -355,18 +626,25 @@ async def memory_remember(request: Request, payload: dict = Body(...)):
             "ttl_days": int(payload.get("ttl_days", 180)),
         }
         await db().execute(sql, params)
+        memory_index.index.add(params["user_id"], params["persona"], mid, params["key"], params["value"],
+                               params["confidence"], time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime()))
         return {"ok": True, "id": mid}
     except Exception as e:
         logging.exception("remember failed")
         return JSONResponse({"ok": False, "err": str(e)}, status_code=500)
 
 @app.get("/ai/memory/recall")
-async def memory_recall(user_id: str, persona: str = "coach_v1", limit: int = 100):
+async def memory_recall(user_id: str, persona: str = "coach_v1", limit: int = 100, q: Optional[str] = None):
     try:
         # bornage LIMIT & quoting simple (bypass bug 'result')
         limit_int = max(1, min(int(limit), 500))
 
-        def q(s: str) -> str:
+        if q:
+            # Rappel par pertinence : les `limit` souvenirs les plus proches de q, triés par score
+            out = await memory_index.index.search(db(), user_id, persona, q, limit_int)
+            return JSONResponse({"ok": True, "memories": out})
+
+        def sq(s: str) -> str:
             return s.replace("'", "''")
 
         # aliases stables pour extraction robuste
@@ -375,40 +653,165 @@ async def memory_recall(user_id: str, persona: str = "coach_v1", limit: int = 10
             "       value AS v, "
             "       confidence AS c, "
             "       created_at AS t "
-            f"FROM memories WHERE user_id='{q(user_id)}' AND persona='{q(persona)}' "
+            f"FROM memories WHERE user_id='{sq(user_id)}' AND persona='{sq(persona)}' "
             f"ORDER BY created_at DESC LIMIT {limit_int}"
         )
 
         res = await db().execute(sql)
+        return JSONResponse({"ok": True, "memories": decode_memories(res.rows)})
+    except Exception as e:
+        logging.exception("recall failed")
+        return JSONResponse({"ok": False, "err": str(e)}, status_code=500)
 
-        def pick(row, name, idx):
-            try:
-                if isinstance(row, dict):
-                    return row.get(name)
-                try:
-                    return row[name]      # mapping-like
-                except Exception:
-                    return row[idx]       # tuple/list-like
-            except Exception:
-                return None
+# ---------- Bulk memory import/export (NDJSON) ----------
+import json
+from fastapi.responses import StreamingResponse
+
+MEMORY_IMPORT_BATCH = int(os.getenv("MEMORY_IMPORT_BATCH", "500"))    # lignes par transaction
+MEMORY_EXPORT_PAGE  = 1000
+MEMORY_IMPORT_MAX_ERRORS = 100
+
+MEMORY_UPSERT_SQL = (
+    "INSERT INTO memories(id,user_id,persona,key,value,confidence,ttl_days,created_at) "
+    "VALUES(:id,:user_id,:persona,:key,:value,:confidence,:ttl_days,COALESCE(:created_at,CURRENT_TIMESTAMP)) "
+    "ON CONFLICT(id) DO UPDATE SET key=excluded.key, value=excluded.value, "
+    "confidence=excluded.confidence, ttl_days=excluded.ttl_days "
+    "WHERE memories.user_id = excluded.user_id AND memories.persona = excluded.persona"   # jamais la ligne d'un autre couple
+)
 
-        out = []
-        for r in res.rows:
-            k = pick(r, "k", 0)
-            v = pick(r, "v", 1)
-            c = pick(r, "c", 2)
-            t = pick(r, "t", 3)
-            out.append({
-                "key": k,
-                "value": v,
-                "confidence": (float(c) if c is not None else None),
-                "created_at": (str(t) if t is not None else None),
-            })
+def _sql_timestamp(value) -> str:
+    """ISO timestamp string -> 'YYYY-MM-DD HH:MM:SS' (UTC), the CURRENT_TIMESTAMP text form the export pages on"""
+    if not isinstance(value, str):
+        raise ValueError("created_at must be an ISO timestamp string")
+    try:
+        ts = datetime.fromisoformat(value.strip())
+    except ValueError:
+        raise ValueError("created_at must be an ISO timestamp string")
+    if ts.tzinfo is not None:
+        ts = ts.astimezone(timezone.utc).replace(tzinfo=None)
+    return ts.strftime("%Y-%m-%d %H:%M:%S")
+
+def _memory_row(line: bytes, seq: int) -> dict:
+    """Validate one NDJSON line into insert params; raises ValueError with a readable message"""
+    try:
+        item = fastjson.loads(line)
+    except ValueError as e:
+        raise ValueError(f"invalid JSON: {e}")
+    if not isinstance(item, dict):
+        raise ValueError("expected a JSON object")
+    for f in ["user_id", "persona", "key", "value"]:
+        if not item.get(f) or not isinstance(item[f], str):
+            raise ValueError(f"{f} required")
+    try:
+        confidence = float(item.get("confidence", 0.8))
+        ttl_days = int(item.get("ttl_days", 180))
+    except (TypeError, ValueError):
+        raise ValueError("confidence/ttl_days must be numbers")
+    created_at = item.get("created_at")
+    if created_at is not None:
+        created_at = _sql_timestamp(created_at)
+    return {
+        # id fourni = réimport idempotent ; sinon même forme que /ai/memory/remember
+        "id": str(item.get("id") or f"mem_{int(time.time()*1000)}_{seq}_{int.from_bytes(os.urandom(3),'big')}"),
+        "user_id": item["user_id"],
+        "persona": item["persona"],
+        "key": item["key"],
+        "value": item["value"],
+        "confidence": confidence,
+        "ttl_days": ttl_days,
+        "created_at": created_at,
+    }
 
-        return {"ok": True, "memories": out}
+async def _ndjson_lines(request: Request):
+    buf = b""
+    async for chunk in request.stream():
+        buf += chunk
+        *lines, buf = buf.split(b"\n")
+        for line in lines:
+            yield line
+    if buf:
+        yield buf
+
+@app.post("/ai/memory/import")
+async def memory_import(request: Request, x_om_key: Optional[str] = Header(None)):
+    """Body: one memory per line (user_id, persona, key, value[, id, confidence, ttl_days, created_at])"""
+    require_admin(x_om_key)
+    conn = db()
+    imported, rejected, errors, batch, owners = 0, 0, [], [], set()
+
+    async def flush():
+        nonlocal imported, rejected, batch
+        if batch:
+            results = await conn.batch([(MEMORY_UPSERT_SQL, p) for _, p in batch])   # un batch = une transaction
+            for (n, _), res in zip(batch, results):
+                if res.rows_affected:
+                    imported += 1
+                else:                                # id déjà pris par un autre (user_id, persona)
+                    rejected += 1
+                    if len(errors) < MEMORY_IMPORT_MAX_ERRORS:
+                        errors.append({"line": n, "error": "id belongs to another user_id/persona"})
+            batch = []
+
+    lineno = 0
+    try:
+        async for line in _ndjson_lines(request):
+            lineno += 1
+            if not line.strip():
+                continue
+            try:
+                params = _memory_row(line, lineno)
+            except ValueError as e:
+                rejected += 1
+                if len(errors) < MEMORY_IMPORT_MAX_ERRORS:
+                    errors.append({"line": lineno, "error": str(e)})
+                continue
+            batch.append((lineno, params))
+            owners.add((params["user_id"], params["persona"]))
+            if len(batch) >= MEMORY_IMPORT_BATCH:
+                await flush()
+        await flush()
     except Exception as e:
-        logging.exception("recall failed")
-        return JSONResponse({"ok": False, "err": str(e)}, status_code=500)
+        logging.exception("memory import failed")
+        return JSONResponse({"ok": False, "imported": imported, "line": lineno, "err": str(e)}, status_code=500)
+    finally:
+        for user_id, persona in owners:
+            memory_index.index.invalidate(user_id, persona)
+    return {"ok": True, "imported": imported, "rejected": rejected, "errors": errors}
+
+@app.get("/ai/memory/export")
+async def memory_export(user_id: str, persona: Optional[str] = None, x_om_key: Optional[str] = Header(None)):
+    """Streams memories as NDJSON, paged by (created_at, id) so the result set is never held in memory"""
+    require_admin(x_om_key)
+    conn = db()
+
+    async def rows():
+        params = {"user_id": user_id, "ts": "", "id": "", "lim": MEMORY_EXPORT_PAGE}
+        where = "user_id = :user_id"
+        if persona:
+            where += " AND persona = :persona"
+            params["persona"] = persona
+        while True:
+            res = await conn.execute(
+                "SELECT id, user_id, persona, key, value, confidence, ttl_days, created_at FROM memories "
+                f"WHERE {where} AND (created_at, id) > (:ts, :id) ORDER BY created_at, id LIMIT :lim",
+                params,
+            )
+            page = res.rows
+            if not page:
+                return
+            yield b"".join(
+                fastjson.dumps({
+                    "id": r[0], "user_id": r[1], "persona": r[2], "key": r[3], "value": r[4],
+                    "confidence": r[5], "ttl_days": r[6], "created_at": r[7],
+                }) + b"\n"
+                for r in page
+            )
+            if len(page) < MEMORY_EXPORT_PAGE:
+                return
+            params["ts"], params["id"] = page[-1][7], page[-1][0]
+
+    return StreamingResponse(rows(), media_type="application/x-ndjson",
+                             headers={"Content-Disposition": f'attachment; filename="memories-{user_id}.ndjson"'})
 
 # ---------- File monitoring endpoints ----------
 import os
@@ -430,13 +833,14 @@ async def list_files(path: str = ".", recursive: bool = False, x_om_key: Optiona
         return JSONResponse({"ok": False, "err": str(e)}, status_code=500)
 
 # ---------- File upload and sync endpoints ----------
-import aiofiles
 import mimetypes
-from bs4 import BeautifulSoup
 import json
+from fastapi.responses import StreamingResponse, FileResponse
+from site_bundle import SITE_CSS, render_site, iter_zip, slugify
 
 UPLOAD_DIR = Path("./uploads")
 UPLOAD_DIR.mkdir(exist_ok=True)
+BUNDLE_DIR = UPLOAD_DIR / "sites"
 
 @app.post("/ai/files/upload")
 async def upload_file(
@@ -461,9 +865,11 @@ async def upload_file(
         file_path = UPLOAD_DIR / unique_filename
         
         # Save file
-        async with aiofiles.open(file_path, 'wb') as f:
-            content = await file.read()
-            await f.write(content)
+        with tracing.span("file.save"):
+            import aiofiles                          # importé au premier upload
+            async with aiofiles.open(file_path, 'wb') as f:
+                content = await file.read()
+                await f.write(content)
         
         file_info = {
             "original_name": file.filename,
@@ -487,11 +893,16 @@ async def upload_file(
         try:
             analysis = await analyze_file_content(file_info, content)
             file_info["ai_analysis"] = analysis
+        except upstream.UpstreamError:
+            raise
         except Exception as e:
             file_info["analysis_error"] = str(e)
         
         return {"ok": True, "file": file_info}
         
+    except upstream.UpstreamError as e:
+        # Analyse délestée ou hors budget : statut et Retry-After transmis ; le fichier reste enregistré
+        return JSONResponse({"ok": False, "err": e.detail, "file": file_info}, status_code=e.status_code, headers=e.headers())
     except Exception as e:
         return JSONResponse({"ok": False, "err": str(e)}, status_code=500)
 
@@ -505,52 +916,32 @@ async def analyze_file_content(file_info: dict, content: bytes) -> dict:
     if len(content) > 4000:
         content_preview += "... (truncated)"
     
-    analysis_prompt = f"""
-    Analyze this file and provide:
-    1. File type and purpose
-    2. Key content summary
-    3. Suggested actions (publish, archive, process)
-    4. SEO optimization suggestions if applicable
-    
-    File: {file_info['original_name']}
-    Size: {file_info['size']} bytes
-    Type: {file_info['mime_type']}
-    
-    Content preview:
-    {content_preview}
-    """
+    # Instructions fixes en préfixe système (cache de préfixe amont), données variables ensuite
+    payload = prompts.FILE_ANALYSIS.payload(
+        name=file_info['original_name'],
+        size=file_info['size'],
+        mime_type=file_info['mime_type'],
+        preview=content_preview,
+    )
     
     try:
-        timeout = httpx.Timeout(30.0, read=30.0, write=10.0, connect=10.0)
-        async with httpx.AsyncClient(timeout=timeout) as hx:
-            headers = {
-                "Authorization": f"Bearer {GROQ_API_KEY}",
-                "Content-Type": "application/json"
+        r, _ = await llm.complete(payload, timeout=30.0, priority="admin", route="file_analysis", client="admin")
+        if r.status_code == 200:
+            response = upstream.response_json(r)
+            return {
+                "analysis": upstream.completion_text(response),
+                "model": response.get("model")
             }
-            payload = {
-                "model": "llama-3.3-70b-versatile",
-                "messages": [{"role": "user", "content": analysis_prompt}],
-                "temperature": 0.3,
-                "max_tokens": 1000
-            }
-            r = await hx.post("https://api.groq.com/openai/v1/chat/completions", json=payload, headers=headers)
-            if r.status_code == 200:
-                response = r.json()
-                return {
-                    "analysis": response["choices"][0]["message"]["content"],
-                    "model": response["model"]
-                }
-            else:
-                return {"error": f"AI analysis failed: {r.text}"}
+        else:
+            return {"error": f"AI analysis failed: {r.text}"}
+    except upstream.UpstreamError:
+        raise                                        # délestage/budget : la route répond 503/429 + Retry-After
     except Exception as e:
         return {"error": f"AI analysis error: {str(e)}"}
 
 async def publish_to_wordpress(file_info: dict, content: bytes, wp_url: str, wp_user: str, wp_password: str) -> dict:
     """Publish file content to WordPress"""
     try:
-        # Prepare WordPress REST API call
-        api_url = f"{wp_url}/wp-json/wp/v2/posts"
-        
         # Create post content based on file type
         if file_info['mime_type'] and file_info['mime_type'].startswith('text/'):
             post_content = content.decode('utf-8', errors='ignore')
@@ -567,20 +958,11 @@ async def publish_to_wordpress(file_info: dict, content: bytes, wp_url: str, wp_
             "tags": ["ai-upload", "onlymatt"]
         }
         
-        # Make API call
-        auth = (wp_user, wp_password)
-        async with httpx.AsyncClient() as client:
-            r = await client.post(api_url, json=post_data, auth=auth)
-            if r.status_code in [200, 201]:
-                post_data = r.json()
-                return {
-                    "success": True,
-                    "post_id": post_data.get("id"),
-                    "post_url": post_data.get("link"),
-                    "status": "draft"
-                }
-            else:
-                return {"error": f"WordPress API error: {r.text}"}
+        async with wp_client.lease(wp_url, wp_user, wp_password) as client:
+            result = await client.create_post(post_data)
+        if result.get("success"):
+            result["status"] = "draft"
+        return result
                 
     except Exception as e:
         return {"error": f"WordPress publish error: {str(e)}"}
@@ -605,6 +987,68 @@ async def list_uploads(x_om_key: Optional[str] = Header(None)):
         return JSONResponse({"ok": False, "err": str(e)}, status_code=500)
 
 # ---------- Website analysis and generation endpoints ----------
+def extract_site(soup, url: str) -> dict:
+    """Title, meta description, headings, images and layout hints of a parsed reference page"""
+    analysis = {
+        "url": url,
+        "title": soup.title.string if soup.title else "No title",
+        "meta_description": "",
+        "headings": [],
+        "images": [],
+        "colors": [],
+        "structure": {},
+        "content_type": "unknown"
+    }
+    
+    # Meta description
+    meta_desc = soup.find("meta", attrs={"name": "description"})
+    if meta_desc:
+        analysis["meta_description"] = meta_desc.get("content", "")
+    
+    # Headings
+    for i in range(1, 7):
+        headings = soup.find_all(f"h{i}")
+        if headings:
+            analysis["headings"].append({
+                "level": i,
+                "count": len(headings),
+                "texts": [h.get_text().strip()[:100] for h in headings[:5]]  # First 5 headings
+            })
+    
+    # Images
+    images = soup.find_all("img")
+    analysis["images"] = [
+        {
+            "src": img.get("src", ""),
+            "alt": img.get("alt", ""),
+            "width": img.get("width"),
+            "height": img.get("height")
+        } for img in images[:10]  # First 10 images
+    ]
+    
+    # Basic structure analysis
+    analysis["structure"] = {
+        "has_header": bool(soup.find("header")),
+        "has_nav": bool(soup.find("nav")),
+        "has_main": bool(soup.find("main")),
+        "has_footer": bool(soup.find("footer")),
+        "has_sidebar": bool(soup.find("aside")),
+        "forms_count": len(soup.find_all("form")),
+        "links_count": len(soup.find_all("a"))
+    }
+    
+    # Determine content type
+    if soup.find("article"):
+        analysis["content_type"] = "blog/article"
+    elif soup.find("product"):
+        analysis["content_type"] = "ecommerce"
+    elif len(soup.find_all("form")) > 2:
+        analysis["content_type"] = "business/contact"
+    else:
+        analysis["content_type"] = "corporate"
+
+    return analysis
+
 @app.post("/ai/website/analyze")
 async def analyze_website(request: Request, x_om_key: Optional[str] = Header(None)):
     """Analyze a reference website for design and content inspiration"""
@@ -619,78 +1063,30 @@ async def analyze_website(request: Request, x_om_key: Optional[str] = Header(Non
         
         # Fetch website content
         timeout = httpx.Timeout(30.0, read=30.0, write=10.0, connect=10.0)
+        t0 = time.monotonic()
         async with httpx.AsyncClient(timeout=timeout, follow_redirects=True) as client:
             response = await client.get(url)
             html_content = response.text
+        metrics.observe_dependency("reference_site", "fetch", response.status_code, time.monotonic() - t0)
         
-        # Parse with BeautifulSoup
-        soup = BeautifulSoup(html_content, 'lxml')
+        # Parse with BeautifulSoup (bs4/lxml importés à la première analyse)
+        from bs4 import BeautifulSoup
+        with tracing.span("html.parse"):
+            soup = BeautifulSoup(html_content, 'lxml')
         
         # Extract key elements
-        analysis = {
-            "url": url,
-            "title": soup.title.string if soup.title else "No title",
-            "meta_description": "",
-            "headings": [],
-            "images": [],
-            "colors": [],
-            "structure": {},
-            "content_type": "unknown"
-        }
-        
-        # Meta description
-        meta_desc = soup.find("meta", attrs={"name": "description"})
-        if meta_desc:
-            analysis["meta_description"] = meta_desc.get("content", "")
-        
-        # Headings
-        for i in range(1, 7):
-            headings = soup.find_all(f"h{i}")
-            if headings:
-                analysis["headings"].append({
-                    "level": i,
-                    "count": len(headings),
-                    "texts": [h.get_text().strip()[:100] for h in headings[:5]]  # First 5 headings
-                })
-        
-        # Images
-        images = soup.find_all("img")
-        analysis["images"] = [
-            {
-                "src": img.get("src", ""),
-                "alt": img.get("alt", ""),
-                "width": img.get("width"),
-                "height": img.get("height")
-            } for img in images[:10]  # First 10 images
-        ]
-        
-        # Basic structure analysis
-        analysis["structure"] = {
-            "has_header": bool(soup.find("header")),
-            "has_nav": bool(soup.find("nav")),
-            "has_main": bool(soup.find("main")),
-            "has_footer": bool(soup.find("footer")),
-            "has_sidebar": bool(soup.find("aside")),
-            "forms_count": len(soup.find_all("form")),
-            "links_count": len(soup.find_all("a"))
-        }
-        
-        # Determine content type
-        if soup.find("article"):
-            analysis["content_type"] = "blog/article"
-        elif soup.find("product"):
-            analysis["content_type"] = "ecommerce"
-        elif len(soup.find_all("form")) > 2:
-            analysis["content_type"] = "business/contact"
-        else:
-            analysis["content_type"] = "corporate"
+        t_extract = time.perf_counter()
+        analysis = extract_site(soup, url)
+        tracing.record("html.extract", time.perf_counter() - t_extract)
         
         # AI-powered analysis
         ai_analysis = await analyze_website_with_ai(analysis, html_content[:5000])
         analysis["ai_insights"] = ai_analysis
         
-        return {"ok": True, "analysis": analysis}
+        return JSONResponse({"ok": True, "analysis": analysis})
         
+    except upstream.UpstreamError as e:
+        return JSONResponse({"ok": False, "err": e.detail}, status_code=e.status_code, headers=e.headers())
     except Exception as e:
         return JSONResponse({"ok": False, "err": str(e)}, status_code=500)
 
@@ -699,49 +1095,27 @@ async def analyze_website_with_ai(analysis: dict, content_sample: str) -> dict:
     if not GROQ_API_KEY:
         return {"error": "No AI backend configured"}
     
-    prompt = f"""
-    Analyze this website and provide insights for creating a similar site:
-    
-    URL: {analysis['url']}
-    Title: {analysis['title']}
-    Description: {analysis['meta_description']}
-    Content Type: {analysis['content_type']}
-    
-    Structure: {json.dumps(analysis['structure'], indent=2)}
-    
-    Content Sample: {content_sample[:2000]}
-    
-    Provide:
-    1. Overall design style (modern, minimalist, corporate, creative, etc.)
-    2. Color scheme suggestions
-    3. Content strategy insights
-    4. Key features to replicate
-    5. SEO optimization suggestions
-    6. User experience recommendations
-    """
+    payload = prompts.WEBSITE_ANALYSIS.payload(
+        url=analysis['url'],
+        title=analysis['title'],
+        description=analysis['meta_description'],
+        content_type=analysis['content_type'],
+        structure=json.dumps(analysis['structure'], indent=2, sort_keys=True),
+        sample=content_sample[:2000],
+    )
     
     try:
-        timeout = httpx.Timeout(30.0, read=30.0, write=10.0, connect=10.0)
-        async with httpx.AsyncClient(timeout=timeout) as hx:
-            headers = {
-                "Authorization": f"Bearer {GROQ_API_KEY}",
-                "Content-Type": "application/json"
+        r, _ = await llm.complete(payload, timeout=30.0, priority="admin", route="website_analysis", client="admin")
+        if r.status_code == 200:
+            response = upstream.response_json(r)
+            return {
+                "insights": upstream.completion_text(response),
+                "model": response.get("model")
             }
-            payload = {
-                "model": "llama-3.3-70b-versatile",
-                "messages": [{"role": "user", "content": prompt}],
-                "temperature": 0.3,
-                "max_tokens": 1500
-            }
-            r = await hx.post("https://api.groq.com/openai/v1/chat/completions", json=payload, headers=headers)
-            if r.status_code == 200:
-                response = r.json()
-                return {
-                    "insights": response["choices"][0]["message"]["content"],
-                    "model": response["model"]
-                }
-            else:
-                return {"error": f"AI analysis failed: {r.text}"}
+        else:
+            return {"error": f"AI analysis failed: {r.text}"}
+    except upstream.UpstreamError:
+        raise                                        # délestage/budget : la route répond 503/429 + Retry-After
     except Exception as e:
         return {"error": f"AI analysis error: {str(e)}"}
 
@@ -757,90 +1131,99 @@ async def generate_website(request: Request, x_om_key: Optional[str] = Header(No
         site_data = payload.get("site_data", {})
         references = payload.get("references", [])
         template = payload.get("template", "corporate")
-        target_platform = payload.get("target_platform", "wordpress")  # wordpress, static, etc.
+        target_platform = payload.get("target_platform", "wordpress")  # wordpress, static, static_bundle
         
         # Generate website structure
-        website_structure = await generate_website_structure(site_data, references, template)
+        with tracing.span("website.structure"):
+            website_structure = await generate_website_structure(site_data, references, template)
         
         # Generate content
-        content = await generate_website_content(site_data, references)
+        with tracing.span("website.content"):
+            content = await generate_website_content(site_data, references)
         
+        # Multi-page bundle: pages/CSS/assets streamed as a zip instead of inline JSON
+        if target_platform == "static_bundle":
+            name = slugify(site_data.get("name", "site"))
+            headers = {"Content-Disposition": f'attachment; filename="{name}.zip"'}
+            persist_to = None
+            if payload.get("persist"):
+                bundle_name = f"{int(time.time())}_{name}.zip"
+                persist_to = BUNDLE_DIR / bundle_name
+                headers["X-Bundle-Name"] = bundle_name
+            return StreamingResponse(
+                iter_zip(render_site(website_structure, content, site_data), persist_to),
+                media_type="application/zip",
+                headers=headers,
+            )
+
         # Generate HTML/CSS if needed
         if target_platform == "static":
-            html_output = await generate_static_html(website_structure, content, site_data)
+            with tracing.span("website.render"):
+                html_output = await generate_static_html(website_structure, content, site_data)
             website_structure["static_html"] = html_output
         
         # WordPress integration
         if target_platform == "wordpress" and payload.get("wordpress_config"):
             wp_config = payload["wordpress_config"]
-            wordpress_result = await create_wordpress_site(
-                website_structure, content, wp_config
-            )
+            with tracing.span("website.wordpress"):
+                wordpress_result = await create_wordpress_site(
+                    website_structure, content, wp_config
+                )
             website_structure["wordpress_deployment"] = wordpress_result
         
-        return {
+        return JSONResponse({
             "ok": True,
             "website": website_structure,
             "content": content,
             "target_platform": target_platform
-        }
+        })
         
+    except upstream.UpstreamError as e:
+        return JSONResponse({"ok": False, "err": e.detail}, status_code=e.status_code, headers=e.headers())
     except Exception as e:
         return JSONResponse({"ok": False, "err": str(e)}, status_code=500)
 
+@app.get("/ai/website/bundles/{bundle_name}")
+async def download_bundle(bundle_name: str, x_om_key: Optional[str] = Header(None)):
+    """Download a site bundle persisted by /ai/website/generate"""
+    require_admin(x_om_key)
+    path = BUNDLE_DIR / Path(bundle_name).name
+    if path.suffix != ".zip" or not path.is_file():
+        raise HTTPException(404, "Bundle not found")
+    return FileResponse(path, media_type="application/zip", filename=path.name)
+
 async def generate_website_structure(site_data: dict, references: list, template: str) -> dict:
     """Generate website structure based on data and references"""
     if not GROQ_API_KEY:
         return {"error": "No AI backend configured"}
     
-    prompt = f"""
-    Create a complete website structure for: {site_data.get('name', 'Website')}
-    
-    Business Info: {json.dumps(site_data, indent=2)}
-    Template Style: {template}
-    Reference Sites: {', '.join(references)}
-    
-    Generate:
-    1. Site map (pages and navigation)
-    2. Content sections for each page
-    3. SEO structure (meta tags, headings)
-    4. Call-to-action placements
-    5. User flow optimization
-    6. Mobile responsiveness considerations
-    
-    Return as structured JSON with pages, sections, and metadata.
-    """
+    payload = prompts.WEBSITE_STRUCTURE.payload(
+        name=site_data.get('name', 'Website'),
+        site_data=json.dumps(site_data, indent=2, sort_keys=True),
+        template=template,
+        references=', '.join(references),
+    )
     
     try:
-        timeout = httpx.Timeout(30.0, read=30.0, write=10.0, connect=10.0)
-        async with httpx.AsyncClient(timeout=timeout) as hx:
-            headers = {
-                "Authorization": f"Bearer {GROQ_API_KEY}",
-                "Content-Type": "application/json"
-            }
-            payload = {
-                "model": "llama-3.3-70b-versatile",
-                "messages": [{"role": "user", "content": prompt}],
-                "temperature": 0.4,
-                "max_tokens": 2000
-            }
-            r = await hx.post("https://api.groq.com/openai/v1/chat/completions", json=payload, headers=headers)
-            if r.status_code == 200:
-                response = r.json()
-                ai_response = response["choices"][0]["message"]["content"]
-                
-                # Try to parse as JSON, fallback to text structure
-                try:
-                    return json.loads(ai_response)
-                except:
-                    return {
-                        "structure": ai_response,
-                        "pages": ["home", "about", "services", "contact"],
-                        "template": template,
-                        "generated": True
-                    }
-            else:
-                return {"error": f"Structure generation failed: {r.text}"}
+        r, _ = await llm.complete(payload, timeout=30.0, priority="admin", route="website_structure", client="admin")
+        if r.status_code == 200:
+            response = upstream.response_json(r)
+            ai_response = upstream.completion_text(response)
+            
+            # Try to parse as JSON, fallback to text structure
+            try:
+                return json.loads(ai_response)
+            except:
+                return {
+                    "structure": ai_response,
+                    "pages": ["home", "about", "services", "contact"],
+                    "template": template,
+                    "generated": True
+                }
+        else:
+            return {"error": f"Structure generation failed: {r.text}"}
+    except upstream.UpstreamError:
+        raise                                        # délestage/budget : la route répond 503/429 + Retry-After
     except Exception as e:
         return {"error": f"Structure generation error: {str(e)}"}
 
@@ -849,47 +1232,26 @@ async def generate_website_content(site_data: dict, references: list) -> dict:
     if not GROQ_API_KEY:
         return {"error": "No AI backend configured"}
     
-    prompt = f"""
-    Generate compelling website content for: {site_data.get('name', 'Business')}
-    
-    Business Data: {json.dumps(site_data, indent=2)}
-    Industry: {site_data.get('industry', 'general')}
-    Target Audience: {site_data.get('audience', 'general')}
-    
-    Create:
-    1. Homepage hero section with headline and subheadline
-    2. About section with company story
-    3. Services/products descriptions
-    4. Call-to-action copy
-    5. SEO-optimized meta descriptions
-    6. Social proof content
-    
-    Make it engaging, conversion-focused, and professional.
-    """
+    payload = prompts.WEBSITE_CONTENT.payload(
+        name=site_data.get('name', 'Business'),
+        site_data=json.dumps(site_data, indent=2, sort_keys=True),
+        industry=site_data.get('industry', 'general'),
+        audience=site_data.get('audience', 'general'),
+    )
     
     try:
-        timeout = httpx.Timeout(30.0, read=30.0, write=10.0, connect=10.0)
-        async with httpx.AsyncClient(timeout=timeout) as hx:
-            headers = {
-                "Authorization": f"Bearer {GROQ_API_KEY}",
-                "Content-Type": "application/json"
+        r, _ = await llm.complete(payload, timeout=30.0, priority="admin", route="website_content", client="admin")
+        if r.status_code == 200:
+            response = upstream.response_json(r)
+            return {
+                "content": upstream.completion_text(response),
+                "generated": True,
+                "timestamp": int(time.time())
             }
-            payload = {
-                "model": "llama-3.3-70b-versatile",
-                "messages": [{"role": "user", "content": prompt}],
-                "temperature": 0.6,
-                "max_tokens": 2500
-            }
-            r = await hx.post("https://api.groq.com/openai/v1/chat/completions", json=payload, headers=headers)
-            if r.status_code == 200:
-                response = r.json()
-                return {
-                    "content": response["choices"][0]["message"]["content"],
-                    "generated": True,
-                    "timestamp": int(time.time())
-                }
-            else:
-                return {"error": f"Content generation failed: {r.text}"}
+        else:
+            return {"error": f"Content generation failed: {r.text}"}
+    except upstream.UpstreamError:
+        raise                                        # délestage/budget : la route répond 503/429 + Retry-After
     except Exception as e:
         return {"error": f"Content generation error: {str(e)}"}
 
@@ -904,213 +1266,7 @@ async def generate_static_html(structure: dict, content: dict, site_data: dict)
     <title>{title}</title>
     <meta name="description" content="{description}">
     <style>
-        * {{
-            margin: 0;
-            padding: 0;
-            box-sizing: border-box;
-        }}
-
-        body {{
-            font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
-            line-height: 1.6;
-            color: #333;
-            background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-            min-height: 100vh;
-        }}
-
-        .container {{
-            max-width: 1200px;
-            margin: 0 auto;
-            padding: 0 20px;
-        }}
-
-        /* Header */
-        header {{
-            background: rgba(255, 255, 255, 0.95);
-            backdrop-filter: blur(10px);
-            box-shadow: 0 2px 20px rgba(0,0,0,0.1);
-            position: fixed;
-            width: 100%;
-            top: 0;
-            z-index: 1000;
-        }}
-
-        nav {{
-            display: flex;
-            justify-content: space-between;
-            align-items: center;
-            padding: 1rem 0;
-        }}
-
-        .logo {{
-            font-size: 1.8rem;
-            font-weight: bold;
-            color: #667eea;
-        }}
-
-        .nav-links {{
-            display: flex;
-            list-style: none;
-            gap: 2rem;
-        }}
-
-        .nav-links a {{
-            text-decoration: none;
-            color: #333;
-            font-weight: 500;
-            transition: color 0.3s;
-        }}
-
-        .nav-links a:hover {{
-            color: #667eea;
-        }}
-
-        /* Hero Section */
-        .hero {{
-            background: linear-gradient(135deg, rgba(102, 126, 234, 0.9), rgba(118, 75, 162, 0.9)),
-                        url('https://images.unsplash.com/photo-1557804506-669a67965ba0?ixlib=rb-4.0.3&auto=format&fit=crop&w=2074&q=80');
-            background-size: cover;
-            background-position: center;
-            color: white;
-            padding: 120px 0 80px;
-            text-align: center;
-            margin-top: 70px;
-        }}
-
-        .hero h1 {{
-            font-size: 3.5rem;
-            margin-bottom: 1rem;
-            text-shadow: 2px 2px 4px rgba(0,0,0,0.3);
-        }}
-
-        .hero p {{
-            font-size: 1.3rem;
-            margin-bottom: 2rem;
-            opacity: 0.9;
-        }}
-
-        .cta-button {{
-            display: inline-block;
-            background: #ff6b6b;
-            color: white;
-            padding: 15px 30px;
-            text-decoration: none;
-            border-radius: 50px;
-            font-weight: bold;
-            transition: transform 0.3s, box-shadow 0.3s;
-            box-shadow: 0 4px 15px rgba(255, 107, 107, 0.3);
-        }}
-
-        .cta-button:hover {{
-            transform: translateY(-2px);
-            box-shadow: 0 6px 20px rgba(255, 107, 107, 0.4);
-        }}
-
-        /* Sections */
-        .section {{
-            background: white;
-            margin: 40px 0;
-            padding: 60px 0;
-            border-radius: 15px;
-            box-shadow: 0 10px 30px rgba(0,0,0,0.1);
-        }}
-
-        .section h2 {{
-            text-align: center;
-            font-size: 2.5rem;
-            margin-bottom: 2rem;
-            color: #333;
-        }}
-
-        .section-content {{
-            max-width: 800px;
-            margin: 0 auto;
-            padding: 0 20px;
-        }}
-
-        /* Services Grid */
-        .services-grid {{
-            display: grid;
-            grid-template-columns: repeat(auto-fit, minmax(300px, 1fr));
-            gap: 2rem;
-            margin-top: 3rem;
-        }}
-
-        .service-card {{
-            background: #f8f9fa;
-            padding: 2rem;
-            border-radius: 10px;
-            text-align: center;
-            transition: transform 0.3s, box-shadow 0.3s;
-        }}
-
-        .service-card:hover {{
-            transform: translateY(-5px);
-            box-shadow: 0 10px 25px rgba(0,0,0,0.15);
-        }}
-
-        .service-card h3 {{
-            color: #667eea;
-            margin-bottom: 1rem;
-        }}
-
-        /* Footer */
-        footer {{
-            background: #2c3e50;
-            color: white;
-            padding: 40px 0;
-            text-align: center;
-        }}
-
-        .footer-content {{
-            display: grid;
-            grid-template-columns: repeat(auto-fit, minmax(250px, 1fr));
-            gap: 2rem;
-            margin-bottom: 2rem;
-        }}
-
-        .footer-section h3 {{
-            margin-bottom: 1rem;
-            color: #3498db;
-        }}
-
-        .footer-section ul {{
-            list-style: none;
-        }}
-
-        .footer-section ul li {{
-            margin-bottom: 0.5rem;
-        }}
-
-        .footer-section a {{
-            color: #bdc3c7;
-            text-decoration: none;
-        }}
-
-        .footer-section a:hover {{
-            color: #3498db;
-        }}
-
-        .copyright {{
-            border-top: 1px solid #34495e;
-            padding-top: 2rem;
-            color: #95a5a6;
-        }}
-
-        /* Responsive */
-        @media (max-width: 768px) {{
-            .hero h1 {{
-                font-size: 2.5rem;
-            }}
-
-            .nav-links {{
-                display: none;
-            }}
-
-            .services-grid {{
-                grid-template-columns: 1fr;
-            }}
-        }}
+{css}
     </style>
 </head>
 <body>
@@ -1228,6 +1384,7 @@ async def generate_static_html(structure: dict, content: dict, site_data: dict)
 
     # Remplacer les variables dans le template
     html = html_template.format(
+        css=SITE_CSS,
         title=structure.get('title', f'Site Web {company_name}'),
         description=content.get('description', f'Site officiel de {company_name}'),
         company_name=company_name,
@@ -1243,6 +1400,12 @@ async def generate_static_html(structure: dict, content: dict, site_data: dict)
 
     return html
 
+SITE_PAGES = [
+    ("homepage", "Accueil", "Contenu d'accueil..."),
+    ("about", "À propos", "Contenu à propos..."),
+    ("services", "Services", "Nos services..."),
+]
+
 async def create_wordpress_site(structure: dict, content: dict, wp_config: dict) -> dict:
     """Create a complete WordPress site with pages and content"""
     try:
@@ -1253,37 +1416,69 @@ async def create_wordpress_site(structure: dict, content: dict, wp_config: dict)
         if not all([wp_url, wp_user, wp_app_password]):
             return {"error": "WordPress config incomplete - need url, username, and application_password"}
         
-        results = []
-        
-        # Create homepage
-        home_result = await create_wordpress_page({
-            "title": "Accueil",
-            "content": content.get("homepage", "Contenu d'accueil..."),
-            "status": "publish"
-        }, wp_url, wp_user, wp_app_password)
-        results.append({"homepage": home_result})
-        
-        # Create about page
-        about_result = await create_wordpress_page({
-            "title": "À propos",
-            "content": content.get("about", "Contenu à propos..."),
-            "status": "publish"
-        }, wp_url, wp_user, wp_app_password)
-        results.append({"about": about_result})
-        
-        # Create services page
-        services_result = await create_wordpress_page({
-            "title": "Services",
-            "content": content.get("services", "Nos services..."),
-            "status": "publish"
-        }, wp_url, wp_user, wp_app_password)
-        results.append({"services": services_result})
+        async with wp_client.lease(wp_url, wp_user, wp_app_password) as client:
+            pages = {
+                key: {"title": title, "content": content.get(key, default), "status": "publish"}
+                for key, title, default in SITE_PAGES
+            }
+            hashes = {key: wp_journal.content_hash(page) for key, page in pages.items()}
+
+            # Journal de déploiement : pages inchangées sautées, modifiées mises à jour, manquantes créées.
+            # force=True redéploie tout, mais le journal est quand même relu et mis à jour.
+            conn, journal = None, {}
+            try:
+                conn = db()
+                journal = await wp_journal.load(conn, client.base)
+            except Exception as e:
+                log.warning(f"Deployment journal unavailable: {e}")
+                conn = None
+
+            results: Dict[str, dict] = {}
+
+            async def settle(key: str, res: dict):
+                # Journalisé page par page dès le succès : un déploiement interrompu ne recrée pas ces pages
+                results[key] = res
+                if conn is not None and res.get("success"):
+                    try:
+                        await wp_journal.record(conn, client.base, [(key, res, hashes[key])])
+                    except Exception as e:
+                        log.warning(f"Deployment journal write failed for {key}: {e}")
+
+            to_update, to_create = [], []
+            for key in pages:
+                prev = journal.get(key)
+                if prev and prev["page_id"] and prev["content_hash"] == hashes[key] and not wp_config.get("force"):
+                    results[key] = {"success": True, "page_id": prev["page_id"], "skipped": True}
+                elif prev and prev["page_id"]:
+                    to_update.append(key)
+                else:
+                    to_create.append(key)
+
+            if to_update:
+                async def update(key: str):
+                    try:
+                        res = await client.update_page(journal[key]["page_id"], pages[key])
+                    except Exception as e:
+                        res = {"error": f"Page update error: {e}"}
+                    if res.get("status_code") == 404:   # page supprimée côté WordPress
+                        to_create.append(key)
+                    else:
+                        await settle(key, dict(res, updated=True) if res.get("success") else res)
+                await asyncio.gather(*(update(k) for k in to_update))
+
+            if to_create:
+                # Un seul aller-retour via /batch/v1 si dispo, sinon création parallèle (bornée)
+                batch = [pages[k] for k in to_create]
+                on_result = lambda i, res: settle(to_create[i], res)
+                created = await client.batch_create_pages(batch, on_result) if wp_config.get("batch", True) else None
+                if created is None:
+                    await client.create_pages(batch, on_result)
         
-        return {
-            "success": True,
-            "pages_created": results,
-            "site_url": wp_url
-        }
+            return {
+                "success": True,
+                "pages_created": [{key: results[key]} for key in pages],
+                "site_url": wp_url
+            }
         
     except Exception as e:
         return {"error": f"WordPress site creation failed: {str(e)}"}
@@ -1291,44 +1486,8 @@ async def create_wordpress_site(structure: dict, content: dict, wp_config: dict)
 async def create_wordpress_page(page_data: dict, wp_url: str, wp_user: str, wp_app_password: str) -> dict:
     """Create a single WordPress page with alternative auth methods"""
     try:
-        api_url = f"{wp_url}/wp-json/wp/v2/pages"
-
-        # Essayer d'abord avec Application Password
-        auth = (wp_user, wp_app_password)
-        async with httpx.AsyncClient(timeout=httpx.Timeout(30.0)) as client:
-            r = await client.post(api_url, json=page_data, auth=auth)
-            if r.status_code in [200, 201]:
-                result = r.json()
-                return {
-                    "success": True,
-                    "page_id": result.get("id"),
-                    "page_url": result.get("link"),
-                    "status": result.get("status"),
-                    "auth_method": "application_password"
-                }
-            elif r.status_code == 401:
-                # Si 401, essayer avec Bearer token (certains hébergeurs l'acceptent mieux)
-                headers = {
-                    "Authorization": f"Bearer {wp_app_password}",
-                    "Content-Type": "application/json"
-                }
-                r2 = await client.post(api_url, json=page_data, headers=headers)
-                if r2.status_code in [200, 201]:
-                    result = r2.json()
-                    return {
-                        "success": True,
-                        "page_id": result.get("id"),
-                        "page_url": result.get("link"),
-                        "status": result.get("status"),
-                        "auth_method": "bearer_token"
-                    }
-                else:
-                    return {
-                        "error": f"Hostinger bloque l'authentification. Erreur Basic Auth: {r.text[:200]}, Erreur Bearer: {r2.text[:200]}"
-                    }
-            else:
-                return {"error": f"WordPress API error: {r.text}"}
-
+        async with wp_client.lease(wp_url, wp_user, wp_app_password) as client:
+            return await client.create_page(page_data)
     except Exception as e:
         return {"error": f"Page creation error: {str(e)}"}
 
@@ -1342,6 +1501,9 @@ async def create_wordpress_site_via_plugin(structure: dict, content: dict, wp_co
         if not all([wp_url, wp_user, wp_app_password]):
             return {"error": "WordPress config incomplete"}
 
+        # Échappement PHP calculé hors de la f-string (backslash interdit dans l'expression en 3.11)
+        php = {key: str(content.get(key, default)).replace("'", "\\'") for key, _, default in SITE_PAGES}
+
         # Créer un fichier PHP temporaire qui sera uploadé comme plugin
         plugin_code = f'''<?php
 /**
@@ -1360,19 +1522,19 @@ function om_create_pages() {{
     $pages = array(
         array(
             'post_title' => 'Accueil',
-            'post_content' => '{content.get("homepage", "Contenu d\\'accueil...").replace("'", "\\'")}',
+            'post_content' => '{php["homepage"]}',
             'post_status' => 'publish',
             'post_type' => 'page'
         ),
         array(
             'post_title' => 'À propos',
-            'post_content' => '{content.get("about", "Contenu à propos...").replace("'", "\\'")}',
+            'post_content' => '{php["about"]}',
             'post_status' => 'publish',
             'post_type' => 'page'
         ),
         array(
             'post_title' => 'Services',
-            'post_content' => '{content.get("services", "Nos services...").replace("'", "\\'")}',
+            'post_content' => '{php["services"]}',
             'post_status' => 'publish',
             'post_type' => 'page'
         )
@@ -1398,26 +1560,30 @@ function om_create_pages() {{
         }
 
         # Essayer d'uploader via l'endpoint personnalisé (nécessite un plugin côté serveur)
-        upload_url = f"{wp_url}/wp-json/om/v1/upload-plugin"
-        auth = (wp_user, wp_app_password)
-
-        async with httpx.AsyncClient(timeout=httpx.Timeout(30.0)) as client:
-            r = await client.post(upload_url, json=plugin_data, auth=auth)
-            if r.status_code == 200:
-                return {
-                    "success": True,
-                    "method": "plugin_upload",
-                    "message": "Plugin uploaded, pages will be created automatically"
-                }
-            else:
-                return {
-                    "error": f"Plugin upload failed: {r.text}",
-                    "alternative": "Considérez utiliser la génération HTML statique uniquement"
-                }
+        try:
+            async with wp_client.lease(wp_url, wp_user, wp_app_password) as client:
+                r, _ = await client.request("POST", "/wp-json/om/v1/upload-plugin", json=plugin_data)
+        except wp_client.WPAuthError as e:
+            return {"error": f"Plugin upload failed: {e.errors}"}
+        if r.status_code == 200:
+            return {
+                "success": True,
+                "method": "plugin_upload",
+                "message": "Plugin uploaded, pages will be created automatically"
+            }
+        else:
+            return {
+                "error": f"Plugin upload failed: {r.text}",
+                "alternative": "Considérez utiliser la génération HTML statique uniquement"
+            }
 
     except Exception as e:
         return {"error": f"Plugin method failed: {str(e)}"}
 
+@app.on_event("shutdown")
+async def close_wp_clients():
+    await wp_client.close_all()
+
 # ---------- Admin Data Management (Turso) ----------
 @app.post("/admin/tasks")
 async def create_task(request: Request, payload: dict = Body(...)):
@@ -1457,30 +1623,9 @@ async def get_tasks(x_om_key: Optional[str] = Header(None)):
         sql = "SELECT * FROM admin_tasks ORDER BY created_at DESC"
         res = await db().execute(sql)
 
-        def pick(row, name, idx):
-            try:
-                if isinstance(row, dict):
-                    return row.get(name)
-                try:
-                    return row[name]
-                except Exception:
-                    return row[idx]
-            except Exception:
-                return None
-
-        tasks = []
-        for r in res.rows:
-            tasks.append({
-                "id": pick(r, "id", 0),
-                "title": pick(r, "title", 1),
-                "description": pick(r, "description", 2),
-                "priority": pick(r, "priority", 3),
-                "status": pick(r, "status", 4),
-                "created_at": pick(r, "created_at", 5),
-                "updated_at": pick(r, "updated_at", 6),
-            })
+        tasks = decode_rows(res.rows, TASKS_COLUMNS)
 
-        return {"ok": True, "tasks": tasks}
+        return JSONResponse({"ok": True, "tasks": tasks})
     except Exception as e:
         logging.exception("get tasks failed")
         return JSONResponse({"ok": False, "err": str(e)}, status_code=500)
@@ -1558,28 +1703,9 @@ async def get_reports(x_om_key: Optional[str] = Header(None)):
         sql = "SELECT * FROM admin_reports ORDER BY created_at DESC LIMIT 50"
         res = await db().execute(sql)
 
-        def pick(row, name, idx):
-            try:
-                if isinstance(row, dict):
-                    return row.get(name)
-                try:
-                    return row[name]
-                except Exception:
-                    return row[idx]
-            except Exception:
-                return None
-
-        reports = []
-        for r in res.rows:
-            reports.append({
-                "id": pick(r, "id", 0),
-                "type": pick(r, "type", 1),
-                "title": pick(r, "title", 2),
-                "content": pick(r, "content", 3),
-                "created_at": pick(r, "created_at", 4),
-            })
+        reports = decode_rows(res.rows, REPORTS_COLUMNS)
 
-        return {"ok": True, "reports": reports}
+        return JSONResponse({"ok": True, "reports": reports})
     except Exception as e:
         logging.exception("get reports failed")
         return JSONResponse({"ok": False, "err": str(e)}, status_code=500)
@@ -1622,33 +1748,51 @@ async def get_analyses(x_om_key: Optional[str] = Header(None)):
         sql = "SELECT * FROM admin_analyses ORDER BY created_at DESC LIMIT 20"
         res = await db().execute(sql)
 
-        def pick(row, name, idx):
-            try:
-                if isinstance(row, dict):
-                    return row.get(name)
-                try:
-                    return row[name]
-                except Exception:
-                    return row[idx]
-            except Exception:
-                return None
-
-        analyses = []
-        for r in res.rows:
-            analyses.append({
-                "id": pick(r, "id", 0),
-                "type": pick(r, "type", 1),
-                "path": pick(r, "path", 2),
-                "results": pick(r, "results", 3),
-                "stats": pick(r, "stats", 4),
-                "created_at": pick(r, "created_at", 5),
-            })
+        analyses = decode_rows(res.rows, ANALYSES_COLUMNS)
 
-        return {"ok": True, "analyses": analyses}
+        return JSONResponse({"ok": True, "analyses": analyses})
     except Exception as e:
         logging.exception("get analyses failed")
         return JSONResponse({"ok": False, "err": str(e)}, status_code=500)
 
+@app.get("/admin/usage")
+async def get_usage(by: str = "model", hours: int = 24, x_om_key: Optional[str] = Header(None)):
+    """Token usage rollup over the last N hours, grouped by model, route, client or bucket (hour)"""
+    require_admin(x_om_key)
+    if by not in usage.GROUP_COLUMNS:
+        raise HTTPException(400, f"by must be one of {', '.join(usage.GROUP_COLUMNS)}")
+    try:
+        since = time.strftime("%Y-%m-%dT%H", time.gmtime(time.time() - max(1, min(int(hours), 24 * 90)) * 3600))
+        rows = {}
+        try:
+            conn = db()
+            await usage.ledger.flush(conn)
+            res = await conn.execute(
+                f"SELECT {by} AS k, SUM(requests), SUM(prompt_tokens), SUM(completion_tokens), SUM(latency_ms) "
+                f"FROM usage_ledger WHERE bucket >= :since GROUP BY {by}",
+                {"since": since},
+            )
+            rows = {r[0]: [int(r[1] or 0), int(r[2] or 0), int(r[3] or 0), int(r[4] or 0)] for r in res.rows}
+        except HTTPException:
+            # Turso non configuré : seulement les compteurs en mémoire
+            rows = usage.ledger.pending_rollup(by, since)
+
+        out = []
+        for k, (n, prompt, completion, latency_ms) in rows.items():
+            out.append({
+                by: k,
+                "requests": n,
+                "prompt_tokens": prompt,
+                "completion_tokens": completion,
+                "total_tokens": prompt + completion,
+                "avg_latency_ms": round(latency_ms / n) if n else None,
+            })
+        out.sort(key=lambda x: x["total_tokens"], reverse=True)
+        return {"ok": True, "by": by, "since": since, "usage": out}
+    except Exception as e:
+        logging.exception("get usage failed")
+        return JSONResponse({"ok": False, "err": str(e)}, status_code=500)
+
 @app.post("/admin/chat/history")
 async def save_chat_message(request: Request, payload: dict = Body(...)):
     rl(request.client.host)
@@ -1687,29 +1831,9 @@ async def get_chat_history(limit: int = 50, x_om_key: Optional[str] = Header(Non
         sql = f"SELECT * FROM chat_history ORDER BY created_at DESC LIMIT {max(1, min(int(limit), 200))}"
         res = await db().execute(sql)
 
-        def pick(row, name, idx):
-            try:
-                if isinstance(row, dict):
-                    return row.get(name)
-                try:
-                    return row[name]
-                except Exception:
-                    return row[idx]
-            except Exception:
-                return None
-
-        messages = []
-        for r in res.rows:
-            messages.append({
-                "id": pick(r, "id", 0),
-                "user_message": pick(r, "user_message", 1),
-                "assistant_response": pick(r, "assistant_response", 2),
-                "model": pick(r, "model", 3),
-                "temperature": pick(r, "temperature", 4),
-                "created_at": pick(r, "created_at", 5),
-            })
+        messages = decode_rows(res.rows, CHAT_HISTORY_COLUMNS)
 
-        return {"ok": True, "messages": messages}
+        return JSONResponse({"ok": True, "messages": messages})
     except Exception as e:
         logging.exception("get chat history failed")
         return JSONResponse({"ok": False, "err": str(e)}, status_code=500)
@@ -1733,27 +1857,27 @@ from fastapi import Form
 
 @app.get("/admin")
 async def admin_home(request: Request):
-    return templates.TemplateResponse("admin.html", {"request": request})
+    return pages.response(request, "admin.html")
 
 @app.get("/admin/chat")
 async def admin_chat(request: Request):
-    return templates.TemplateResponse("chat.html", {"request": request})
+    return pages.response(request, "chat.html")
 
 @app.get("/admin/educate")
 async def admin_educate(request: Request):
-    return templates.TemplateResponse("educate.html", {"request": request})
+    return pages.response(request, "educate.html")
 
 @app.get("/admin/tasks")
 async def admin_tasks(request: Request):
-    return templates.TemplateResponse("tasks.html", {"request": request})
+    return pages.response(request, "tasks.html")
 
 @app.get("/admin/reports")
 async def admin_reports(request: Request):
-    return templates.TemplateResponse("reports.html", {"request": request})
+    return pages.response(request, "reports.html")
 
 @app.get("/admin/analysis")
 async def admin_analysis(request: Request):
-    return templates.TemplateResponse("analysis.html", {"request": request})
+    return pages.response(request, "analysis.html")
 
 from pydantic import BaseModel
 import os, os.path
@@ -1785,3 +1909,15 @@ def fs_list(req: _FsListReq):
         except Exception as e:
             items.append({"name": name, "error": str(e)})
     return {"ok": True, "path": p, "items": items}
+
+# ---------- Readiness ----------
+# Enregistré en dernier : les handlers startup s'exécutent dans l'ordre, celui-ci clôt le démarrage
+_T_IMPORTED = time.perf_counter()
+
+@app.on_event("startup")
+async def mark_ready():
+    global _ready
+    _startup_ms["import_ms"] = round((_T_IMPORTED - _T_IMPORT) * 1000, 1)
+    _startup_ms["ready_ms"] = round((time.perf_counter() - _T_IMPORT) * 1000, 1)
+    _ready = True
+    log.info(f"ready in {_startup_ms['ready_ms']} ms (import {_startup_ms['import_ms']} ms)")
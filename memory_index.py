@@ -0,0 +1,128 @@
+# Relevance recall for memories — per-(user_id, persona) vector index, loaded lazily from Turso, updated on remember
+import os, time, asyncio
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+import embeddings
+
+MEMORY_INDEX_USERS    = int(os.getenv("MEMORY_INDEX_USERS", "2000"))    # couples (user_id, persona) en mémoire
+MEMORY_INDEX_TTL      = float(os.getenv("MEMORY_INDEX_TTL", "600"))     # reconstruction périodique (écritures d'autres workers)
+MEMORY_INDEX_MAX_ROWS = int(os.getenv("MEMORY_INDEX_MAX_ROWS", "20000"))
+MEMORY_INDEX_TOTAL_ROWS = int(os.getenv("MEMORY_INDEX_TOTAL_ROWS", "50000"))   # tous couples confondus (~EMBED_DIM*4 octets/ligne)
+
+Owner = Tuple[str, str]
+
+def memory_text(key: str, value: str) -> str:
+    return f"{key} {value}"
+
+class _UserIndex:
+    __slots__ = ("index", "rows", "loaded_at")
+
+    def __init__(self):
+        self.index = embeddings.VectorIndex()
+        self.rows: Dict[str, dict] = {}     # id -> {"key", "value", "confidence", "created_at"}
+        self.loaded_at = time.monotonic()
+
+    def add(self, mid: str, row: dict):
+        self.rows[mid] = row
+        self.index.add(mid, embeddings.embed(memory_text(row["key"], row["value"])))
+
+class MemoryIndex:
+    """LRU over owners, bounded both by owner count and by total indexed rows"""
+    def __init__(self, max_users: int = MEMORY_INDEX_USERS, max_rows: int = MEMORY_INDEX_TOTAL_ROWS):
+        self.max_users = max_users
+        self.max_rows = max_rows
+        self.total_rows = 0
+        self._users: "OrderedDict[Owner, _UserIndex]" = OrderedDict()
+        self._loading: Dict[Owner, asyncio.Future] = {}
+        self.builds = 0
+        self.queries = 0
+
+    async def _load(self, conn, owner: Owner) -> _UserIndex:
+        res = await conn.execute(
+            "SELECT id, key, value, confidence, created_at FROM memories "
+            "WHERE user_id = :user_id AND persona = :persona ORDER BY created_at DESC LIMIT :lim",
+            {"user_id": owner[0], "persona": owner[1], "lim": MEMORY_INDEX_MAX_ROWS},
+        )
+        ui = _UserIndex()
+        for r in res.rows:
+            ui.add(r[0], {"key": r[1], "value": r[2], "confidence": r[3], "created_at": r[4]})
+        self.builds += 1
+        return ui
+
+    async def get(self, conn, user_id: str, persona: str) -> _UserIndex:
+        owner = (user_id, persona)
+        ui = self._users.get(owner)
+        if ui is not None and time.monotonic() - ui.loaded_at < MEMORY_INDEX_TTL:
+            self._users.move_to_end(owner)
+            return ui
+        # Une seule reconstruction par couple, les requêtes concurrentes attendent la même
+        pending = self._loading.get(owner)
+        if pending is not None:
+            return await asyncio.shield(pending)
+        fut = asyncio.get_running_loop().create_future()
+        self._loading[owner] = fut
+        try:
+            ui = await self._load(conn, owner)
+            self.invalidate(*owner)                  # ancienne version (TTL) : ses lignes sortent du total
+            self._users[owner] = ui
+            self.total_rows += len(ui.rows)
+            self._evict(keep=owner)
+            fut.set_result(ui)
+            return ui
+        except Exception as e:
+            fut.set_exception(e)
+            fut.exception()   # évite "exception never retrieved" sans attente concurrente
+            raise
+        finally:
+            del self._loading[owner]
+
+    def _evict(self, keep: Owner):
+        # Les moins récemment utilisés sortent jusqu'à tenir dans les deux bornes ; le couple courant reste
+        while len(self._users) > 1 and (len(self._users) > self.max_users or self.total_rows > self.max_rows):
+            owner = next(iter(self._users))
+            if owner == keep:
+                self._users.move_to_end(owner)
+                continue
+            self.total_rows -= len(self._users.pop(owner).rows)
+
+    def add(self, user_id: str, persona: str, mid: str, key: str, value: str,
+            confidence: Optional[float] = None, created_at: Optional[str] = None):
+        """Index a new memory if the owner is loaded; otherwise the next lazy load picks it up from Turso"""
+        ui = self._users.get((user_id, persona))
+        if ui is not None:
+            before = len(ui.rows)
+            ui.add(mid, {"key": key, "value": value, "confidence": confidence, "created_at": created_at})
+            self.total_rows += len(ui.rows) - before
+            self._evict(keep=(user_id, persona))
+
+    def invalidate(self, user_id: str, persona: str):
+        ui = self._users.pop((user_id, persona), None)
+        if ui is not None:
+            self.total_rows -= len(ui.rows)
+
+    async def search(self, conn, user_id: str, persona: str, query: str, k: int) -> List[dict]:
+        ui = await self.get(conn, user_id, persona)
+        self.queries += 1
+        out = []
+        for score, mid in ui.index.search(embeddings.embed(query), k=k, min_score=1e-6):
+            row = ui.rows[mid]
+            out.append({
+                "key": row["key"],
+                "value": row["value"],
+                "confidence": (float(row["confidence"]) if row["confidence"] is not None else None),
+                "created_at": (str(row["created_at"]) if row["created_at"] is not None else None),
+                "score": round(score, 4),
+            })
+        return out
+
+    def stats(self) -> dict:
+        return {
+            "owners": len(self._users),
+            "memories": self.total_rows,
+            "max_memories": self.max_rows,
+            "builds": self.builds,
+            "queries": self.queries,
+        }
+
+index = MemoryIndex()
@@ -0,0 +1,139 @@
+# Metrics — counters and latency histograms rendered in the Prometheus text format (no client library)
+import os, time
+import tracing
+from bisect import bisect_left
+from typing import Callable, Dict, List, Tuple
+
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")    # si défini, /metrics exige "Authorization: Bearer <token>"
+
+# Secondes ; couvre le cache mémoire (<1 ms) jusqu'aux générations LLM longues
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+def _escape(v) -> str:
+    return str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _sorted(d: dict):
+    # Valeurs de labels mixtes (200, "error") : tri sur leur forme texte
+    return sorted(d.items(), key=lambda kv: tuple(map(str, kv[0])))
+
+def _labels(names: Tuple[str, ...], values: Tuple, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()):
+        self.name, self.help, self.labels = name, help, labels
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, *values, amount: float = 1.0):
+        self._values[values] = self._values.get(values, 0.0) + amount
+
+    def render(self) -> List[str]:
+        out = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        out += [f"{self.name}{_labels(self.labels, k)} {v:g}" for k, v in _sorted(self._values)]
+        return out
+
+class Histogram:
+    """Bucket counts are stored per bucket and made cumulative only when rendered"""
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = (), buckets=LATENCY_BUCKETS):
+        self.name, self.help, self.labels = name, help, labels
+        self.buckets = tuple(buckets)
+        self._series: Dict[Tuple, list] = {}    # labels -> [compte par bucket..., +Inf, somme]
+
+    def observe(self, seconds: float, *values):
+        s = self._series.get(values)
+        if s is None:
+            s = self._series[values] = [0] * (len(self.buckets) + 1) + [0.0]
+        s[bisect_left(self.buckets, seconds)] += 1
+        s[-1] += seconds
+
+    def render(self) -> List[str]:
+        out = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for k, s in _sorted(self._series):
+            acc = 0
+            for le, n in zip(self.buckets + ("+Inf",), s):
+                acc += n
+                le_label = f'le="{le}"'
+                out.append(f"{self.name}_bucket{_labels(self.labels, k, le_label)} {acc}")
+            out.append(f"{self.name}_sum{_labels(self.labels, k)} {s[-1]:.6f}")
+            out.append(f"{self.name}_count{_labels(self.labels, k)} {acc}")
+        return out
+
+class Gauge:
+    """Read at scrape time from a callback returning {labels tuple: value}"""
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...], fn: Callable[[], Dict[Tuple, float]]):
+        self.name, self.help, self.labels, self.fn = name, help, labels, fn
+
+    def render(self) -> List[str]:
+        try:
+            values = self.fn()
+        except Exception:
+            return []
+        out = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        out += [f"{self.name}{_labels(self.labels, k)} {v:g}" for k, v in _sorted(values) if v is not None]
+        return out
+
+REGISTRY: list = []
+
+def register(m):
+    REGISTRY.append(m)
+    return m
+
+HTTP_REQUESTS = register(Counter(
+    "om_http_requests_total", "HTTP requests by route template and status", ("method", "route", "status")))
+HTTP_LATENCY = register(Histogram(
+    "om_http_request_duration_seconds", "Time to last response byte, by route template", ("method", "route")))
+DEP_LATENCY = register(Histogram(
+    "om_dependency_duration_seconds", "Outbound calls (groq, ollama, wordpress, turso, sqlite)", ("service", "op", "outcome")))
+
+def observe_dependency(service: str, op: str, outcome, seconds: float):
+    DEP_LATENCY.observe(seconds, service, op, outcome)
+    tracing.record(f"{service}.{op}", seconds)
+
+def gauge(name: str, help: str, labels: Tuple[str, ...], fn: Callable[[], Dict[Tuple, float]]):
+    return register(Gauge(name, help, labels, fn))
+
+def render() -> str:
+    lines: List[str] = []
+    for m in REGISTRY:
+        lines += m.render()
+    return "\n".join(lines) + "\n"
+
+class MetricsMiddleware:
+    """Pure ASGI middleware: one clock read at start, one at the final body chunk"""
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        t0 = time.perf_counter()
+        status = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            elif message["type"] == "http.response.body" and not message.get("more_body"):
+                _record(scope, status[0], time.perf_counter() - t0)
+                status[0] = None
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            if status[0] is not None:    # exception ou client parti avant la fin du corps
+                _record(scope, status[0], time.perf_counter() - t0)
+
+def _record(scope, status: int, seconds: float):
+    # Gabarit de route (/admin/tasks/{task_id}) pour garder une cardinalité bornée
+    route = scope.get("route")
+    path = getattr(route, "path", None)
+    if path is None and "app_root_path" in scope:
+        # Mount (/static) : pas de "route" dans le scope, le préfixe monté est ajouté à root_path
+        path = scope["root_path"][len(scope["app_root_path"]):] or None
+    path = path or "<unmatched>"
+    method = scope.get("method", "")
+    HTTP_REQUESTS.inc(method, path, status)
+    HTTP_LATENCY.observe(seconds, method, path)
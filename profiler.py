@@ -0,0 +1,130 @@
+# Opt-in sampling profiler — samples the event loop's stack while sampled requests are in flight, collapsed-stack output
+import os, sys, time, random, threading
+from collections import Counter
+from typing import Optional
+
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", "300"))
+PROFILE_MAX_DEPTH   = 128
+
+# Boucle en attente d'E/S : compté à part, pas dans les piles
+_IDLE = frozenset({"select", "poll", "epoll", "kqueue", "wait", "_wait_for_tstate_lock"})
+
+def _label(code) -> str:
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+class Session:
+    def __init__(self, seconds: float, rate: float, interval: float, all_threads: bool):
+        self.seconds = min(max(seconds, 1.0), PROFILE_MAX_SECONDS)
+        self.rate = min(max(rate, 0.0), 1.0)
+        self.interval = min(max(interval, 0.001), 1.0)
+        self.all_threads = all_threads
+        self.loop_thread = threading.get_ident()     # start() est appelé depuis la boucle asyncio
+        self.started = time.time()
+        self.ends_at = time.monotonic() + self.seconds
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.idle = 0
+        self.requests_seen = 0
+        self.requests_sampled = 0
+        self.active = 0                               # requêtes échantillonnées en cours
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="om-profiler", daemon=True)
+
+    @property
+    def running(self) -> bool:
+        return self._thread.is_alive()
+
+    def _sample(self):
+        me = threading.get_ident()
+        frames = sys._current_frames()
+        targets = [f for tid, f in frames.items() if tid != me] if self.all_threads else [frames.get(self.loop_thread)]
+        for frame in targets:
+            if frame is None:
+                continue
+            if frame.f_code.co_name in _IDLE:
+                self.idle += 1
+                continue
+            stack = []
+            while frame is not None and len(stack) < PROFILE_MAX_DEPTH:
+                stack.append(_label(frame.f_code))
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+        self.samples += 1
+
+    def _run(self):
+        while not self._stop.wait(self.interval) and time.monotonic() < self.ends_at:
+            if self.active > 0:
+                self._sample()
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread.is_alive() and threading.get_ident() != self._thread.ident:
+            self._thread.join(timeout=2)
+
+    def collapsed(self) -> str:
+        """Brendan Gregg's folded format: 'a;b;c <count>' per line, ready for flamegraph.pl / speedscope"""
+        return "".join(f"{stack} {n}\n" for stack, n in self.stacks.most_common())
+
+    def top(self, limit: int = 30) -> list:
+        own, total = Counter(), Counter()
+        for stack, n in self.stacks.items():
+            frames = stack.split(";")
+            own[frames[-1]] += n
+            for f in set(frames):
+                total[f] += n
+        return [{"frame": f, "self": n, "total": total[f]} for f, n in own.most_common(limit)]
+
+    def summary(self) -> dict:
+        return {
+            "running": self.running,
+            "started": self.started,
+            "seconds": self.seconds,
+            "rate": self.rate,
+            "interval_ms": round(self.interval * 1000, 2),
+            "all_threads": self.all_threads,
+            "samples": self.samples,
+            "idle": self.idle,
+            "requests_seen": self.requests_seen,
+            "requests_sampled": self.requests_sampled,
+        }
+
+_session: Optional[Session] = None
+
+def start(seconds: float = 30, rate: float = 0.1, interval_ms: float = 5, all_threads: bool = False) -> Session:
+    global _session
+    if _session is not None and _session.running:
+        raise RuntimeError("A profiling session is already running")
+    _session = Session(seconds, rate, interval_ms / 1000.0, all_threads)
+    _session.start()
+    return _session
+
+def stop() -> Optional[Session]:
+    if _session is not None:
+        _session.stop()
+    return _session
+
+def current() -> Optional[Session]:
+    return _session
+
+class ProfilerMiddleware:
+    """Pass-through unless a session is running; then a `rate` fraction of requests turns sampling on"""
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        s = _session
+        if s is None or scope["type"] != "http" or not s.running:
+            return await self.app(scope, receive, send)
+        s.requests_seen += 1
+        if random.random() >= s.rate:
+            return await self.app(scope, receive, send)
+        s.requests_sampled += 1
+        s.active += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            s.active -= 1
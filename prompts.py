@@ -0,0 +1,144 @@
+# Prompt registry — versioned templates: fixed instructions as a stable system prefix, variable data after it
+import hashlib, string, textwrap
+from typing import Dict, List, Tuple
+
+_formatter = string.Formatter()
+
+class PromptTemplate:
+    """System text is sent verbatim as the first message so upstream prefix caches can reuse it;
+    the user template is parsed once at registration and only filled per request."""
+    def __init__(self, name: str, version: int, system: str, user: str, **params):
+        self.name = name
+        self.version = version
+        self.system = textwrap.dedent(system).strip()
+        self.params = params   # model, temperature, max_tokens
+        self.prefix_hash = hashlib.sha256(self.system.encode("utf-8")).hexdigest()[:16]
+        self._parts: List[Tuple[str, str]] = [
+            (literal, field or "") for literal, field, _, _ in _formatter.parse(textwrap.dedent(user).strip())
+        ]
+        self.uses = 0
+
+    def user(self, **values) -> str:
+        return "".join(literal + (str(values[field]) if field else "") for literal, field in self._parts)
+
+    def messages(self, **values) -> List[dict]:
+        self.uses += 1
+        return [
+            {"role": "system", "content": self.system},
+            {"role": "user", "content": self.user(**values)},
+        ]
+
+    def payload(self, **values) -> dict:
+        return {**self.params, "messages": self.messages(**values)}
+
+    def stats(self) -> dict:
+        return {
+            "name": self.name,
+            "version": self.version,
+            "prefix_hash": self.prefix_hash,
+            "prefix_chars": len(self.system),
+            "uses": self.uses,
+        }
+
+REGISTRY: Dict[str, PromptTemplate] = {}
+
+def register(t: PromptTemplate) -> PromptTemplate:
+    REGISTRY[t.name] = t
+    return t
+
+def get(name: str) -> PromptTemplate:
+    return REGISTRY[name]
+
+def stats() -> list:
+    return [t.stats() for t in REGISTRY.values()]
+
+FILE_ANALYSIS = register(PromptTemplate(
+    "file_analysis", 2,
+    """
+    You analyze files uploaded to a website admin. Provide:
+    1. File type and purpose
+    2. Key content summary
+    3. Suggested actions (publish, archive, process)
+    4. SEO optimization suggestions if applicable
+    """,
+    """
+    File: {name}
+    Size: {size} bytes
+    Type: {mime_type}
+
+    Content preview:
+    {preview}
+    """,
+    model="llama-3.3-70b-versatile", temperature=0.3, max_tokens=1000,
+))
+
+WEBSITE_ANALYSIS = register(PromptTemplate(
+    "website_analysis", 2,
+    """
+    You analyze a reference website and provide insights for creating a similar site.
+    Provide:
+    1. Overall design style (modern, minimalist, corporate, creative, etc.)
+    2. Color scheme suggestions
+    3. Content strategy insights
+    4. Key features to replicate
+    5. SEO optimization suggestions
+    6. User experience recommendations
+    """,
+    """
+    URL: {url}
+    Title: {title}
+    Description: {description}
+    Content Type: {content_type}
+
+    Structure: {structure}
+
+    Content Sample: {sample}
+    """,
+    model="llama-3.3-70b-versatile", temperature=0.3, max_tokens=1500,
+))
+
+WEBSITE_STRUCTURE = register(PromptTemplate(
+    "website_structure", 2,
+    """
+    You create complete website structures. Generate:
+    1. Site map (pages and navigation)
+    2. Content sections for each page
+    3. SEO structure (meta tags, headings)
+    4. Call-to-action placements
+    5. User flow optimization
+    6. Mobile responsiveness considerations
+
+    Return as structured JSON with pages, sections, and metadata.
+    """,
+    """
+    Create a complete website structure for: {name}
+
+    Business Info: {site_data}
+    Template Style: {template}
+    Reference Sites: {references}
+    """,
+    model="llama-3.3-70b-versatile", temperature=0.4, max_tokens=2000,
+))
+
+WEBSITE_CONTENT = register(PromptTemplate(
+    "website_content", 2,
+    """
+    You write compelling website content. Create:
+    1. Homepage hero section with headline and subheadline
+    2. About section with company story
+    3. Services/products descriptions
+    4. Call-to-action copy
+    5. SEO-optimized meta descriptions
+    6. Social proof content
+
+    Make it engaging, conversion-focused, and professional.
+    """,
+    """
+    Generate compelling website content for: {name}
+
+    Business Data: {site_data}
+    Industry: {industry}
+    Target Audience: {audience}
+    """,
+    model="llama-3.3-70b-versatile", temperature=0.6, max_tokens=2500,
+))
@@ -0,0 +1,225 @@
+# Embedded read replica — local SQLite copy of the Turso tables read by the API, pulled periodically
+import os, re, time, asyncio, logging
+from typing import Dict, List, Optional
+
+import storage
+
+REPLICA_PATH            = os.getenv("REPLICA_PATH", "")                        # vide = désactivé
+REPLICA_SYNC_INTERVAL   = float(os.getenv("REPLICA_SYNC_INTERVAL", "2"))
+REPLICA_RESYNC_INTERVAL = float(os.getenv("REPLICA_RESYNC_INTERVAL", "900"))   # copie complète (updates/deletes d'autres instances)
+REPLICA_PAGE = 1000
+
+# Tables lues par les routes ; les tables à clé texte sont aussi écrites localement après le primaire
+REPLICA_TABLES = ("memories", "admin_tasks", "admin_reports", "admin_analyses", "chat_history", "ai_messages")
+MIRRORED = frozenset(REPLICA_TABLES) - {"ai_messages"}   # ids AUTOINCREMENT : seul le primaire les attribue
+
+log = logging.getLogger("om-gateway")
+
+_TABLES_RE = re.compile(r"\b(?:FROM|JOIN|INTO|UPDATE)\s+([A-Za-z_][A-Za-z0-9_]*)", re.IGNORECASE)
+
+def tables_of(sql: str) -> set:
+    return {t.lower() for t in _TABLES_RE.findall(sql)}
+
+def is_read(sql: str) -> bool:
+    return sql.lstrip().upper().startswith("SELECT")
+
+class Replica:
+    def __init__(self, path: str = REPLICA_PATH):
+        self.enabled = bool(path)
+        self.local = storage.SQLiteBackend(path, readers=2) if path else None
+        if self.local is not None:
+            self.local.name = "replica"     # libellé des métriques
+        self._primary = None
+        self._ready: set = set()               # tables copiées au moins une fois
+        self._watermark: Dict[str, int] = {}   # dernier rowid primaire tiré, par table
+        self._dirty: Dict[str, int] = {}       # table -> n° d'écriture non encore tirée
+        self._seq = 0
+        self._resyncing: Optional[str] = None
+        self._replay: List[tuple] = []         # écritures locales pendant la copie complète de _resyncing
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.last_sync = 0.0
+        self.last_resync = 0.0
+        self.sync_ms = 0.0
+        self.rows_pulled = 0
+        self.reads_local = 0
+        self.reads_primary = 0
+        self.errors = 0
+
+    # --- routage ---
+    def can_serve(self, sql: str) -> bool:
+        if not self.enabled or not is_read(sql):
+            return False
+        tables = tables_of(sql)
+        return bool(tables) and all(t in self._ready and t not in self._dirty for t in tables)
+
+    async def read(self, primary, sql: str, args=()):
+        if self.can_serve(sql):
+            self.reads_local += 1
+            return await self.local.execute(sql, args)
+        self.reads_primary += 1
+        return await primary.execute(sql, args)
+
+    async def after_write(self, stmts: List[tuple]):
+        """Apply our own primary writes locally, or mark the table stale until the next pull"""
+        if not self.enabled:
+            return
+        mirror = []
+        for sql, args in stmts:
+            for t in tables_of(sql):
+                if t not in REPLICA_TABLES or t not in self._ready:
+                    continue
+                if t in MIRRORED:
+                    mirror.append((sql, args))
+                    if t == self._resyncing:
+                        self._replay.append((sql, args))
+                else:
+                    self._seq += 1
+                    self._dirty[t] = self._seq
+                    self._wake.set()
+        if mirror:
+            try:
+                await self.local.batch(mirror)
+            except Exception as e:
+                log.warning(f"replica write-through failed, full resync scheduled: {e}")
+                self.last_resync = 0.0
+                self._wake.set()
+
+    # --- synchronisation ---
+    async def _create(self, name: str, target: str):
+        res = await self._primary.execute(
+            "SELECT type, name, sql FROM sqlite_master WHERE tbl_name = ? AND sql IS NOT NULL", [name])
+        stmts = [(f"DROP TABLE IF EXISTS {target}", ())]
+        stmts += [(re.sub(rf"\b{name}\b", target, r[2], count=1), ()) for r in res.rows if r[0] == "table"]
+        await self.local.batch(stmts)
+        return [r[2] for r in res.rows if r[0] == "index"]
+
+    async def _pull(self, name: str, target: str, since: int) -> int:
+        """Copy primary rows with rowid > since into target; returns the new watermark"""
+        while True:
+            res = await self._primary.execute(
+                f"SELECT rowid AS _rowid_, * FROM {name} WHERE rowid > ? ORDER BY rowid LIMIT {REPLICA_PAGE}", [since])
+            if not res.rows:
+                return since
+            cols = list(res.columns[1:])
+            sql = f"INSERT OR REPLACE INTO {target}({', '.join(cols)}) VALUES({', '.join('?' * len(cols))})"
+            await self.local.batch([(sql, tuple(r[1:])) for r in res.rows])
+            since = res.rows[-1][0]
+            self.rows_pulled += len(res.rows)
+            if len(res.rows) < REPLICA_PAGE:
+                return since
+
+    async def _resync_table(self, name: str):
+        # Copie dans une table fantôme puis bascule : les lectures locales restent servies pendant la copie
+        shadow = f"{name}__sync"
+        self._resyncing, self._replay = name, []
+        try:
+            indexes = await self._create(name, shadow)
+            mark = await self._pull(name, shadow, 0)
+            swap = [(f"DROP TABLE IF EXISTS {name}", ()), (f"ALTER TABLE {shadow} RENAME TO {name}", ())]
+            swap += [(re.sub(r"^CREATE (UNIQUE )?INDEX ", r"CREATE \1INDEX IF NOT EXISTS ", sql), ()) for sql in indexes]
+            await self.local.batch(swap + self._replay)
+        finally:
+            self._resyncing, self._replay = None, []
+        self._watermark[name] = mark
+        self._ready.add(name)
+
+    async def sync(self, full: bool = False):
+        t0 = time.monotonic()
+        started = self._seq
+        for name in REPLICA_TABLES:
+            if full or name not in self._ready:
+                await self._resync_table(name)
+            else:
+                self._watermark[name] = await self._pull(name, name, self._watermark.get(name, 0))
+        for t, seq in list(self._dirty.items()):
+            if seq <= started:
+                del self._dirty[t]
+        self.sync_ms = round((time.monotonic() - t0) * 1000, 2)
+        self.last_sync = time.time()
+        if full:
+            self.last_resync = self.last_sync
+
+    async def _loop(self):
+        while True:
+            try:
+                await self.sync(full=time.time() - self.last_resync > REPLICA_RESYNC_INTERVAL)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.errors += 1
+                log.warning(f"replica sync failed: {e}")
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), REPLICA_SYNC_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self, primary):
+        if self.enabled and self._task is None:
+            self._primary = getattr(primary, "primary", primary)   # jamais le client répliqué lui-même
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self.local is not None:
+            await self.local.close()
+
+    def stats(self) -> dict:
+        if not self.enabled:
+            return {"enabled": False}
+        return {
+            "enabled": True,
+            "path": self.local.path,
+            "ready_tables": sorted(self._ready),
+            "stale_tables": sorted(self._dirty),
+            "lag_seconds": round(time.time() - self.last_sync, 3) if self.last_sync else None,
+            "last_sync_ms": self.sync_ms,
+            "rows_pulled": self.rows_pulled,
+            "reads_local": self.reads_local,
+            "reads_primary": self.reads_primary,
+            "sync_errors": self.errors,
+        }
+
+class ReplicatedClient:
+    """Drop-in for the libsql client: SELECTs on fresh replicated tables are served locally"""
+    def __init__(self, primary, replica: Replica):
+        self.primary = primary
+        self.replica = replica
+
+    async def execute(self, sql: str, args=None):
+        if is_read(sql):
+            return await self.replica.read(self.primary, sql, args)
+        res = await self.primary.execute(sql, args)
+        await self.replica.after_write([(sql, args)])
+        return res
+
+    async def batch(self, stmts):
+        res = await self.primary.batch(stmts)
+        await self.replica.after_write([s if isinstance(s, tuple) else (s, None) for s in stmts])
+        return res
+
+    async def close(self):
+        ret = self.primary.close()
+        if hasattr(ret, "__await__"):
+            await ret
+
+_replica = Replica()
+
+def wrap(client):
+    """Return client unchanged unless REPLICA_PATH is set"""
+    if client is None or not _replica.enabled or isinstance(client, storage.SQLiteBackend):
+        return client
+    return ReplicatedClient(client, _replica)
+
+def start(primary):
+    if not isinstance(getattr(primary, "primary", primary), storage.SQLiteBackend):
+        _replica.start(primary)
+
+async def stop():
+    await _replica.stop()
+
+def stats() -> dict:
+    return _replica.stats()
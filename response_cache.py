@@ -0,0 +1,170 @@
+# /ai/chat answer cache — exact tier (normalized text) then semantic tier (embedding cosine), per persona/model partition
+import os, time, hashlib
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+import embeddings
+
+RESPONSE_CACHE        = os.getenv("RESPONSE_CACHE", "0") == "1"
+RESPONSE_CACHE_SIZE   = int(os.getenv("RESPONSE_CACHE_SIZE", "500"))       # entrées par partition
+RESPONSE_CACHE_TTL    = float(os.getenv("RESPONSE_CACHE_TTL", "3600"))
+SEMANTIC_THRESHOLD    = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.75"))
+RESPONSE_CACHE_PARTS  = 64     # partitions (persona x modèle) gardées en mémoire
+
+def normalize(text: str) -> str:
+    """Case, accents and punctuation are ignored by the exact tier"""
+    return " ".join(embeddings._WORD.findall(embeddings._fold(text)))
+
+def cache_key(messages: list) -> Optional[str]:
+    """Only single-turn questions are cacheable: any prior assistant turn changes what the question means"""
+    if not messages or messages[-1].get("role") != "user":
+        return None
+    if any(m.get("role") not in ("system", "user") for m in messages) or sum(m.get("role") == "user" for m in messages) != 1:
+        return None
+    return normalize(str(messages[-1].get("content") or "")) or None
+
+def partition_key(persona: Optional[str], model: str, messages: list,
+                  temperature: Optional[float] = None, max_tokens: Optional[int] = None) -> str:
+    """Answers are only shared between requests with the same persona, model, system prompt and generation parameters"""
+    system = "\n".join(str(m.get("content") or "") for m in messages if m.get("role") == "system")
+    return f"{persona or '-'}|{model}|{temperature}|{max_tokens}|{hashlib.sha256(system.encode('utf-8')).hexdigest()[:16]}"
+
+NO_USAGE = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+
+def replay(answer: dict) -> dict:
+    """A cached answer as served on a hit: no tokens were spent, so the original usage is not replayed"""
+    return dict(answer, usage=dict(NO_USAGE), cached=True)
+
+class _Entry:
+    __slots__ = ("answer", "ts", "hits")
+
+    def __init__(self, answer: dict):
+        self.answer = answer
+        self.ts = time.monotonic()
+        self.hits = 0
+
+class _Partition:
+    def __init__(self):
+        self.entries: "OrderedDict[str, _Entry]" = OrderedDict()   # texte normalisé -> réponse, ordre LRU
+        self.index = embeddings.VectorIndex()
+
+    def drop(self, key: str):
+        self.entries.pop(key, None)
+        self.index.remove(key)
+
+class ResponseCache:
+    def __init__(self, size: int = RESPONSE_CACHE_SIZE, ttl: float = RESPONSE_CACHE_TTL,
+                 threshold: float = SEMANTIC_THRESHOLD):
+        self.size = size
+        self.ttl = ttl
+        self.threshold = threshold
+        self._parts: "OrderedDict[str, _Partition]" = OrderedDict()
+        self.hits_exact = 0
+        self.hits_semantic = 0
+        self.misses = 0
+
+    def _fresh(self, part: _Partition, key: str) -> Optional[_Entry]:
+        e = part.entries.get(key)
+        if e is not None and time.monotonic() - e.ts > self.ttl:
+            part.drop(key)
+            return None
+        return e
+
+    def lookup(self, partition: str, key: str) -> Optional[Tuple[dict, str, float]]:
+        """Return (answer, tier, score) or None"""
+        part = self._parts.get(partition)
+        if part is None:
+            self.misses += 1
+            return None
+        self._parts.move_to_end(partition)
+        e = self._fresh(part, key)
+        tier, score = "exact", 1.0
+        if e is None:
+            for score, hit in part.index.search(embeddings.embed(key), k=1, min_score=self.threshold):
+                e = self._fresh(part, hit)
+                key, tier = hit, "semantic"
+        if e is None:
+            self.misses += 1
+            return None
+        part.entries.move_to_end(key)
+        e.hits += 1
+        if tier == "exact":
+            self.hits_exact += 1
+        else:
+            self.hits_semantic += 1
+        return e.answer, tier, round(score, 4)
+
+    def store(self, partition: str, key: str, answer: dict):
+        part = self._parts.get(partition)
+        if part is None:
+            part = self._parts[partition] = _Partition()
+            while len(self._parts) > RESPONSE_CACHE_PARTS:
+                self._parts.popitem(last=False)
+        self._parts.move_to_end(partition)
+        part.entries[key] = _Entry(answer)
+        part.entries.move_to_end(key)
+        part.index.add(key, embeddings.embed(key))
+        while len(part.entries) > self.size:
+            part.drop(next(iter(part.entries)))
+
+    def clear(self):
+        self._parts.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits_exact + self.hits_semantic + self.misses
+        return {
+            "enabled": RESPONSE_CACHE,
+            "backend": "numpy" if embeddings.numpy() is not None else "python",
+            "threshold": self.threshold,
+            "partitions": len(self._parts),
+            "entries": sum(len(p.entries) for p in self._parts.values()),
+            "hits_exact": self.hits_exact,
+            "hits_semantic": self.hits_semantic,
+            "misses": self.misses,
+            "hit_rate": round((self.hits_exact + self.hits_semantic) / lookups, 4) if lookups else None,
+        }
+
+cache = ResponseCache()
+
+# Jeu d'évaluation : paraphrases (doivent partager une réponse) et questions voisines mais différentes
+QUALITY_PAIRS = [
+    ("What are your opening hours?", "When are you open?", True),
+    ("What are your opening hours?", "what are ur opening hours", True),
+    ("How much does shipping cost?", "What is the shipping cost?", True),
+    ("How much does shipping cost?", "Shipping costs how much?", True),
+    ("Do you ship to Canada?", "Can you ship to Canada?", True),
+    ("How do I reset my password?", "How can I reset my password?", True),
+    ("How do I reset my password?", "password reset how?", True),
+    ("Quels sont vos horaires d'ouverture ?", "Quels sont vos horaires d'ouverture", True),
+    ("Combien coûte la livraison ?", "Quel est le coût de la livraison ?", True),
+    ("Est-ce que vous livrez au Québec ?", "Livrez-vous au Quebec ?", True),
+    ("Do you ship to Canada?", "Do you ship to France?", False),
+    ("How do I reset my password?", "How do I change my email?", False),
+    ("How much does shipping cost?", "How much does the premium plan cost?", False),
+    ("What are your opening hours?", "What is your address?", False),
+    ("Can I cancel my subscription?", "Can I pause my subscription?", False),
+    ("Combien coûte la livraison ?", "Combien coûte l'abonnement ?", False),
+    ("Est-ce que vous livrez au Québec ?", "Est-ce que vous livrez en France ?", False),
+]
+
+def evaluate(threshold: float = SEMANTIC_THRESHOLD, pairs=QUALITY_PAIRS) -> dict:
+    """Hit quality at a threshold: precision = correct hits / hits, recall = paraphrases served from cache"""
+    tp = fp = fn = 0
+    for a, b, same in pairs:
+        hit = embeddings.cosine(embeddings.embed(normalize(a)), embeddings.embed(normalize(b))) >= threshold
+        tp += hit and same
+        fp += hit and not same
+        fn += same and not hit
+    return {
+        "threshold": threshold,
+        "precision": round(tp / (tp + fp), 3) if tp + fp else None,
+        "recall": round(tp / (tp + fn), 3) if tp + fn else None,
+        "false_hits": fp,
+    }
+
+if __name__ == "__main__":
+    for a, b, same in QUALITY_PAIRS:
+        s = embeddings.cosine(embeddings.embed(normalize(a)), embeddings.embed(normalize(b)))
+        print(f"{s:6.3f} {'=' if same else '≠'} {a!r} / {b!r}")
+    for t in (0.6, 0.7, 0.75, 0.8, 0.85, 0.9, 0.95):
+        print(evaluate(t))
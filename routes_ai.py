@@ -1,24 +1,29 @@
 import os, time, httpx
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, BackgroundTasks, Request
 from pydantic import BaseModel
-from libsql_client import create_client
+import upstream, admission, replica, storage, metrics, usage
+from thread_cache import ThreadCache
 
 router = APIRouter(prefix="/ai")
 
 AI_BACKEND  = os.getenv("AI_BACKEND", "groq").lower()  # "groq" | "ollama"
 GROQ_KEY    = os.getenv("GROQ_API_KEY", "")
 OLLAMA_URL  = os.getenv("OLLAMA_URL", "http://localhost:11434")
-TURSO_URL   = os.getenv("TURSO_DB_URL", "")
-TURSO_TOKEN = os.getenv("TURSO_DB_AUTH_TOKEN", "")
+OM_ADMIN_KEY = os.getenv("OM_ADMIN_KEY", "")
 
-# Initialize DB only if credentials are available
+THREAD_CONTEXT_TOKENS = int(os.getenv("THREAD_CONTEXT_TOKENS", "3000"))  # budget prompt (hors réponse)
+THREAD_HISTORY_FETCH  = int(os.getenv("THREAD_HISTORY_FETCH", "60"))
+
+# Shared storage backend (Turso or local SQLite), None when nothing is configured
 db = None
-if TURSO_URL and TURSO_TOKEN:
-    try:
-        db = create_client(url=TURSO_URL, auth_token=TURSO_TOKEN)
-    except Exception as e:
-        print(f"Turso init failed: {e}")
-        db = None
+try:
+    db = replica.wrap(storage.get())
+except Exception as e:
+    print(f"Storage init failed: {e}")
+    db = None
+
+# Fils actifs servis depuis la mémoire ; écritures groupées vers ai_messages
+thread_cache = ThreadCache(lambda: db)
 
 async def ensure_schema():
     if db is None:
@@ -37,11 +42,21 @@ async def ensure_schema():
       content TEXT,
       ts INTEGER
     );""")
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_ai_messages_thread ON ai_messages(thread_id, id);")
+    await db.execute("""
+    CREATE TABLE IF NOT EXISTS ai_summaries(
+      thread_id TEXT PRIMARY KEY,
+      summary TEXT,
+      upto_id INTEGER,
+      ts INTEGER
+    );""")
 
-# Schema creation is handled by gateway.py startup event
-# if db is not None:
-#     import asyncio
-#     asyncio.run(ensure_schema())
+# Schema creation is handled by gateway.py startup event (init_schema -> ensure_schema)
+
+def usage_client(request: Request) -> str:
+    """Token budget key: x-om-client only when trusted (admin key or listed in CLIENT_TOKEN_BUDGETS), else the IP"""
+    admin = bool(OM_ADMIN_KEY) and request.headers.get("x-om-key") == OM_ADMIN_KEY
+    return usage.ledger.client_key(request.client.host, request.headers.get("x-om-client"), admin)
 
 class ChatReq(BaseModel):
     user_id: str = "matt"
@@ -51,40 +66,87 @@ class ChatReq(BaseModel):
     max_tokens: int | None = 512
     temperature: float | None = 0.3
     remember: bool | None = True
+    summarize: bool | None = False
 
 async def _history(thread_id: str, limit: int = 20):
+    """Last `limit` turns, oldest first, as (id, role, content) rows"""
     if db is None:
         return []
+    cached = thread_cache.get(thread_id, limit)
+    if cached is not None:
+        return cached
+    await thread_cache.flush()   # les tours en attente doivent être en base avant la relecture
     result = await db.execute(
-        "SELECT role, content FROM ai_messages WHERE thread_id=? ORDER BY id DESC LIMIT ?",
+        "SELECT id, role, content FROM ai_messages WHERE thread_id=? ORDER BY id DESC LIMIT ?",
         (thread_id, limit)
     )
-    return list(reversed(result.rows))
+    rows = list(reversed(result.rows))
+    thread_cache.fill(thread_id, rows, limit)
+    return thread_cache.get(thread_id, limit) or []
 
-async def _save(thread_id: str, role: str, content: str):
+def _est_tokens(text: str) -> int:
+    # ~4 caractères par token + surcoût du message ; assez précis pour borner le contexte
+    return len(text or "") // 4 + 4
+
+def _fit_history(history, budget: int):
+    """Keep the newest turns that fit in budget tokens -> (kept oldest-first, dropped oldest-first)"""
+    kept, used = [], 0
+    for i in range(len(history) - 1, -1, -1):
+        cost = _est_tokens(history[i][2])
+        if used + cost > budget:
+            return list(reversed(kept)), history[:i + 1]
+        kept.append(history[i])
+        used += cost
+    return list(reversed(kept)), []
+
+async def _summary(thread_id: str):
     if db is None:
+        return None, 0
+    res = await db.execute("SELECT summary, upto_id FROM ai_summaries WHERE thread_id=?", (thread_id,))
+    if not res.rows:
+        return None, 0
+    return res.rows[0][0], res.rows[0][1] or 0
+
+async def _update_summary(thread_id: str, previous, dropped, client: str):
+    """Fold turns that fell out of the context window into the thread's rolling summary"""
+    transcript = "\n".join(f"{row[1]}: {row[2]}" for row in dropped)
+    messages = [
+        {"role": "system", "content": "Résume la conversation en notes concises (faits, préférences, décisions). 150 mots maximum."},
+        {"role": "user", "content": (f"Résumé précédent:\n{previous}\n\n" if previous else "") + f"Nouveaux échanges:\n{transcript}"},
+    ]
+    try:
+        summary = await _call_groq(messages, 0.2, 300, client=client)
+    except HTTPException:
         return
     await db.execute(
-        "INSERT INTO ai_messages(thread_id, role, content, ts) VALUES(?,?,?,?)",
-        (thread_id, role, content, int(time.time()))
+        "INSERT INTO ai_summaries(thread_id, summary, upto_id, ts) VALUES(?,?,?,?) "
+        "ON CONFLICT(thread_id) DO UPDATE SET summary=excluded.summary, upto_id=excluded.upto_id, ts=excluded.ts",
+        (thread_id, summary, max((row[0] for row in dropped if row[0] is not None), default=0), int(time.time()))
     )
 
-async def _call_groq(messages, temperature, max_tokens):
-    url = "https://api.groq.com/openai/v1/chat/completions"
-    headers = {"Authorization": f"Bearer {GROQ_KEY}"}
+async def _save(thread_id: str, role: str, content: str):
+    if db is None:
+        return
+    thread_cache.append(thread_id, role, content)
+
+async def _call_groq(messages, temperature, max_tokens, client: str | None = None):
     body = {
         "model": "llama-3.1-8b-instant",
         "messages": messages,
         "temperature": temperature or 0.3,
         "max_tokens": max_tokens or 512,
     }
-    async with httpx.AsyncClient(timeout=60) as c:
-        r = await c.post(url, headers=headers, json=body)
-        if r.status_code != 200:
-            raise HTTPException(502, f"Groq {r.status_code}: {r.text[:400]}")
-        return r.json()["choices"][0]["message"]["content"].strip()
+    # Routeur partagé : retries avec backoff, respect de retry-after / x-ratelimit-*
+    try:
+        r, _ = await upstream.router.complete(body, route="thread_chat", client=client)
+    except upstream.UpstreamError as e:
+        raise HTTPException(e.status_code, e.detail, headers=e.headers())
+    if r.status_code != 200:
+        headers = {"Retry-After": r.headers["retry-after"]} if "retry-after" in r.headers else None
+        raise HTTPException(429 if r.status_code == 429 else 502, f"Groq {r.status_code}: {r.text[:400]}", headers=headers)
+    return upstream.completion_text(upstream.response_json(r)).strip()
 
-async def _call_ollama(messages, temperature, max_tokens):
+async def _call_ollama(messages, temperature, max_tokens, client: str | None = None):
     url = f"{OLLAMA_URL}/v1/chat/completions"
     body = {
         "model": "qwen2.5:7b-instruct",
@@ -92,9 +154,66 @@ async def _call_ollama(messages, temperature, max_tokens):
         "temperature": temperature or 0.3,
         "max_tokens": max_tokens or 512,
     }
-    async with httpx.AsyncClient(timeout=60) as c:
-        r = await c.post(url, json=body)
-        if r.status_code != 200:
-            raise HTTPException(502, f"Ollama {r.status_code}: {r.text[:400]}")
-        j = r.json()
-        return j["choices"][0]["message"]["content"].strip()
+    try:
+        async with admission.controller.slot("chat"):
+            t0 = time.monotonic()
+            async with httpx.AsyncClient(timeout=60) as c:
+                r = await c.post(url, json=body)
+            metrics.observe_dependency("ollama", "completion", r.status_code, time.monotonic() - t0)
+    except admission.Overloaded as e:
+        raise HTTPException(503, "Gateway busy, retry later", headers={"Retry-After": str(int(e.retry_after + 0.999))})
+    if r.status_code != 200:
+        raise HTTPException(502, f"Ollama {r.status_code}: {r.text[:400]}")
+    j = r.json()
+    return j["choices"][0]["message"]["content"].strip()
+
+@router.post("/threads/chat")
+async def thread_chat(req: ChatReq, request: Request, background: BackgroundTasks):
+    """Chat within a stored thread: history comes from ai_messages, trimmed to THREAD_CONTEXT_TOKENS.
+    Rate-limited per IP by the gateway (router dependency), like /ai/chat."""
+    client = usage_client(request)       # budget compté côté serveur, jamais sur le user_id fourni
+    history = await _history(req.thread_id, THREAD_HISTORY_FETCH)
+    summary, upto_id = (await _summary(req.thread_id)) if req.summarize else (None, 0)
+
+    budget = THREAD_CONTEXT_TOKENS - _est_tokens(req.message) - _est_tokens(req.system or "") - _est_tokens(summary or "")
+    kept, dropped = _fit_history(history, max(budget, 0))
+
+    messages = []
+    if req.system:
+        messages.append({"role": "system", "content": req.system})
+    if summary:
+        messages.append({"role": "system", "content": f"Résumé des échanges précédents:\n{summary}"})
+    messages += [{"role": row[1], "content": row[2]} for row in kept]
+    messages.append({"role": "user", "content": req.message})
+
+    call = _call_ollama if AI_BACKEND == "ollama" else _call_groq
+    answer = await call(messages, req.temperature, req.max_tokens, client=client)
+
+    # Écritures après la réponse : le client n'attend pas Turso
+    if req.remember and db is not None:
+        background.add_task(_save_turn, req.user_id, req.thread_id, req.message, answer, not history)
+    unsummarized = [row for row in dropped if row[0] is None or row[0] > upto_id]
+    if req.summarize and unsummarized and db is not None:
+        background.add_task(_update_summary, req.thread_id, summary, unsummarized, client)
+
+    return {
+        "ok": True,
+        "thread_id": req.thread_id,
+        "response": answer,
+        "context": {
+            "messages": len(messages),
+            "history_kept": len(kept),
+            "history_dropped": len(dropped),
+            "summarized": bool(summary),
+            "est_prompt_tokens": sum(_est_tokens(m["content"]) for m in messages),
+        },
+    }
+
+async def _save_turn(user_id: str, thread_id: str, message: str, answer: str, new_thread: bool):
+    if new_thread:
+        await db.execute(
+            "INSERT OR IGNORE INTO ai_threads(thread_id, user_id, created_at) VALUES(?,?,?)",
+            (thread_id, user_id, int(time.time()))
+        )
+    await _save(thread_id, "user", message)
+    await _save(thread_id, "assistant", answer)
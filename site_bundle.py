@@ -0,0 +1,454 @@
+# Static site bundles: structure pages rendered to separate files, streamed as a zip
+import html, json, os, re, time, zipfile
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+SITE_CSS = """\
+* {
+    margin: 0;
+    padding: 0;
+    box-sizing: border-box;
+}
+
+body {
+    font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
+    line-height: 1.6;
+    color: #333;
+    background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
+    min-height: 100vh;
+}
+
+.container {
+    max-width: 1200px;
+    margin: 0 auto;
+    padding: 0 20px;
+}
+
+/* Header */
+header {
+    background: rgba(255, 255, 255, 0.95);
+    backdrop-filter: blur(10px);
+    box-shadow: 0 2px 20px rgba(0,0,0,0.1);
+    position: fixed;
+    width: 100%;
+    top: 0;
+    z-index: 1000;
+}
+
+nav {
+    display: flex;
+    justify-content: space-between;
+    align-items: center;
+    padding: 1rem 0;
+}
+
+.logo {
+    font-size: 1.8rem;
+    font-weight: bold;
+    color: #667eea;
+}
+
+.nav-links {
+    display: flex;
+    list-style: none;
+    gap: 2rem;
+}
+
+.nav-links a {
+    text-decoration: none;
+    color: #333;
+    font-weight: 500;
+    transition: color 0.3s;
+}
+
+.nav-links a:hover {
+    color: #667eea;
+}
+
+/* Hero Section */
+.hero {
+    background: linear-gradient(135deg, rgba(102, 126, 234, 0.9), rgba(118, 75, 162, 0.9)),
+                url('https://images.unsplash.com/photo-1557804506-669a67965ba0?ixlib=rb-4.0.3&auto=format&fit=crop&w=2074&q=80');
+    background-size: cover;
+    background-position: center;
+    color: white;
+    padding: 120px 0 80px;
+    text-align: center;
+    margin-top: 70px;
+}
+
+.hero h1 {
+    font-size: 3.5rem;
+    margin-bottom: 1rem;
+    text-shadow: 2px 2px 4px rgba(0,0,0,0.3);
+}
+
+.hero p {
+    font-size: 1.3rem;
+    margin-bottom: 2rem;
+    opacity: 0.9;
+}
+
+.cta-button {
+    display: inline-block;
+    background: #ff6b6b;
+    color: white;
+    padding: 15px 30px;
+    text-decoration: none;
+    border-radius: 50px;
+    font-weight: bold;
+    transition: transform 0.3s, box-shadow 0.3s;
+    box-shadow: 0 4px 15px rgba(255, 107, 107, 0.3);
+}
+
+.cta-button:hover {
+    transform: translateY(-2px);
+    box-shadow: 0 6px 20px rgba(255, 107, 107, 0.4);
+}
+
+/* Sections */
+.section {
+    background: white;
+    margin: 40px 0;
+    padding: 60px 0;
+    border-radius: 15px;
+    box-shadow: 0 10px 30px rgba(0,0,0,0.1);
+}
+
+.section h2 {
+    text-align: center;
+    font-size: 2.5rem;
+    margin-bottom: 2rem;
+    color: #333;
+}
+
+.section-content {
+    max-width: 800px;
+    margin: 0 auto;
+    padding: 0 20px;
+}
+
+/* Services Grid */
+.services-grid {
+    display: grid;
+    grid-template-columns: repeat(auto-fit, minmax(300px, 1fr));
+    gap: 2rem;
+    margin-top: 3rem;
+}
+
+.service-card {
+    background: #f8f9fa;
+    padding: 2rem;
+    border-radius: 10px;
+    text-align: center;
+    transition: transform 0.3s, box-shadow 0.3s;
+}
+
+.service-card:hover {
+    transform: translateY(-5px);
+    box-shadow: 0 10px 25px rgba(0,0,0,0.15);
+}
+
+.service-card h3 {
+    color: #667eea;
+    margin-bottom: 1rem;
+}
+
+/* Footer */
+footer {
+    background: #2c3e50;
+    color: white;
+    padding: 40px 0;
+    text-align: center;
+}
+
+.footer-content {
+    display: grid;
+    grid-template-columns: repeat(auto-fit, minmax(250px, 1fr));
+    gap: 2rem;
+    margin-bottom: 2rem;
+}
+
+.footer-section h3 {
+    margin-bottom: 1rem;
+    color: #3498db;
+}
+
+.footer-section ul {
+    list-style: none;
+}
+
+.footer-section ul li {
+    margin-bottom: 0.5rem;
+}
+
+.footer-section a {
+    color: #bdc3c7;
+    text-decoration: none;
+}
+
+.footer-section a:hover {
+    color: #3498db;
+}
+
+.copyright {
+    border-top: 1px solid #34495e;
+    padding-top: 2rem;
+    color: #95a5a6;
+}
+
+/* Responsive */
+@media (max-width: 768px) {
+    .hero h1 {
+        font-size: 2.5rem;
+    }
+
+    .nav-links {
+        display: none;
+    }
+
+    .services-grid {
+        grid-template-columns: 1fr;
+    }
+}
+"""
+
+DEFAULT_PAGES = ["home", "about", "services", "contact"]
+CHUNK_SIZE = 64 * 1024
+
+_PAGE_TEMPLATE = '''<!DOCTYPE html>
+<html lang="fr">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>{title}</title>
+    <meta name="description" content="{description}">
+    <link rel="stylesheet" href="assets/style.css">
+</head>
+<body>
+    <header>
+        <nav class="container">
+            <div class="logo">{company_name}</div>
+            <ul class="nav-links">
+{nav_html}
+            </ul>
+        </nav>
+    </header>
+{body_html}
+    <footer>
+        <div class="container">
+            <div class="footer-content">
+                <div class="footer-section">
+                    <h3>{company_name}</h3>
+                    <p>{footer_description}</p>
+                </div>
+                <div class="footer-section">
+                    <h3>Contact</h3>
+                    <ul>
+                        <li>Email: {contact_email}</li>
+                        <li>Tél: {contact_phone}</li>
+                    </ul>
+                </div>
+            </div>
+            <div class="copyright">
+                <p>&copy; {year} {company_name}. Tous droits réservés.</p>
+            </div>
+        </div>
+    </footer>
+</body>
+</html>'''
+
+_SECTION_TEMPLATE = '''
+    <section class="section">
+        <div class="container">
+            <h2>{heading}</h2>
+            <div class="section-content">
+                {inner}
+            </div>
+        </div>
+    </section>'''
+
+_HOME_SLUGS = {"home", "index", "accueil"}
+
+def slugify(text: str) -> str:
+    s = re.sub(r"[^a-z0-9]+", "-", str(text).lower()).strip("-")
+    return s or "page"
+
+def _section(item) -> dict:
+    if isinstance(item, dict):
+        heading = item.get("title") or item.get("heading") or item.get("name") or ""
+        body = item.get("content") or item.get("text") or item.get("description") or ""
+        return {"heading": str(heading), "content": body if isinstance(body, str) else json.dumps(body, ensure_ascii=False)}
+    return {"heading": str(item), "content": ""}
+
+def normalize_pages(structure: dict) -> List[dict]:
+    """Turn the AI structure's pages (strings, dicts or a name->page mapping) into slug/title/sections"""
+    raw = structure.get("pages") if isinstance(structure, dict) else None
+    if isinstance(raw, dict):
+        raw = [dict(v, name=k) if isinstance(v, dict) else {"name": k, "content": v} for k, v in raw.items()]
+    if not isinstance(raw, list) or not raw:
+        raw = DEFAULT_PAGES
+
+    pages, seen = [], set()
+    for p in raw:
+        if isinstance(p, dict):
+            title = str(p.get("title") or p.get("name") or p.get("slug") or "Page")
+            slug = slugify(p.get("slug") or p.get("name") or title)
+            sections = [_section(s) for s in (p.get("sections") or [])]
+            if p.get("content") and not sections:
+                sections = [_section({"title": title, "content": p["content"]})]
+        else:
+            title, slug, sections = str(p).replace("-", " ").title(), slugify(p), []
+        if slug in _HOME_SLUGS:
+            slug = "index"
+        if slug in seen:
+            continue
+        seen.add(slug)
+        pages.append({"slug": slug, "title": title, "sections": sections})
+
+    if "index" not in seen:
+        pages.insert(0, {"slug": "index", "title": "Accueil", "sections": []})
+    return pages
+
+def _services_html(site_data: dict) -> str:
+    out = ""
+    for service in (site_data.get("services") or [])[:6]:
+        if str(service).strip():
+            out += f'''
+                    <div class="service-card">
+                        <h3>{html.escape(str(service).strip())}</h3>
+                        <p>Service professionnel et de qualité pour répondre à vos besoins.</p>
+                    </div>'''
+    return f'<div class="services-grid">{out}\n                </div>' if out else ""
+
+def _page_body(page: dict, content: dict, site_data: dict, company_name: str, cta_href: str) -> str:
+    slug = page["slug"]
+    body = ""
+    if slug == "index":
+        hero_subtitle = html.escape(str(site_data.get("description", "Votre partenaire de confiance")))
+        body += f'''
+    <section class="hero">
+        <div class="container">
+            <h1>Bienvenue chez {html.escape(company_name)}</h1>
+            <p>{hero_subtitle}</p>
+            <a href="{cta_href}" class="cta-button">Nous contacter</a>
+        </div>
+    </section>'''
+    for s in page["sections"]:
+        body += _SECTION_TEMPLATE.format(
+            heading=html.escape(s["heading"]),
+            inner=f'<p>{html.escape(s["content"])}</p>' if s["content"] else "",
+        )
+    if page["sections"]:
+        return body
+
+    # Pas de sections fournies par l'IA : contenu par défaut selon la page
+    if slug in ("index", "services"):
+        services = _services_html(site_data)
+        if services:
+            body += _SECTION_TEMPLATE.format(heading="Nos Services", inner=services)
+    if slug in ("about", "a-propos"):
+        ai_content = str(content.get("content", "")) if isinstance(content, dict) else ""
+        body += _SECTION_TEMPLATE.format(
+            heading="À propos de nous",
+            inner="".join(f"<p>{html.escape(p)}</p>" for p in ai_content.split("\n\n") if p.strip())
+            or "<p>Nous sommes une entreprise passionnée par l'innovation et l'excellence.</p>",
+        )
+    if slug == "contact":
+        body += _SECTION_TEMPLATE.format(
+            heading="Contactez-nous",
+            inner="<p>N'hésitez pas à nous contacter pour discuter de vos projets et besoins.</p>",
+        )
+    if not body:
+        body = _SECTION_TEMPLATE.format(heading=html.escape(page["title"]), inner="")
+    return body
+
+def render_site(structure: dict, content: dict, site_data: dict) -> Iterator[Tuple[str, bytes]]:
+    """Yield (path, bytes) for every file of the site, one page at a time"""
+    structure = structure if isinstance(structure, dict) else {}
+    content = content if isinstance(content, dict) else {}
+    company_name = str(site_data.get("name", structure.get("title", "Mon Entreprise")))
+    contact_info = site_data.get("contact", {}) or {}
+    pages = normalize_pages(structure)
+
+    nav_html = "\n".join(
+        f'                <li><a href="{p["slug"]}.html">{html.escape(p["title"])}</a></li>' for p in pages
+    )
+    common = {
+        "company_name": html.escape(company_name),
+        "nav_html": nav_html,
+        "footer_description": html.escape(f'{company_name} - {site_data.get("description", "Votre partenaire de confiance.")}'),
+        "contact_email": html.escape(str(contact_info.get("email", "contact@exemple.com"))),
+        "contact_phone": html.escape(str(contact_info.get("phone", "+33 1 23 45 67 89"))),
+        "year": time.strftime("%Y"),
+    }
+
+    cta_href = "contact.html" if any(p["slug"] == "contact" for p in pages) else "index.html"
+
+    yield "assets/style.css", SITE_CSS.encode("utf-8")
+    for page in pages:
+        title = company_name if page["slug"] == "index" else f'{page["title"]} - {company_name}'
+        doc = _PAGE_TEMPLATE.format(
+            title=html.escape(title),
+            description=html.escape(str(content.get("description", f"Site officiel de {company_name}"))),
+            body_html=_page_body(page, content, site_data, company_name, cta_href),
+            **common,
+        )
+        yield f'{page["slug"]}.html', doc.encode("utf-8")
+
+    yield "sitemap.xml", (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+        + "".join(f'  <url><loc>{p["slug"]}.html</loc></url>\n' for p in pages)
+        + "</urlset>\n"
+    ).encode("utf-8")
+    yield "site.json", json.dumps(
+        {"name": company_name, "pages": [{"slug": p["slug"], "title": p["title"]} for p in pages]},
+        ensure_ascii=False, indent=2,
+    ).encode("utf-8")
+
+class _ZipSink:
+    """Write-only sink for ZipFile; no tell()/seek() so zipfile switches to data descriptors"""
+    def __init__(self):
+        self._parts: List[bytes] = []
+
+    def write(self, b) -> int:
+        self._parts.append(bytes(b))
+        return len(b)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        out = b"".join(self._parts)
+        self._parts.clear()
+        return out
+
+def iter_zip(files: Iterable[Tuple[str, bytes]], persist_to: Optional[Path] = None) -> Iterator[bytes]:
+    """Stream a zip archive file by file; optionally tee it to persist_to (atomic rename when complete)"""
+    sink = _ZipSink()
+    tmp = out = None
+    if persist_to is not None:
+        persist_to.parent.mkdir(parents=True, exist_ok=True)
+        tmp = persist_to.with_suffix(persist_to.suffix + ".part")
+        out = open(tmp, "wb")
+    try:
+        with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+            for name, data in files:
+                zf.writestr(name, data)
+                chunk = sink.drain()
+                if out is not None:
+                    out.write(chunk)
+                for i in range(0, len(chunk), CHUNK_SIZE):
+                    yield chunk[i:i + CHUNK_SIZE]
+        chunk = sink.drain()  # central directory
+        if out is not None:
+            out.write(chunk)
+            out.close()
+            out = None
+            os.replace(tmp, persist_to)
+        yield chunk
+    finally:
+        if out is not None:
+            out.close()
+            tmp.unlink(missing_ok=True)
@@ -0,0 +1,165 @@
+# Storage backends — remote Turso (libsql) or local SQLite file, behind the same execute/batch interface
+import os, time, sqlite3, asyncio, threading
+import metrics
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, List, Optional
+
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "").lower()     # "turso" | "sqlite" | "" (auto)
+SQLITE_PATH     = os.getenv("SQLITE_PATH", "data/onlymatt.db")
+SQLITE_READERS  = int(os.getenv("SQLITE_READERS", "4"))
+TURSO_DB_URL    = os.getenv("TURSO_DB_URL", "")
+TURSO_DB_AUTH   = os.getenv("TURSO_DB_AUTH_TOKEN", "")
+
+class LocalResult:
+    """Same surface as libsql_client.ResultSet; rows are sqlite3.Row (index or column name)"""
+    __slots__ = ("columns", "rows", "rows_affected", "last_insert_rowid")
+
+    def __init__(self, columns, rows, rows_affected, last_insert_rowid):
+        self.columns = columns
+        self.rows = rows
+        self.rows_affected = rows_affected
+        self.last_insert_rowid = last_insert_rowid
+
+def _is_read(sql: str) -> bool:
+    return sql.lstrip().upper().startswith("SELECT")
+
+async def _timed(service: str, op: str, coro):
+    t0 = time.perf_counter()
+    try:
+        res = await coro
+    except Exception:
+        metrics.observe_dependency(service, op, "error", time.perf_counter() - t0)
+        raise
+    metrics.observe_dependency(service, op, "ok", time.perf_counter() - t0)
+    return res
+
+class SQLiteBackend:
+    """sqlite3 in WAL mode: one writer connection on its own thread, reads spread over a
+    small pool with one connection per thread (WAL lets them run alongside the writer).
+    ":memory:" is private to each connection, so there the writer's connection serves reads too."""
+    name = "sqlite"
+
+    def __init__(self, path: str = SQLITE_PATH, readers: int = SQLITE_READERS):
+        self.path = path
+        self.memory = path == ":memory:"
+        self.readers = max(readers, 1)
+        self._writer: Optional[ThreadPoolExecutor] = None
+        self._readers: Optional[ThreadPoolExecutor] = None
+        self._local = threading.local()
+        self._conns: List[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+
+    def _pool(self, read: bool) -> ThreadPoolExecutor:
+        # Créés à la demande : close() au shutdown n'empêche pas un redémarrage dans le même process
+        if self._writer is None:
+            self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite-w")
+            self._readers = ThreadPoolExecutor(max_workers=self.readers, thread_name_prefix="sqlite-r")
+        return self._readers if read and not self.memory else self._writer
+
+    def _conn(self) -> sqlite3.Connection:
+        c = getattr(self._local, "conn", None)
+        if c is None:
+            if not self.memory:
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            c = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=10)
+            c.row_factory = sqlite3.Row
+            c.execute("PRAGMA journal_mode=WAL")
+            c.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = c
+            with self._lock:
+                self._conns.append(c)
+        return c
+
+    def _run(self, sql: str, args) -> LocalResult:
+        cur = self._conn().execute(sql, args or ())
+        rows = cur.fetchall()
+        cols = tuple(d[0] for d in cur.description or ())
+        return LocalResult(cols, rows, cur.rowcount, cur.lastrowid)
+
+    def _run_batch(self, stmts: Iterable) -> List[LocalResult]:
+        c = self._conn()
+        c.execute("BEGIN")
+        try:
+            out = [self._run(*((s, None) if isinstance(s, str) else s)) for s in stmts]
+            c.execute("COMMIT")
+        except Exception:
+            c.execute("ROLLBACK")
+            raise
+        return out
+
+    async def execute(self, sql: str, args=None) -> LocalResult:
+        read = _is_read(sql)
+        fut = asyncio.get_running_loop().run_in_executor(self._pool(read), self._run, sql, args)
+        return await _timed(self.name, "read" if read else "write", fut)
+
+    async def batch(self, stmts) -> List[LocalResult]:
+        """All statements in one transaction, like libsql's batch"""
+        fut = asyncio.get_running_loop().run_in_executor(self._pool(False), self._run_batch, list(stmts))
+        return await _timed(self.name, "batch", fut)
+
+    async def close(self):
+        if self._writer is None:
+            return
+        writer, readers, self._writer, self._readers = self._writer, self._readers, None, None
+        await asyncio.get_running_loop().run_in_executor(None, writer.shutdown)
+        await asyncio.get_running_loop().run_in_executor(None, readers.shutdown)
+        with self._lock:
+            for c in self._conns:
+                c.close()
+            self._conns.clear()
+        self._local = threading.local()
+
+class TursoBackend:
+    """libsql_client over HTTP; the client already exposes execute/batch/close"""
+    name = "turso"
+
+    def __init__(self, url: str = TURSO_DB_URL, auth_token: str = TURSO_DB_AUTH):
+        if url.startswith("libsql://"):
+            url = "https://" + url[len("libsql://"):]
+        self.url = url
+        self._auth = auth_token
+        self._client = None
+
+    def client(self):
+        if self._client is None:
+            from libsql_client import create_client
+            self._client = create_client(url=self.url, auth_token=self._auth)
+        return self._client
+
+    async def execute(self, sql: str, args=None):
+        return await _timed(self.name, "read" if _is_read(sql) else "write", self.client().execute(sql, args))
+
+    async def batch(self, stmts):
+        return await _timed(self.name, "batch", self.client().batch(stmts))
+
+    async def close(self):
+        if self._client is not None:
+            c, self._client = self._client, None
+            ret = c.close()
+            if hasattr(ret, "__await__"):
+                await ret
+
+def backend_name() -> Optional[str]:
+    if STORAGE_BACKEND in ("turso", "sqlite"):
+        return STORAGE_BACKEND
+    if TURSO_DB_URL and TURSO_DB_AUTH:
+        return "turso"
+    return "sqlite" if os.getenv("SQLITE_PATH") else None
+
+_backend = None
+
+def get():
+    """Process-wide backend (None when nothing is configured); shared by gateway and routes_ai"""
+    global _backend
+    if _backend is None:
+        name = backend_name()
+        if name == "turso":
+            _backend = TursoBackend()
+        elif name == "sqlite":
+            _backend = SQLiteBackend()
+    return _backend
+
+async def close():
+    """Release connections; the backend reopens them on next use"""
+    if _backend is not None:
+        await _backend.close()
@@ -31,9 +31,258 @@ def test_chat():
     response = client.post("/ai/chat", json=payload)
     print(f"Chat: {response.status_code} - {response.text[:200]}")
 
+def test_thread_context_trim():
+    """Thread history is trimmed newest-first to the token budget"""
+    from routes_ai import _fit_history
+    history = [(i, "user", "x" * 40) for i in range(1, 11)]  # ~14 tokens each
+    kept, dropped = _fit_history(history, 50)
+    print(f"Trim: kept {[r[0] for r in kept]} dropped {[r[0] for r in dropped]}")
+    assert [r[0] for r in kept] == [8, 9, 10]
+    assert [r[0] for r in dropped] == list(range(1, 8))
+
+def test_response_cache():
+    """Paraphrases hit the semantic tier; near-miss questions stay below the threshold"""
+    from response_cache import ResponseCache, evaluate, normalize
+    quality = evaluate()
+    print(f"Response cache quality: {quality}")
+    assert quality["false_hits"] == 0 and quality["recall"] >= 0.8
+    cache = ResponseCache(size=2)
+    cache.store("coach|m|x", normalize("How much does shipping cost?"), {"response": "5$"})
+    assert cache.lookup("coach|m|x", normalize("how much does shipping cost"))[1] == "exact"
+    assert cache.lookup("coach|m|x", normalize("What is the shipping cost?"))[1] == "semantic"
+    assert cache.lookup("other|m|x", normalize("What is the shipping cost?")) is None
+    assert cache.lookup("coach|m|x", normalize("Do you ship to France?")) is None
+    # Paramètres de génération différents : autre partition ; un hit ne rejoue pas l'usage d'origine
+    from response_cache import partition_key, replay
+    msgs = [{"role": "user", "content": "hi"}]
+    assert partition_key("coach", "m", msgs, 0.7, 16) != partition_key("coach", "m", msgs, 0.7, 1024)
+    assert replay({"response": "5$", "usage": {"total_tokens": 900}})["usage"]["total_tokens"] == 0
+
+def test_metrics_render():
+    """Histogram buckets are cumulative in the exposition format"""
+    import metrics
+    h = metrics.Histogram("t_seconds", "test", ("service", "outcome"), buckets=(0.1, 1.0))
+    for s, outcome in ((0.05, 200), (0.5, 200), (5.0, "error")):
+        h.observe(s, "groq", outcome)
+    text = "\n".join(h.render())
+    print(text)
+    assert 't_seconds_bucket{service="groq",outcome="200",le="1.0"} 2' in text
+    assert 't_seconds_count{service="groq",outcome="error"} 1' in text
+
+def test_metrics_mount_route():
+    """Requests to mounted apps are labelled with the mount path, not <unmatched>"""
+    import metrics
+    def count(route):
+        return sum(v for k, v in metrics.HTTP_REQUESTS._values.items() if k[1] == route)
+    before = count("/static"), count("<unmatched>")
+    client.get("/static/definitely-missing.css")
+    client.get("/no-such-page")
+    after = count("/static"), count("<unmatched>")
+    print(f"Mount route: /static +{after[0] - before[0]}, <unmatched> +{after[1] - before[1]}")
+    assert after[0] == before[0] + 1 and after[1] == before[1] + 1
+
+def test_fastjson_response():
+    """Fast engine renders what FastAPI's default path renders (non-str keys, datetimes, unicode)"""
+    import datetime, json, fastjson
+    from fastapi.encoders import jsonable_encoder
+    data = {"ok": True, 1: "é", "t": datetime.datetime(2026, 10, 1, 9, 0), "rows": [{"c": 0.8}]}
+    body = fastjson.JSONResponse(data).body
+    print(f"fastjson ({fastjson.ENGINE}): {body}")
+    assert json.loads(body) == json.loads(json.dumps(jsonable_encoder(data)))
+
+def test_compression():
+    """Large bodies are compressed, small ones left alone, streamed chunks decode as they arrive"""
+    import zlib
+    from starlette.applications import Starlette
+    from starlette.responses import PlainTextResponse, StreamingResponse
+    from starlette.routing import Route
+    from compression import CompressionMiddleware, _Compressor
+    inner = Starlette(routes=[
+        Route("/big", lambda r: PlainTextResponse("x" * 5000)),
+        Route("/small", lambda r: PlainTextResponse("ok")),
+        Route("/sse", lambda r: StreamingResponse((f"data: {i}\n\n" for i in range(3)), media_type="text/event-stream")),
+    ])
+    c = TestClient(CompressionMiddleware(inner))
+    r = c.get("/big", headers={"accept-encoding": "gzip"})
+    assert r.headers["content-encoding"] == "gzip" and int(r.headers["content-length"]) < 200 and r.text == "x" * 5000
+    assert "content-encoding" not in c.get("/small", headers={"accept-encoding": "gzip"}).headers
+    assert "content-encoding" not in c.get("/big", headers={"accept-encoding": "identity"}).headers
+    r = c.get("/sse", headers={"accept-encoding": "gzip"})
+    assert r.headers["content-encoding"] == "gzip" and r.text == "data: 0\n\ndata: 1\n\ndata: 2\n\n"
+    # Chaque chunk est vidé (sync flush) : décodable sans attendre la fin du flux
+    comp, d = _Compressor("gzip"), zlib.decompressobj(31)
+    events = [d.decompress(comp.chunk(f"data: {i}\n\n".encode(), False)) for i in range(3)]
+    print(f"Compressed SSE chunks: {events}")
+    assert events == [b"data: 0\n\n", b"data: 1\n\n", b"data: 2\n\n"]
+
+def test_admin_page_cache():
+    """Admin pages answer 304 on a matching ETag; hashed static URLs are cached as immutable"""
+    import re
+    r = client.get("/admin/chat")
+    assert r.status_code == 200 and r.headers["etag"]
+    assert client.get("/admin/chat", headers={"if-none-match": r.headers["etag"]}).status_code == 304
+    # Corps compressé à la volée : même validateur, mais faible
+    identity = client.get("/admin/chat", headers={"accept-encoding": "identity"}).headers["etag"]
+    gz = client.get("/admin/chat", headers={"accept-encoding": "gzip"})
+    assert gz.headers["content-encoding"] == "gzip" and gz.headers["etag"] == "W/" + identity
+    assert client.get("/admin/chat", headers={"accept-encoding": "gzip", "if-none-match": gz.headers["etag"]}).status_code == 304
+    url = re.search(r'href="(/static/css/admin\.css\?v=\w+)"', r.text).group(1)
+    print(f"Hashed asset: {url}")
+    assert "immutable" in client.get(url).headers["cache-control"]
+    assert client.get("/static/css/admin.css").headers["cache-control"] == "no-cache"
+
+def test_proxy_accept_encoding():
+    """The fallback proxy forwards the caller's Accept-Encoding: an identity client gets a plain body"""
+    import gzip, httpx, gateway
+    answer = b'{"choices":[{"message":{"content":"ok"}}]}'
+    class Backend(httpx.AsyncBaseTransport):
+        # Réponse non lue (MockTransport la lit, le relais brut ne pourrait plus la streamer)
+        async def handle_async_request(self, req):
+            headers = {"content-type": "application/json"}
+            body = answer
+            if "gzip" in req.headers.get("accept-encoding", ""):
+                headers["content-encoding"], body = "gzip", gzip.compress(answer)
+            return httpx.Response(200, headers=headers, stream=httpx.ByteStream(body))
+    saved = gateway.GROQ_API_KEY, gateway.OLLAMA_URL, gateway._proxy_client
+    gateway.GROQ_API_KEY, gateway.OLLAMA_URL = "", "http://backend.test/v1/chat/completions"
+    gateway._proxy_client = httpx.AsyncClient(transport=Backend())
+    try:
+        r = client.post("/ai/chat", json={"message": "Hello"}, headers={"accept-encoding": "identity"})
+    finally:
+        gateway.GROQ_API_KEY, gateway.OLLAMA_URL, gateway._proxy_client = saved
+    print(f"Proxy identity: {r.status_code} {r.headers.get('content-encoding')} {r.content[:40]}")
+    assert r.status_code == 200 and "content-encoding" not in r.headers and r.content == answer
+
+def test_upload_shed():
+    """A shed file analysis answers 503 with Retry-After instead of a 200 with an analysis_error"""
+    import tempfile, gateway, upstream
+    from pathlib import Path
+    async def shed(*args, **kwargs):
+        raise upstream.UpstreamError(503, "Gateway busy, retry later", retry_after=2.5)
+    saved = gateway.OM_ADMIN_KEY, gateway.GROQ_API_KEY, gateway.UPLOAD_DIR, gateway.llm.complete
+    gateway.OM_ADMIN_KEY, gateway.GROQ_API_KEY, gateway.llm.complete = "test-admin", "test-key", shed
+    with tempfile.TemporaryDirectory() as tmp:
+        gateway.UPLOAD_DIR = Path(tmp)
+        try:
+            r = client.post("/ai/files/upload", files={"file": ("notes.txt", b"hello")}, headers={"x-om-key": "test-admin"})
+        finally:
+            gateway.OM_ADMIN_KEY, gateway.GROQ_API_KEY, gateway.UPLOAD_DIR, gateway.llm.complete = saved
+    print(f"Upload shed: {r.status_code} {r.headers.get('retry-after')} {r.json()['err']}")
+    assert r.status_code == 503 and r.headers["retry-after"] == "3"
+
+def test_wp_batch_partial():
+    """If the batch endpoint vanishes after the first chunk, only the remaining pages are created one by one"""
+    import json, httpx, wp_client
+    calls = {"batch": 0, "single": 0}
+    def wordpress(request):
+        if request.url.path.endswith("/batch/v1"):
+            calls["batch"] += 1
+            if calls["batch"] > 1:
+                return httpx.Response(404)
+            n = len(json.loads(request.content)["requests"])
+            return httpx.Response(207, json={"responses": [{"status": 201, "body": {"id": 100 + k}} for k in range(n)]})
+        calls["single"] += 1
+        return httpx.Response(201, json={"id": 200 + calls["single"]})
+    async def run():
+        seen = []
+        async def on_result(i, res):
+            seen.append((i, res.get("page_id")))
+        async with wp_client.lease("https://batch-partial.test", "u", "p") as wp:
+            await wp._http.aclose()
+            wp._http = httpx.AsyncClient(transport=httpx.MockTransport(wordpress))
+            results = await wp.batch_create_pages([{"title": str(k)} for k in range(5)], on_result)
+        await wp_client.close_all()
+        return results, seen
+    saved = wp_client.WP_BATCH_MAX
+    wp_client.WP_BATCH_MAX = 2
+    try:
+        results, seen = asyncio.run(run())
+    finally:
+        wp_client.WP_BATCH_MAX = saved
+    print(f"WP batch partial: {[r.get('page_id') for r in results]} {calls}")
+    assert [r.get("page_id") for r in results] == [100, 101, 201, 202, 203]
+    assert calls == {"batch": 2, "single": 3} and [i for i, _ in sorted(seen)] == [0, 1, 2, 3, 4]
+
+def test_sqlite_memory():
+    """An in-memory SQLite backend sees its own tables from reads and writes"""
+    import storage
+    async def run():
+        b = storage.SQLiteBackend(":memory:")
+        await b.execute("CREATE TABLE t(x)")
+        await b.execute("INSERT INTO t VALUES(1)")
+        rows = (await b.execute("SELECT x FROM t")).rows
+        await b.close()
+        return [r[0] for r in rows]
+    assert asyncio.run(run()) == [1]
+
+def test_memory_import_export_roundtrip():
+    """Imported created_at values are normalized to SQL timestamps and come back through the keyset export"""
+    import json, gateway, storage
+    lines = [
+        {"id": "m1", "user_id": "rt", "persona": "p", "key": "k1", "value": "v1", "created_at": "2026-01-02T03:04:05Z"},
+        {"id": "m2", "user_id": "rt", "persona": "p", "key": "k2", "value": "v2", "created_at": "2026-01-03 10:00:00"},
+        {"id": "m3", "user_id": "rt", "persona": "p", "key": "k3", "value": "v3", "created_at": 1767322800},
+    ]
+    backend = storage.SQLiteBackend(":memory:")
+    saved = gateway.OM_ADMIN_KEY, gateway._db
+    gateway.OM_ADMIN_KEY, gateway._db = "test-admin", backend
+    try:
+        asyncio.run(backend.execute(gateway.SCHEMA_SQL[0]))
+        headers = {"x-om-key": "test-admin"}
+        r = client.post("/ai/memory/import", content="\n".join(json.dumps(l) for l in lines), headers=headers)
+        exported = [json.loads(l) for l in client.get("/ai/memory/export?user_id=rt", headers=headers).text.splitlines()]
+    finally:
+        gateway.OM_ADMIN_KEY, gateway._db = saved
+        asyncio.run(backend.close())
+    print(f"Round trip: {r.json()} -> {[(m['id'], m['created_at']) for m in exported]}")
+    assert r.json()["imported"] == 2 and r.json()["errors"][0]["line"] == 3
+    assert [(m["id"], m["created_at"]) for m in exported] == [("m1", "2026-01-02 03:04:05"), ("m2", "2026-01-03 10:00:00")]
+
+def test_readiness():
+    """/readyz answers 503 until startup has run, /healthz always answers"""
+    import gateway
+    assert client.get("/healthz").status_code == 200
+    if not gateway._ready:
+        assert client.get("/readyz").status_code == 503
+    with TestClient(app) as started:
+        r = started.get("/readyz")
+        print(f"Readiness: {r.status_code} - {r.json()}")
+        assert r.status_code == 200 and r.json()["ready_ms"] > 0
+
+def test_import_budget():
+    """Cold import of the gateway stays lazy and within IMPORT_BUDGET_MS (python -X importtime)"""
+    import subprocess, sys
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c", "import gateway"],
+                         capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+    assert out.returncode == 0, out.stderr[-2000:]
+    cumulative = {}
+    for line in out.stderr.splitlines():
+        if line.startswith("import time:") and "|" in line and "cumulative" not in line:
+            _, cum, name = line[len("import time:"):].split("|")
+            cumulative[name.strip()] = int(cum) / 1000
+    lazy = [m for m in ("bs4", "lxml", "aiofiles", "jinja2", "libsql_client", "numpy") if m in cumulative]
+    budget = float(os.getenv("IMPORT_BUDGET_MS", "1500"))
+    print(f"Import gateway: {cumulative['gateway']:.0f} ms (budget {budget:.0f} ms)")
+    assert not lazy, f"imported at startup: {lazy}"
+    assert cumulative["gateway"] < budget
+
 if __name__ == "__main__":
     print("Testing OnlyMatt Gateway locally...")
     test_health()
     test_ai_health()
     test_chat()
+    test_thread_context_trim()
+    test_response_cache()
+    test_metrics_render()
+    test_metrics_mount_route()
+    test_fastjson_response()
+    test_compression()
+    test_admin_page_cache()
+    test_proxy_accept_encoding()
+    test_upload_shed()
+    test_wp_batch_partial()
+    test_sqlite_memory()
+    test_memory_import_export_roundtrip()
+    test_readiness()
+    test_import_budget()
     print("Tests completed.")
\ No newline at end of file
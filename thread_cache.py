@@ -0,0 +1,94 @@
+# Hot-thread cache for ai_messages — per-thread ring buffers (LRU over threads) with batched write-behind
+import os, time, asyncio, logging
+from collections import OrderedDict, deque
+from typing import Callable, Deque, List, Optional
+
+THREAD_CACHE_THREADS  = int(os.getenv("THREAD_CACHE_THREADS", "1000"))
+THREAD_CACHE_TURNS    = int(os.getenv("THREAD_CACHE_TURNS", "60"))
+THREAD_FLUSH_INTERVAL = float(os.getenv("THREAD_FLUSH_INTERVAL", "0.5"))
+THREAD_FLUSH_BATCH    = 32
+MAX_ROWS_PER_INSERT   = 200    # 4 paramètres/ligne, reste sous la limite SQLite de 999 variables
+
+log = logging.getLogger("om-gateway")
+
+class _Thread:
+    __slots__ = ("rows", "complete")
+
+    def __init__(self, rows, complete: bool):
+        self.rows: Deque[list] = deque(rows, maxlen=THREAD_CACHE_TURNS)
+        self.complete = complete   # True : le buffer contient tout le fil (rien de plus ancien en base)
+
+class ThreadCache:
+    """Rows are [id, role, content]; id stays None until the write-behind flush assigns it"""
+    def __init__(self, conn: Callable, max_threads: int = THREAD_CACHE_THREADS):
+        self._conn = conn
+        self.max_threads = max_threads
+        self._threads: "OrderedDict[str, _Thread]" = OrderedDict()
+        self._pending: List[tuple] = []    # (thread_id, row, ts)
+        self._lock = asyncio.Lock()
+        self._flusher: Optional[asyncio.Task] = None
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, thread_id: str, limit: int) -> Optional[list]:
+        t = self._threads.get(thread_id)
+        if t is None or (len(t.rows) < limit and not t.complete):
+            self.misses += 1
+            return None
+        self._threads.move_to_end(thread_id)
+        self.hits += 1
+        rows = list(t.rows)
+        return rows[-limit:] if limit < len(rows) else rows
+
+    def fill(self, thread_id: str, rows: list, limit: int):
+        self._threads[thread_id] = _Thread([list(r) for r in rows], complete=len(rows) < limit)
+        self._threads.move_to_end(thread_id)
+        while len(self._threads) > self.max_threads:
+            self._threads.popitem(last=False)
+
+    def append(self, thread_id: str, role: str, content: str):
+        row = [None, role, content]
+        t = self._threads.get(thread_id)
+        if t is not None:
+            if len(t.rows) == t.rows.maxlen:
+                t.complete = False
+            t.rows.append(row)
+            self._threads.move_to_end(thread_id)
+        self._pending.append((thread_id, row, int(time.time())))
+        if len(self._pending) >= THREAD_FLUSH_BATCH:
+            asyncio.ensure_future(self.flush())
+        elif self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.ensure_future(self._delayed_flush())
+
+    async def _delayed_flush(self):
+        await asyncio.sleep(THREAD_FLUSH_INTERVAL)
+        await self.flush()
+
+    async def flush(self):
+        """Write pending rows with multi-row INSERTs and backfill their ids"""
+        async with self._lock:
+            while self._pending:
+                batch = self._pending[:MAX_ROWS_PER_INSERT]
+                args = []
+                for thread_id, row, ts in batch:
+                    args += [thread_id, row[1], row[2], ts]
+                sql = "INSERT INTO ai_messages(thread_id, role, content, ts) VALUES " + ",".join(["(?,?,?,?)"] * len(batch))
+                try:
+                    res = await self._conn().execute(sql, args)
+                except Exception as e:
+                    log.warning(f"ai_messages flush failed ({len(self._pending)} pending): {e}")
+                    return
+                del self._pending[:len(batch)]
+                last = getattr(res, "last_insert_rowid", None)
+                if last:
+                    # Un INSERT multi-lignes reçoit des rowids consécutifs
+                    for i, (_, row, _) in enumerate(batch):
+                        row[0] = last - len(batch) + 1 + i
+
+    def stats(self) -> dict:
+        return {
+            "threads": len(self._threads),
+            "pending_writes": len(self._pending),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
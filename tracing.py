@@ -0,0 +1,122 @@
+# Request tracing — request ids, timing spans, Server-Timing headers and a buffer of recent slow traces
+import os, time, itertools
+from collections import deque
+from contextvars import ContextVar
+from typing import Deque, List, Optional
+
+TRACE_SLOW_MS    = float(os.getenv("TRACE_SLOW_MS", "500"))    # seuil d'entrée dans le buffer des traces lentes
+TRACE_BUFFER     = int(os.getenv("TRACE_BUFFER", "50"))
+TRACE_MAX_SPANS  = 200
+
+# Préfixe aléatoire par process + compteur : unique sans appel système par requête (uuid4 lit os.urandom)
+_ID_PREFIX = os.urandom(4).hex()
+_ids = itertools.count(1)
+
+class Trace:
+    __slots__ = ("request_id", "method", "path", "started", "t0", "spans", "duration_ms", "status")
+
+    def __init__(self, request_id: str, method: str, path: str):
+        self.request_id = request_id
+        self.method = method
+        self.path = path
+        self.started = time.time()
+        self.t0 = time.perf_counter()
+        self.spans: List[tuple] = []    # (nom, début ms, durée ms, profondeur)
+        self.duration_ms = None
+        self.status = None
+
+    def add(self, name: str, start: float, seconds: float, depth: int):
+        if len(self.spans) < TRACE_MAX_SPANS:
+            self.spans.append((name, round((start - self.t0) * 1000, 2), round(seconds * 1000, 2), depth))
+
+    def server_timing(self) -> str:
+        # Agrégé par nom : plusieurs requêtes Turso donnent une seule entrée avec leur total
+        totals = {}
+        for name, _, ms, _ in self.spans:
+            t = totals.setdefault(name, [0.0, 0])
+            t[0] += ms
+            t[1] += 1
+        parts = [f'{name};dur={ms:.1f}' + (f';desc="x{n}"' if n > 1 else "") for name, (ms, n) in totals.items()]
+        parts.append(f"app;dur={(time.perf_counter() - self.t0) * 1000:.1f}")
+        return ", ".join(parts)
+
+    def to_dict(self) -> dict:
+        return {
+            "request_id": self.request_id,
+            "method": self.method,
+            "path": self.path,
+            "status": self.status,
+            "started": self.started,
+            "duration_ms": self.duration_ms,
+            "spans": [{"name": n, "start_ms": s, "duration_ms": d, "depth": depth} for n, s, d, depth in self.spans],
+        }
+
+_trace: ContextVar[Optional[Trace]] = ContextVar("om_trace", default=None)
+_depth: ContextVar[int] = ContextVar("om_trace_depth", default=0)
+_slow: Deque[Trace] = deque(maxlen=TRACE_BUFFER)
+
+def current_id() -> Optional[str]:
+    tr = _trace.get()
+    return tr.request_id if tr is not None else None
+
+def record(name: str, seconds: float):
+    """Add a finished span (e.g. an outbound call timed by the caller) to the current trace"""
+    tr = _trace.get()
+    if tr is not None:
+        tr.add(name, time.perf_counter() - seconds, seconds, _depth.get())
+
+class span:
+    """with tracing.span("html.parse"): ... — nested spans get a greater depth; no-op outside a request"""
+    __slots__ = ("name", "tr", "t0", "token")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.tr = _trace.get()
+        if self.tr is not None:
+            self.t0 = time.perf_counter()
+            self.token = _depth.set(_depth.get() + 1)
+        return self
+
+    def __exit__(self, *exc):
+        if self.tr is not None:
+            _depth.reset(self.token)
+            self.tr.add(self.name, self.t0, time.perf_counter() - self.t0, _depth.get())
+        return False
+
+class TracingMiddleware:
+    """Pure ASGI: assigns X-Request-ID (or keeps the caller's) and adds Server-Timing to the response"""
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        rid = None
+        for k, v in scope.get("headers", ()):
+            if k == b"x-request-id":
+                rid = v.decode("latin-1")[:64]
+                break
+        tr = Trace(rid or f"{_ID_PREFIX}{next(_ids):08x}", scope.get("method", ""), scope.get("path", ""))
+        token = _trace.set(tr)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                tr.status = message["status"]
+                headers = list(message.get("headers", []))
+                headers.append((b"x-request-id", tr.request_id.encode("latin-1")))
+                headers.append((b"server-timing", tr.server_timing().encode("latin-1")))
+                message = dict(message, headers=headers)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _trace.reset(token)
+            tr.duration_ms = round((time.perf_counter() - tr.t0) * 1000, 2)
+            if tr.duration_ms >= TRACE_SLOW_MS:
+                _slow.append(tr)
+
+def slow_traces(limit: int = 20) -> list:
+    return [t.to_dict() for t in sorted(_slow, key=lambda t: -t.duration_ms)[:limit]]
@@ -0,0 +1,389 @@
+# Upstream LLM routing — per-backend circuit breakers, health-aware ordering, failover, hedging and retries
+import os, re, time, random, asyncio, httpx
+import admission, usage, metrics, fastjson
+from email.utils import parsedate_to_datetime
+from collections import deque
+from typing import Deque, List, Optional, Tuple
+
+GROQ_URL          = os.getenv("GROQ_API_URL", "https://api.groq.com/openai/v1/chat/completions")
+UPSTREAM_TIMEOUT  = float(os.getenv("UPSTREAM_TIMEOUT", "60"))
+BREAKER_FAILURES  = int(os.getenv("UPSTREAM_BREAKER_FAILURES", "5"))
+BREAKER_COOLDOWN  = float(os.getenv("UPSTREAM_BREAKER_COOLDOWN", "30"))
+DEGRADED_LATENCY  = float(os.getenv("UPSTREAM_DEGRADED_LATENCY", "15"))
+HEDGE             = os.getenv("UPSTREAM_HEDGE", "").lower() in ("1", "true", "yes")
+HEDGE_MIN_DELAY   = float(os.getenv("UPSTREAM_HEDGE_MIN_DELAY", "0.5"))
+HEDGE_MIN_SAMPLES = 20
+HEALTH_WINDOW     = 60.0   # secondes d'historique pris en compte par error_rate()
+
+RETRY_MAX         = int(os.getenv("UPSTREAM_RETRIES", "3"))
+RETRY_DEADLINE    = float(os.getenv("UPSTREAM_RETRY_DEADLINE", "30"))
+BACKOFF_BASE      = float(os.getenv("UPSTREAM_BACKOFF_BASE", "0.25"))
+BACKOFF_CAP       = float(os.getenv("UPSTREAM_BACKOFF_CAP", "8"))
+THROTTLE_REQUESTS = int(os.getenv("UPSTREAM_THROTTLE_REQUESTS", "3"))
+THROTTLE_TOKENS   = int(os.getenv("UPSTREAM_THROTTLE_TOKENS", "2000"))
+
+class UpstreamError(Exception):
+    def __init__(self, status_code: int, detail: str, retry_after: Optional[float] = None):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = retry_after
+
+    def headers(self) -> Optional[dict]:
+        return {"Retry-After": str(int(self.retry_after + 0.999))} if self.retry_after is not None else None
+
+def retryable(r: httpx.Response) -> bool:
+    """429/5xx mean the backend is unhealthy for this request; other statuses are the caller's problem"""
+    return r.status_code == 429 or r.status_code >= 500
+
+class Throttled(Exception):
+    """Backend quota is exhausted until later than the caller's deadline"""
+    def __init__(self, wait: float):
+        super().__init__(f"rate limited for {wait:.1f}s")
+        self.wait = wait
+
+_DURATION_RE = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+
+def parse_duration(value: Optional[str]) -> Optional[float]:
+    """Seconds from Groq-style durations ("2m59.56s", "7.66s", "250ms") or a bare number"""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = _DURATION_RE.findall(value)
+    if not parts:
+        return None
+    unit = {"h": 3600.0, "m": 60.0, "s": 1.0, "ms": 0.001}
+    return sum(float(n) * unit[u] for n, u in parts)
+
+def retry_after(r: httpx.Response) -> Optional[float]:
+    v = r.headers.get("retry-after")
+    if not v:
+        return None
+    secs = parse_duration(v)
+    if secs is not None:
+        return secs
+    try:
+        return max(0.0, parsedate_to_datetime(v).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+class RateLimit:
+    """Quota left on a backend, from retry-after and x-ratelimit-* response headers"""
+    def __init__(self):
+        self.remaining_requests: Optional[int] = None
+        self.remaining_tokens: Optional[int] = None
+        self.reset_requests_at = 0.0
+        self.reset_tokens_at = 0.0
+        self.blocked_until = 0.0
+
+    def update(self, r: httpx.Response):
+        now = time.monotonic()
+        h = r.headers
+        if "x-ratelimit-remaining-requests" in h:
+            try:
+                self.remaining_requests = int(h["x-ratelimit-remaining-requests"])
+            except ValueError:
+                pass
+            self.reset_requests_at = now + (parse_duration(h.get("x-ratelimit-reset-requests")) or 0.0)
+        if "x-ratelimit-remaining-tokens" in h:
+            try:
+                self.remaining_tokens = int(h["x-ratelimit-remaining-tokens"])
+            except ValueError:
+                pass
+            self.reset_tokens_at = now + (parse_duration(h.get("x-ratelimit-reset-tokens")) or 0.0)
+        if r.status_code == 429:
+            self.blocked_until = now + (retry_after(r) or self.reset_delay(now) or 1.0)
+
+    def reset_delay(self, now: float) -> float:
+        return max(self.reset_requests_at, self.reset_tokens_at) - now
+
+    def delay(self) -> float:
+        """How long to hold the next request: the full block after a 429, or paced spacing when quota runs low"""
+        now = time.monotonic()
+        waits = [self.blocked_until - now]
+        if self.remaining_requests is not None and self.remaining_requests <= THROTTLE_REQUESTS:
+            waits.append((self.reset_requests_at - now) / (self.remaining_requests + 1))
+        if self.remaining_tokens is not None and self.remaining_tokens <= THROTTLE_TOKENS:
+            waits.append((self.reset_tokens_at - now) / (1 if self.remaining_tokens <= 0 else 2))
+        return max(0.0, *waits)
+
+    def consume(self):
+        if self.remaining_requests is not None and self.remaining_requests > 0:
+            self.remaining_requests -= 1
+
+    def stats(self) -> dict:
+        return {
+            "remaining_requests": self.remaining_requests,
+            "remaining_tokens": self.remaining_tokens,
+            "throttle_delay": round(self.delay(), 3),
+        }
+
+class CircuitBreaker:
+    """closed -> open after N consecutive failures -> half_open (one probe per cooldown) -> closed"""
+    def __init__(self, failures: int = BREAKER_FAILURES, cooldown: float = BREAKER_COOLDOWN):
+        self.failures = failures
+        self.cooldown = cooldown
+        self.state = "closed"
+        self.consecutive = 0
+        self.opened_at = 0.0
+        self.probe_at = 0.0
+
+    def available(self) -> bool:
+        """Would allow() admit a request now? No side effect: ordering must not spend the half-open probe"""
+        if self.state == "closed":
+            return True
+        now = time.monotonic()
+        if self.state == "open":
+            return now - self.opened_at >= self.cooldown
+        return now - self.probe_at >= self.cooldown
+
+    def allow(self) -> bool:
+        """Admit a request, claiming the half-open probe; call only right before the request is sent"""
+        if self.state == "closed":
+            return True
+        now = time.monotonic()
+        if self.state == "open" and now - self.opened_at >= self.cooldown:
+            self.state = "half_open"
+            self.probe_at = 0.0
+        if self.state == "half_open" and now - self.probe_at >= self.cooldown:
+            self.probe_at = now
+            return True
+        return False
+
+    def success(self):
+        self.state = "closed"
+        self.consecutive = 0
+
+    def failure(self):
+        self.consecutive += 1
+        if self.state == "half_open" or self.consecutive >= self.failures:
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+class Backend:
+    def __init__(self, name: str, url: str, headers: Optional[dict] = None, model: Optional[str] = None,
+                 timeout: float = UPSTREAM_TIMEOUT):
+        self.name = name
+        self.url = url
+        self.headers = headers or {}
+        self.model = model
+        self.timeout = timeout
+        self.breaker = CircuitBreaker()
+        self.limits = RateLimit()
+        self.latencies: Deque[float] = deque(maxlen=200)
+        self.outcomes: Deque[Tuple[float, bool]] = deque(maxlen=50)
+        self.ewma: Optional[float] = None
+        self.client = httpx.AsyncClient(timeout=httpx.Timeout(timeout, read=timeout, write=30.0, connect=10.0))
+
+    def record(self, ok: bool, elapsed: float):
+        self.outcomes.append((time.monotonic(), ok))
+        if ok:
+            self.latencies.append(elapsed)
+            self.ewma = elapsed if self.ewma is None else 0.8 * self.ewma + 0.2 * elapsed
+            self.breaker.success()
+        else:
+            self.breaker.failure()
+
+    def error_rate(self) -> float:
+        cutoff = time.monotonic() - HEALTH_WINDOW
+        recent = [ok for t, ok in self.outcomes if t >= cutoff]
+        return (recent.count(False) / len(recent)) if recent else 0.0
+
+    def p95(self) -> Optional[float]:
+        if len(self.latencies) < HEDGE_MIN_SAMPLES:
+            return None
+        s = sorted(self.latencies)
+        return s[int(0.95 * (len(s) - 1))]
+
+    def healthy(self) -> bool:
+        return self.error_rate() < 0.5 and (self.ewma is None or self.ewma < DEGRADED_LATENCY)
+
+    async def send(self, body: dict, timeout: Optional[float] = None, deadline: Optional[float] = None) -> httpx.Response:
+        wait = self.limits.delay()
+        if wait > 0:
+            if deadline is not None and time.monotonic() + wait > deadline:
+                raise Throttled(wait)
+            await asyncio.sleep(wait)
+        self.limits.consume()
+        payload = dict(body, model=self.model) if self.model else body
+        t0 = time.monotonic()
+        try:
+            r = await self.client.post(self.url, json=payload, headers=self.headers,
+                                       timeout=timeout if timeout is not None else httpx.USE_CLIENT_DEFAULT)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            self.record(False, time.monotonic() - t0)
+            metrics.observe_dependency(self.name, "completion", "error", time.monotonic() - t0)
+            raise
+        self.limits.update(r)
+        # 429 et 5xx comptent pour le disjoncteur : un backend qui renvoie 429 en boucle est écarté (bascule)
+        self.record(not retryable(r), time.monotonic() - t0)
+        metrics.observe_dependency(self.name, "completion", r.status_code, time.monotonic() - t0)
+        return r
+
+    def stats(self) -> dict:
+        return {
+            "name": self.name,
+            "state": self.breaker.state,
+            "healthy": self.healthy(),
+            "error_rate": round(self.error_rate(), 3),
+            "latency_ewma": round(self.ewma, 3) if self.ewma is not None else None,
+            "latency_p95": self.p95(),
+            **self.limits.stats(),
+        }
+
+class Router:
+    def __init__(self, backends: List[Backend], hedge: bool = HEDGE):
+        self.backends = backends
+        self.hedge = hedge
+
+    def ordered(self) -> List[Backend]:
+        """Backends whose breaker admits a request; healthy and unthrottled ones first, configured order otherwise"""
+        allowed = [b for b in self.backends if b.breaker.available()]
+        return sorted(allowed, key=lambda b: (not b.healthy(), b.limits.delay() > 0, self.backends.index(b)))
+
+    async def complete(self, body: dict, timeout: Optional[float] = None, retry: bool = True,
+                       priority: str = "chat", route: str = "chat",
+                       client: Optional[str] = None) -> Tuple[httpx.Response, Backend]:
+        """POST an OpenAI-style completion, failing over (and optionally hedging) across backends.
+
+        Each pass holds an admission slot of the given priority class ("chat" or "admin"); a full
+        queue raises UpstreamError(503) with a retry_after. A pass that ends in 429/5xx or a
+        transport error is retried with jittered backoff (or the server's retry-after) up to
+        UPSTREAM_RETRIES times within UPSTREAM_RETRY_DEADLINE seconds. Token usage of the final
+        response is recorded in the usage ledger under (model, route, client); a client over its
+        daily token budget gets UpstreamError(429) before anything is sent.
+        """
+        if not self.backends:
+            raise UpstreamError(502, "No AI backend configured")
+        try:
+            usage.ledger.check_budget(client)
+        except usage.BudgetExceeded as e:
+            raise UpstreamError(429, str(e), retry_after=e.retry_after)
+        t0 = time.monotonic()
+        deadline = t0 + RETRY_DEADLINE
+        attempt = 0
+        while True:
+            order = self.ordered()
+            if not order:
+                raise UpstreamError(503, "All AI backends unavailable (circuit open)")
+            try:
+                async with admission.controller.slot(priority):
+                    r, b, err = await self._pass(order, body, timeout, deadline)
+            except admission.Overloaded as e:
+                raise UpstreamError(503, "Gateway busy, retry later", retry_after=e.retry_after)
+            if r is not None and not retryable(r):
+                self._account(r, b, body, route, client, t0)
+                return r, b
+            attempt += 1
+            hint = retry_after(r) if r is not None else (err.wait if isinstance(err, Throttled) else None)
+            wait = (hint + random.uniform(0, BACKOFF_BASE)) if hint is not None \
+                else random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+            if not retry or attempt > RETRY_MAX or time.monotonic() + wait >= deadline:
+                break
+            await asyncio.sleep(wait)
+
+        if r is not None:
+            self._account(r, b, body, route, client, t0)
+            return r, b
+        if isinstance(err, Throttled):
+            raise UpstreamError(429, f"AI backend {err}", retry_after=err.wait)
+        if isinstance(err, httpx.TimeoutException):
+            raise UpstreamError(504, "AI backend timeout")
+        if isinstance(err, httpx.ConnectError):
+            raise UpstreamError(502, "AI backend unreachable")
+        raise UpstreamError(502, str(err) or "AI backend error")
+
+    def _account(self, r: httpx.Response, b: Backend, body: dict, route: str, client: Optional[str], t0: float):
+        data = {}
+        if r.status_code == 200:
+            try:
+                data = response_json(r)
+            except ValueError:
+                pass
+        u = data.get("usage") if isinstance(data, dict) else None
+        if not u and isinstance(data, dict) and "eval_count" in data:   # réponse Ollama native
+            u = {"prompt_tokens": data.get("prompt_eval_count"), "completion_tokens": data.get("eval_count")}
+        model = (data.get("model") if isinstance(data, dict) else None) or b.model or body.get("model")
+        usage.ledger.record(route, client or "anonymous", model, u, time.monotonic() - t0)
+
+    async def _pass(self, order: List[Backend], body: dict, timeout: Optional[float], deadline: float):
+        """One failover pass over order -> (response, backend, None) or (last bad response|None, backend, error)"""
+        last_r, last_b, last_err = None, None, None
+        i = 0
+        while i < len(order):
+            primary = order[i]
+            i += 1
+            if not primary.breaker.allow():          # sonde half-open prise entre-temps par une autre requête
+                continue
+            hedge = order[i] if self.hedge and i < len(order) else None
+            delay = None
+            if hedge is not None:
+                p95 = primary.p95()
+                delay = max(HEDGE_MIN_DELAY, p95) if p95 is not None else None
+                if delay is None:
+                    hedge = None
+
+            tasks = {asyncio.create_task(primary.send(body, timeout, deadline)): primary}
+            try:
+                while tasks:
+                    done, _ = await asyncio.wait(tasks, timeout=delay, return_when=asyncio.FIRST_COMPLETED)
+                    if not done:
+                        # p95 dépassé : requête de couverture sur le backend suivant
+                        if hedge.breaker.allow():
+                            tasks[asyncio.create_task(hedge.send(body, timeout, deadline))] = hedge
+                            i += 1
+                        hedge, delay = None, None
+                        continue
+                    for t in done:
+                        b = tasks.pop(t)
+                        try:
+                            r = t.result()
+                        except Exception as e:
+                            last_b, last_err = b, e
+                            continue
+                        if retryable(r):
+                            last_r, last_b = r, b
+                            continue
+                        return r, b, None
+            finally:
+                for t in tasks:
+                    t.cancel()
+        return last_r, last_b, last_err
+
+    def stats(self) -> list:
+        return [b.stats() for b in self.backends]
+
+    async def aclose(self):
+        for b in self.backends:
+            await b.client.aclose()
+
+# Routeur partagé, configuré au démarrage par gateway.py (aussi utilisé par routes_ai)
+router = Router([])
+
+def configure(backends: List[Backend], hedge: bool = HEDGE) -> Router:
+    router.backends = backends
+    router.hedge = hedge
+    return router
+
+def response_json(r: httpx.Response):
+    """r.json(), decoded once per response (orjson when available) and cached on it"""
+    data = getattr(r, "_om_json", None)
+    if data is None:
+        data = r._om_json = fastjson.loads(r.content)
+    return data
+
+def completion_text(data: dict) -> str:
+    """Assistant text from an OpenAI-style body, or Ollama's native /api/chat and /api/generate shapes"""
+    try:
+        return data["choices"][0]["message"]["content"]
+    except (KeyError, IndexError, TypeError):
+        pass
+    if isinstance(data.get("message"), dict):
+        return data["message"].get("content", "")
+    return data.get("response", "")
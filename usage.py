@@ -0,0 +1,179 @@
+# Token usage ledger — in-memory rollups per hour/model/route/client, flushed to Turso, per-client daily budgets
+import os, time, asyncio, logging
+from datetime import datetime, timezone, timedelta
+from typing import Callable, Dict, Optional, Tuple
+
+USAGE_FLUSH_INTERVAL = float(os.getenv("USAGE_FLUSH_INTERVAL", "30"))
+CLIENT_TOKEN_BUDGET  = int(os.getenv("CLIENT_TOKEN_BUDGET", "0"))      # tokens/jour/client, 0 = illimité
+CLIENT_TOKEN_BUDGETS = os.getenv("CLIENT_TOKEN_BUDGETS", "")           # "cle1:100000,cle2:5000"
+USAGE_RETAIN_HOURS   = 48     # buckets gardés en mémoire si Turso est indisponible
+
+log = logging.getLogger("om-gateway")
+
+SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS usage_ledger (
+  bucket TEXT NOT NULL,
+  model TEXT NOT NULL,
+  route TEXT NOT NULL,
+  client TEXT NOT NULL,
+  requests INTEGER DEFAULT 0,
+  prompt_tokens INTEGER DEFAULT 0,
+  completion_tokens INTEGER DEFAULT 0,
+  latency_ms INTEGER DEFAULT 0,
+  PRIMARY KEY (bucket, model, route, client)
+);
+"""
+
+GROUP_COLUMNS = ("model", "route", "client", "bucket")
+
+Key = Tuple[str, str, str, str]
+
+class BudgetExceeded(Exception):
+    def __init__(self, client: str, retry_after: float):
+        super().__init__(f"Daily token budget exceeded for {client}")
+        self.retry_after = retry_after
+
+def _budgets() -> Dict[str, int]:
+    out = {}
+    for part in CLIENT_TOKEN_BUDGETS.split(","):
+        if ":" in part:
+            k, v = part.rsplit(":", 1)
+            try:
+                out[k.strip()] = int(v)
+            except ValueError:
+                pass
+    return out
+
+def _now_utc() -> datetime:
+    return datetime.now(timezone.utc)
+
+class UsageLedger:
+    def __init__(self):
+        self._pending: Dict[Key, list] = {}
+        self._daily: Dict[Tuple[str, str], int] = {}     # (jour, client) -> tokens
+        self._budgets = _budgets()
+        self._db: Optional[Callable] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def record(self, route: str, client: str, model: Optional[str], usage: Optional[dict], latency: float):
+        usage = usage or {}
+        prompt = int(usage.get("prompt_tokens") or 0)
+        completion = int(usage.get("completion_tokens") or 0)
+        now = _now_utc()
+        key = (now.strftime("%Y-%m-%dT%H"), model or "?", route, client or "?")
+        row = self._pending.get(key)
+        if row is None:
+            row = self._pending[key] = [0, 0, 0, 0]
+        row[0] += 1
+        row[1] += prompt
+        row[2] += completion
+        row[3] += int(latency * 1000)
+        day = (now.strftime("%Y-%m-%d"), client or "?")
+        self._daily[day] = self._daily.get(day, 0) + prompt + completion
+
+    def client_key(self, host: str, claimed: Optional[str] = None, admin: bool = False) -> str:
+        """Usage/budget key derived server-side. A claimed name (x-om-client) counts only for admin callers
+        or when CLIENT_TOKEN_BUDGETS lists it; everyone else is counted by IP, so a new header value is not a new budget"""
+        if claimed and (admin or claimed in self._budgets):
+            return claimed
+        return "admin" if admin else (host or "?")
+
+    def budget_for(self, client: str) -> int:
+        return self._budgets.get(client, CLIENT_TOKEN_BUDGET)
+
+    def check_budget(self, client: Optional[str]):
+        """Raise BudgetExceeded when client has used its daily tokens (UTC day)"""
+        if not client:
+            return
+        budget = self.budget_for(client)
+        if budget <= 0:
+            return
+        now = _now_utc()
+        if self._daily.get((now.strftime("%Y-%m-%d"), client), 0) >= budget:
+            tomorrow = (now + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+            raise BudgetExceeded(client, (tomorrow - now).total_seconds())
+
+    async def seed_daily(self, conn):
+        """Reload today's per-client totals after a restart so budgets survive redeploys"""
+        today = _now_utc().strftime("%Y-%m-%d")
+        res = await conn.execute(
+            "SELECT client, SUM(prompt_tokens + completion_tokens) FROM usage_ledger "
+            "WHERE bucket >= :day GROUP BY client", {"day": today}
+        )
+        for r in res.rows:
+            key = (today, r[0])
+            self._daily[key] = max(self._daily.get(key, 0), int(r[1] or 0))
+
+    async def flush(self, conn):
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, {}
+        stmts = [
+            (
+                "INSERT INTO usage_ledger(bucket, model, route, client, requests, prompt_tokens, completion_tokens, latency_ms) "
+                "VALUES(:bucket, :model, :route, :client, :requests, :prompt, :completion, :latency) "
+                "ON CONFLICT(bucket, model, route, client) DO UPDATE SET "
+                "requests = requests + excluded.requests, "
+                "prompt_tokens = prompt_tokens + excluded.prompt_tokens, "
+                "completion_tokens = completion_tokens + excluded.completion_tokens, "
+                "latency_ms = latency_ms + excluded.latency_ms",
+                {"bucket": k[0], "model": k[1], "route": k[2], "client": k[3],
+                 "requests": v[0], "prompt": v[1], "completion": v[2], "latency": v[3]},
+            )
+            for k, v in pending.items()
+        ]
+        try:
+            await conn.batch(stmts)
+        except Exception:
+            # Remet les compteurs en attente pour le prochain flush
+            for k, v in pending.items():
+                row = self._pending.setdefault(k, [0, 0, 0, 0])
+                for i in range(4):
+                    row[i] += v[i]
+            raise
+
+    def _prune(self):
+        cutoff = (_now_utc() - timedelta(hours=USAGE_RETAIN_HOURS)).strftime("%Y-%m-%dT%H")
+        for k in [k for k in self._pending if k[0] < cutoff]:
+            del self._pending[k]
+        today = _now_utc().strftime("%Y-%m-%d")
+        for k in [k for k in self._daily if k[0] < today]:
+            del self._daily[k]
+
+    async def _loop(self):
+        while True:
+            await asyncio.sleep(USAGE_FLUSH_INTERVAL)
+            if self._db is not None:
+                try:
+                    await self.flush(self._db())
+                except Exception as e:
+                    log.warning(f"usage flush failed: {e}")
+            self._prune()
+
+    def start(self, db: Optional[Callable]):
+        """db: zero-arg callable returning the storage connection (gateway.db); None = prune only, nothing flushed"""
+        self._db = db
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self._db is not None:
+            try:
+                await self.flush(self._db())
+            except Exception as e:
+                log.warning(f"final usage flush failed: {e}")
+
+    def pending_rollup(self, by: str, since: str) -> Dict[str, list]:
+        idx = {"bucket": 0, "model": 1, "route": 2, "client": 3}[by]
+        out: Dict[str, list] = {}
+        for k, v in self._pending.items():
+            if k[0] >= since:
+                row = out.setdefault(k[idx], [0, 0, 0, 0])
+                for i in range(4):
+                    row[i] += v[i]
+        return out
+
+ledger = UsageLedger()
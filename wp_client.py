@@ -0,0 +1,243 @@
+# WordPress REST client — pooled per site, cached auth scheme, parallel and batched page creation
+import os, time, asyncio, logging, httpx
+import metrics
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+from urllib.parse import urlsplit
+
+WP_CONCURRENCY = int(os.getenv("WP_CONCURRENCY", "4"))
+WP_BATCH_MAX   = 25   # limite par défaut de /wp-json/batch/v1
+WP_MAX_CLIENTS = 32
+
+AUTH_METHODS = ("application_password", "bearer_token")
+
+log = logging.getLogger("om-gateway")
+
+# (site, utilisateur) -> méthode d'auth qui a fonctionné (évite de rejouer un 401 à chaque page)
+_auth_cache: Dict[Tuple[str, str], str] = {}
+_clients: "OrderedDict[Tuple[str, str], WPClient]" = OrderedDict()
+_closing: Set[asyncio.Task] = set()      # fermetures en cours, référencées jusqu'au bout
+
+OnResult = Optional[Callable[[int, dict], Awaitable[None]]]   # (index, résultat) dès qu'une page est traitée
+
+class WPAuthError(Exception):
+    """Every auth scheme was rejected with a 401"""
+    def __init__(self, errors: Dict[str, str]):
+        super().__init__("WordPress authentication failed")
+        self.errors = errors
+
+def _page_result(r: httpx.Response, auth_method: str) -> dict:
+    result = r.json()
+    return {
+        "success": True,
+        "page_id": result.get("id"),
+        "page_url": result.get("link"),
+        "status": result.get("status"),
+        "auth_method": auth_method,
+    }
+
+def _auth_error(e: WPAuthError) -> dict:
+    return {
+        "error": f"Hostinger bloque l'authentification. Erreur Basic Auth: {e.errors.get('application_password', '')[:200]}, "
+                 f"Erreur Bearer: {e.errors.get('bearer_token', '')[:200]}"
+    }
+
+async def _report(on_result: OnResult, results: List[dict], start: int):
+    if on_result is not None:
+        for i in range(start, len(results)):
+            await on_result(i, results[i])
+
+class WPClient:
+    def __init__(self, url: str, user: str, password: str, timeout: float = 30.0):
+        self.base = url.rstrip("/")
+        self.host = urlsplit(self.base).netloc or self.base
+        self.user = user
+        self.password = password
+        self._http = httpx.AsyncClient(
+            timeout=httpx.Timeout(timeout),
+            limits=httpx.Limits(max_connections=WP_CONCURRENCY * 2, max_keepalive_connections=WP_CONCURRENCY),
+        )
+        self._sem = asyncio.Semaphore(WP_CONCURRENCY)
+        self.leases = 0          # déploiements en cours sur ce client
+        self.retired = False     # remplacé ou évincé du pool : fermé quand le dernier bail se termine
+
+    def _auth_kwargs(self, method: str, headers: Optional[dict]) -> dict:
+        if method == "bearer_token":
+            return {"headers": {**(headers or {}), "Authorization": f"Bearer {self.password}"}}
+        return {"auth": (self.user, self.password), "headers": headers}
+
+    async def request(self, method: str, path: str, headers: Optional[dict] = None, **kw) -> Tuple[httpx.Response, str]:
+        """Send with the cached auth scheme first, falling back to the other one on 401"""
+        auth_key = (self.base, self.user)
+        cached = _auth_cache.get(auth_key)
+        order = [cached] + [m for m in AUTH_METHODS if m != cached] if cached else list(AUTH_METHODS)
+        errors = {}
+        for auth_method in order:
+            async with self._sem:
+                t0 = time.monotonic()
+                try:
+                    r = await self._http.request(method, self.base + path, **self._auth_kwargs(auth_method, headers), **kw)
+                except Exception:
+                    metrics.observe_dependency("wordpress", method, "error", time.monotonic() - t0)
+                    raise
+                metrics.observe_dependency("wordpress", method, r.status_code, time.monotonic() - t0)
+            if r.status_code != 401:
+                _auth_cache[auth_key] = auth_method
+                return r, auth_method
+            errors[auth_method] = r.text
+        _auth_cache.pop(auth_key, None)
+        raise WPAuthError(errors)
+
+    async def create_post(self, post_data: dict) -> dict:
+        try:
+            r, _ = await self.request("POST", "/wp-json/wp/v2/posts", json=post_data)
+        except WPAuthError as e:
+            return _auth_error(e)
+        if r.status_code in [200, 201]:
+            data = r.json()
+            return {"success": True, "post_id": data.get("id"), "post_url": data.get("link"), "status": data.get("status")}
+        return {"error": f"WordPress API error: {r.text}"}
+
+    async def create_page(self, page_data: dict) -> dict:
+        try:
+            r, auth_method = await self.request("POST", "/wp-json/wp/v2/pages", json=page_data)
+        except WPAuthError as e:
+            return _auth_error(e)
+        if r.status_code in [200, 201]:
+            return _page_result(r, auth_method)
+        return {"error": f"WordPress API error: {r.text}"}
+
+    async def update_page(self, page_id: int, page_data: dict) -> dict:
+        try:
+            r, auth_method = await self.request("POST", f"/wp-json/wp/v2/pages/{int(page_id)}", json=page_data)
+        except WPAuthError as e:
+            return _auth_error(e)
+        if r.status_code == 200:
+            return _page_result(r, auth_method)
+        return {"error": f"WordPress API error: {r.text}", "status_code": r.status_code}
+
+    async def create_pages(self, pages: List[dict], on_result: OnResult = None) -> List[dict]:
+        """Create pages concurrently (bounded by WP_CONCURRENCY); results keep the input order.
+
+        A transport error fails only its own page; on_result(index, result) runs as soon as each page is done.
+        """
+        async def one(i: int, page: dict) -> dict:
+            res = await self.create_page(page)
+            if on_result is not None:
+                await on_result(i, res)
+            return res
+
+        done = await asyncio.gather(*(one(i, p) for i, p in enumerate(pages)), return_exceptions=True)
+        results = []
+        for i, res in enumerate(done):
+            if isinstance(res, Exception):
+                res = {"error": f"Page creation error: {res}"}
+                if on_result is not None:
+                    await on_result(i, res)
+            results.append(res)
+        return results
+
+    async def batch_create_pages(self, pages: List[dict], on_result: OnResult = None) -> Optional[List[dict]]:
+        """Create pages through /wp-json/batch/v1, WP_BATCH_MAX per round-trip.
+
+        Returns None when the site has no batch endpoint (WordPress < 5.6) so callers can fall back;
+        if it disappears after the first chunk, only the remaining pages are created one by one.
+        A failed chunk does not lose the pages created by earlier ones: on_result(index, result) runs after each chunk.
+        """
+        results: List[dict] = []
+        for i in range(0, len(pages), WP_BATCH_MAX):
+            chunk = pages[i:i + WP_BATCH_MAX]
+            body = {
+                "validation": "normal",
+                "requests": [{"method": "POST", "path": "/wp/v2/pages", "body": p} for p in chunk],
+            }
+            start = len(results)
+            try:
+                r, auth_method = await self.request("POST", "/wp-json/batch/v1", json=body)
+            except WPAuthError as e:
+                results.extend(_auth_error(e) for _ in chunk)
+                await _report(on_result, results, start)
+                continue
+            except httpx.HTTPError as e:
+                results.extend({"error": f"WordPress batch error: {e!r}"} for _ in chunk)
+                await _report(on_result, results, start)
+                continue
+            if r.status_code in (404, 405) or (r.status_code >= 400 and i == 0):
+                if i == 0:
+                    return None
+                # Endpoint batch perdu en cours de route : les pages déjà créées restent, le reste en unitaire
+                shifted = (lambda j, res, i=i: on_result(i + j, res)) if on_result is not None else None
+                results.extend(await self.create_pages(pages[i:], shifted))
+                return results
+            responses = (r.json() or {}).get("responses", []) if r.status_code < 400 else []
+            for j in range(len(chunk)):
+                item = responses[j] if j < len(responses) else {}
+                status, data = item.get("status", r.status_code), item.get("body") or {}
+                if status in (200, 201) and isinstance(data, dict):
+                    results.append({
+                        "success": True,
+                        "page_id": data.get("id"),
+                        "page_url": data.get("link"),
+                        "status": data.get("status"),
+                        "auth_method": auth_method,
+                    })
+                else:
+                    results.append({"error": f"WordPress batch error: {str(data)[:400] or r.text[:400]}"})
+            await _report(on_result, results, start)
+        return results
+
+    async def aclose(self):
+        await self._http.aclose()
+
+def _close_later(c: WPClient):
+    task = asyncio.ensure_future(c.aclose())
+    _closing.add(task)
+    task.add_done_callback(_closed)
+
+def _closed(task: asyncio.Task):
+    _closing.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        log.warning(f"WordPress client close failed: {task.exception()!r}")
+
+def _retire(c: WPClient):
+    c.retired = True
+    if c.leases == 0:
+        _close_later(c)
+
+def _checkout(url: str, user: str, password: str) -> WPClient:
+    key = (url.rstrip("/"), user)
+    c = _clients.get(key)
+    if c is not None and c.password == password:
+        _clients.move_to_end(key)
+        return c
+    if c is not None:
+        _retire(c)
+    c = _clients[key] = WPClient(url, user, password)
+    while len(_clients) > WP_MAX_CLIENTS:
+        _, old = _clients.popitem(last=False)
+        _retire(old)
+    return c
+
+@asynccontextmanager
+async def lease(url: str, user: str, password: str):
+    """Pooled client per (site, user), held for one deployment. Clients replaced (new password) or
+    evicted past WP_MAX_CLIENTS are closed only once their in-flight deployments are done."""
+    c = _checkout(url, user, password)
+    c.leases += 1
+    try:
+        yield c
+    finally:
+        c.leases -= 1
+        if c.retired and c.leases == 0:
+            _close_later(c)
+
+async def close_all():
+    while _clients:
+        _, c = _clients.popitem()
+        try:
+            await c.aclose()
+        except Exception:
+            pass
+    if _closing:
+        await asyncio.gather(*list(_closing), return_exceptions=True)
@@ -0,0 +1,50 @@
+# WordPress deployment journal (Turso) — which page id/content hash each (site, slug) was deployed with
+import hashlib, json
+from typing import Dict, List, Tuple
+
+SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS wp_deployments (
+  site TEXT NOT NULL,
+  slug TEXT NOT NULL,
+  page_id INTEGER,
+  page_url TEXT,
+  content_hash TEXT NOT NULL,
+  updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY (site, slug)
+);
+"""
+
+def content_hash(page_data: dict) -> str:
+    return hashlib.sha256(json.dumps(page_data, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+async def load(conn, site: str) -> Dict[str, dict]:
+    res = await conn.execute(
+        "SELECT slug, page_id, content_hash FROM wp_deployments WHERE site = :site", {"site": site}
+    )
+    out = {}
+    for r in res.rows:
+        out[r[0]] = {"page_id": r[1], "content_hash": r[2]}
+    return out
+
+async def record(conn, site: str, entries: List[Tuple[str, dict, str]]):
+    """Upsert (slug, page result, content hash) for every successfully deployed page"""
+    stmts = [
+        (
+            "INSERT INTO wp_deployments(site, slug, page_id, page_url, content_hash, updated_at) "
+            "VALUES(:site, :slug, :page_id, :page_url, :content_hash, CURRENT_TIMESTAMP) "
+            "ON CONFLICT(site, slug) DO UPDATE SET "
+            "page_id = excluded.page_id, page_url = excluded.page_url, "
+            "content_hash = excluded.content_hash, updated_at = CURRENT_TIMESTAMP",
+            {
+                "site": site,
+                "slug": slug,
+                "page_id": result.get("page_id"),
+                "page_url": result.get("page_url"),
+                "content_hash": h,
+            },
+        )
+        for slug, result, h in entries
+        if result.get("success") and result.get("page_id") is not None
+    ]
+    if stmts:
+        await conn.batch(stmts)